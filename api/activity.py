@@ -0,0 +1,80 @@
+'''
+Coalesced wallet activity timestamps
+
+Views call touch(address) instead of writing Wallet.last_authenticated
+themselves. The time is kept in memory and recorded at most once per wallet
+every ACTIVITY_GRANULARITY seconds. After a response has gone out, the
+pending times are written with one bulk UPDATE, at most every
+ACTIVITY_FLUSH_INTERVAL seconds, so page views don't turn into row writes.
+Times not yet flushed when a process stops are lost.
+'''
+
+import datetime
+import threading
+import time
+
+from django.conf import settings
+from django.core.signals import request_finished
+from django.db.models import Case, DateTimeField, Value, When
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import metrics
+from .models import Wallet
+
+# Wallets per UPDATE statement
+FLUSH_BATCH_SIZE = 500
+
+_lock = threading.Lock()
+_pending = {}
+_recorded = {}
+_flushed_at = time.monotonic()
+
+
+def touch(address):
+    '''
+    Records that `address` was just active
+    '''
+    now = time.monotonic()
+    with _lock:
+        if now - _recorded.get(address, -settings.ACTIVITY_GRANULARITY) < settings.ACTIVITY_GRANULARITY:
+            return
+        _recorded[address] = now
+        _pending[address] = datetime.datetime.now(tz=timezone.utc)
+        metrics.set_gauge("activity_pending", len(_pending))
+
+
+def flush():
+    '''
+    Writes the pending activity times and returns how many wallets they were for
+    '''
+    global _pending, _flushed_at
+    with _lock:
+        pending, _pending = _pending, {}
+        _flushed_at = time.monotonic()
+        # Wallets last seen long ago are recorded again on their next visit
+        for address, recorded in list(_recorded.items()):
+            if _flushed_at - recorded >= settings.ACTIVITY_GRANULARITY:
+                del _recorded[address]
+    metrics.set_gauge("activity_pending", 0)
+
+    items = sorted(pending.items())
+    for start in range(0, len(items), FLUSH_BATCH_SIZE):
+        batch = items[start:start + FLUSH_BATCH_SIZE]
+        Wallet.objects.filter(address__in=[address for address, _ in batch]).update(last_authenticated=Case(
+            *[When(address=address, then=Value(seen)) for address, seen in batch],
+            output_field=DateTimeField()))
+    metrics.incr("activity_flushed", len(items))
+    return len(items)
+
+
+def reset():
+    global _pending, _recorded
+    with _lock:
+        _pending, _recorded = {}, {}
+
+
+@receiver(request_finished)
+def flush_after_request(**kwargs):
+    if _pending and time.monotonic() - _flushed_at >= settings.ACTIVITY_FLUSH_INTERVAL:
+        flush()
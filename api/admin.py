@@ -0,0 +1,16 @@
+from django.contrib import admin
+
+from .models import FeaturedSlot, HiddenAsset
+
+
+@admin.register(HiddenAsset)
+class HiddenAssetAdmin(admin.ModelAdmin):
+    list_display = ('name', 'contract_address', 'token_identifier', 'added')
+    search_fields = ('name', 'contract_address', 'token_identifier')
+
+
+@admin.register(FeaturedSlot)
+class FeaturedSlotAdmin(admin.ModelAdmin):
+    list_display = ('position', 'name', 'contract_address', 'token_identifier', 'starts_at', 'ends_at')
+    list_editable = ('position',)
+    list_display_links = ('name',)
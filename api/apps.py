@@ -0,0 +1,19 @@
+from django.apps import AppConfig
+from django.db.backends.signals import connection_created
+
+
+def configure_sqlite(sender, connection, **kwargs):
+    # WAL lets readers and the single writer proceed concurrently; in the
+    # default rollback journal a pending commit fails other writers outright
+    # instead of making them wait
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA journal_mode=WAL")
+            cursor.execute("PRAGMA synchronous=NORMAL")
+
+
+class ApiConfig(AppConfig):
+    name = 'api'
+
+    def ready(self):
+        connection_created.connect(configure_sqlite)
@@ -0,0 +1,209 @@
+'''
+Persistent store for OpenSea asset metadata
+
+Every view that fetches assets from OpenSea writes them here with
+store_assets(), and views that know which tokens they need read them with
+load_assets() first, so OpenSea is only asked for tokens that are missing
+or older than ASSET_METADATA_MAX_AGE.
+
+Assets are keyed by (contract address, token_id), see asset_key().
+Contract addresses are compared lowercased, as OpenSea returns them.
+'''
+
+import datetime
+import hashlib
+import json
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import Asset, Contract, Token
+from . import autocomplete, search
+
+# Top-level OpenSea fields we keep. Nested objects are trimmed to the
+# fields listed for them; None means keep the whole value.
+ASSET_FIELDS = {
+    "id": None,
+    "token_id": None,
+    "name": None,
+    "description": None,
+    "image_url": None,
+    "image_preview_url": None,
+    "image_thumbnail_url": None,
+    "image_original_url": None,
+    "animation_url": None,
+    "animation_original_url": None,
+    "background_color": None,
+    "external_link": None,
+    "permalink": None,
+    "num_sales": None,
+    "traits": None,
+    "last_sale": None,
+    "asset_contract": ("address", "name", "schema_name", "image_url", "external_link"),
+    "collection": ("slug", "name", "image_url", "description"),
+    "creator": ("address", "user", "profile_img_url"),
+    "owner": ("address", "user", "profile_img_url"),
+}
+
+
+def project(asset):
+    '''
+    Returns the subset of an OpenSea asset that we store
+    '''
+    projected = {}
+    for field, subfields in ASSET_FIELDS.items():
+        if field not in asset:
+            continue
+        value = asset[field]
+        if subfields and isinstance(value, dict):
+            value = {key: value[key] for key in subfields if key in value}
+        projected[field] = value
+    return projected
+
+
+def asset_hash(data):
+    return hashlib.sha1(json.dumps(data, sort_keys=True).encode()).hexdigest()
+
+
+def asset_key(asset):
+    '''
+    Returns (contract address, token_id) for an OpenSea asset, or None if
+    either is missing. The address is lowercased.
+    '''
+    if asset.get('token_id') and asset.get('asset_contract') and asset['asset_contract'].get('address'):
+        return (asset['asset_contract']['address'].lower(), asset['token_id'])
+    return None
+
+
+def get_tokens(keys):
+    '''
+    Returns {(contract address, token_id): Token id}, creating missing
+    Contracts and Tokens in bulk
+    '''
+    keys = set(keys)
+    if not keys:
+        return {}
+
+    addresses = {key[0] for key in keys}
+    contracts = dict(Contract.objects.filter(address__in=addresses).values_list('address', 'id'))
+    missing = addresses - set(contracts)
+    if missing:
+        Contract.objects.bulk_create([Contract(address=address) for address in missing], ignore_conflicts=True)
+        contracts.update(Contract.objects.filter(address__in=missing).values_list('address', 'id'))
+
+    def fetch():
+        rows = Token.objects.filter(
+            contract_id__in=contracts.values(),
+            token_identifier__in={key[1] for key in keys}
+        ).values_list('contract_id', 'token_identifier', 'id')
+        return {(contract_id, token_identifier): token_id for contract_id, token_identifier, token_id in rows}
+
+    tokens = fetch()
+    missing = [key for key in keys if (contracts[key[0]], key[1]) not in tokens]
+    if missing:
+        # A concurrent request may have created some of them meanwhile
+        Token.objects.bulk_create([Token(contract_id=contracts[key[0]], token_identifier=key[1]) for key in missing],
+                                  ignore_conflicts=True)
+        tokens = fetch()
+
+    return {key: tokens[(contracts[key[0]], key[1])] for key in keys}
+
+
+def store_assets(assets):
+    '''
+    Bulk upserts OpenSea assets into the metadata store. Assets whose
+    projected data hasn't changed only get their fetched_at bumped.
+    '''
+    projected = {}
+    for asset in assets:
+        key = asset_key(asset)
+        if key:
+            projected[key] = project(asset)
+    if not projected:
+        return
+
+    token_ids = get_tokens(projected)
+    existing = dict(Asset.objects.filter(token_id__in=token_ids.values()).values_list('token_id', 'etag'))
+    now = timezone.now()
+
+    to_create = []
+    to_update = []
+    unchanged = []
+    for key, data in projected.items():
+        token_id = token_ids[key]
+        etag = asset_hash(data)
+        if existing.get(token_id) == etag:
+            unchanged.append(token_id)
+            continue
+
+        collection = data.get('collection') or {}
+        creator = data.get('creator') or {}
+        row = Asset(
+            token_id=token_id,
+            name=data.get('name'),
+            description=data.get('description'),
+            image_url=data.get('image_url'),
+            collection_slug=collection.get('slug'),
+            collection_name=collection.get('name'),
+            creator_address=creator.get('address'),
+            data=data,
+            etag=etag,
+            fetched_at=now,
+        )
+        if token_id in existing:
+            to_update.append(row)
+        else:
+            to_create.append(row)
+
+    if to_create:
+        Asset.objects.bulk_create(to_create, ignore_conflicts=True)
+    if to_update:
+        Asset.objects.bulk_update(to_update, ['name', 'description', 'image_url', 'collection_slug',
+                                              'collection_name', 'creator_address', 'data', 'etag', 'fetched_at'])
+    if unchanged:
+        Asset.objects.filter(token_id__in=unchanged).update(fetched_at=now)
+
+    if to_create or to_update:
+        search.index_assets(to_create + to_update)
+        autocomplete.assets_stored(to_create + to_update)
+
+
+def load_assets(keys, max_age=None):
+    '''
+    Returns {(contract address, token_id): asset data} for the stored assets
+    among `keys` fetched within `max_age` seconds (default
+    ASSET_METADATA_MAX_AGE). Pass max_age=0 to accept any age. Results are
+    keyed as given, whatever the case of the contract address.
+    '''
+    requested = {}
+    for key in keys:
+        requested.setdefault((key[0].lower(), str(key[1])), []).append(key)
+    if not requested:
+        return {}
+
+    if max_age is None:
+        max_age = settings.ASSET_METADATA_MAX_AGE
+
+    rows = Asset.objects.filter(
+        token__contract__address__in={key[0] for key in requested},
+        token__token_identifier__in={key[1] for key in requested}
+    )
+    if max_age:
+        rows = rows.filter(fetched_at__gte=timezone.now() - datetime.timedelta(seconds=max_age))
+
+    found = {}
+    for contract_address, token_identifier, data in rows.values_list(
+            'token__contract__address', 'token__token_identifier', 'data'):
+        for key in requested.get((contract_address.lower(), token_identifier), ()):
+            found[key] = data
+    return found
+
+
+def stored_assets(limit, **filters):
+    '''
+    Returns up to `limit` stored assets matching the Asset field `filters`,
+    most recently fetched first, whatever their age. Used to answer list
+    requests from stored data while OpenSea is down.
+    '''
+    rows = Asset.objects.filter(**filters).order_by('-fetched_at')[:limit]
+    return list(rows.values_list('data', flat=True))
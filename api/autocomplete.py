@@ -0,0 +1,468 @@
+'''
+In-memory prefix index for /v1/autocomplete
+
+Profile names, twitter handles, wallet addresses and stored asset names are
+kept as lowercased keys in one sorted list. A lookup is a binary search for
+the prefix followed by picking the most-liked matches from the range. For
+prefixes shared by more than MAX_SCAN keys ("a", "0x", "the") the best
+matches are precomputed, so no lookup scans more than MAX_SCAN keys.
+
+Each process holds its own index. Warmup loads it from the snapshot
+written by `python manage.py build_autocomplete`, or builds it from the
+database if there is none, and it catches up on rows added or edited since
+the snapshot. It is then updated in place as assets, profiles and likes are
+saved. Requests never build it: one that finds no index loaded starts
+loading the snapshot in the background and gets no suggestions until then.
+'''
+
+import logging
+
+import bisect
+import datetime
+import heapq
+import json
+import os
+import threading
+import time
+import zlib
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import Sum
+
+from .models import Asset, LikeHistory, Profile, Wallet
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_VERSION = 1
+
+# Most keys a lookup scans; longer ranges use the precomputed best matches
+MAX_SCAN = 1000
+
+# Best matches kept per precomputed prefix
+TOP_K = 20
+
+# Words of a name that can start a match, so "miq" finds "Lil Miquela"
+MAX_WORDS = 4
+
+# Key changes after which they are merged into the main sorted list
+MERGE_AT = 10000
+
+
+def normalize(text):
+    return " ".join(text.lower().split())
+
+
+def name_keys(text):
+    '''Returns the keys for a name: the whole name and each later word onwards'''
+    text = normalize(text or "")
+    if not text:
+        return []
+    words = text.split(" ")
+    return [" ".join(words[i:]) for i in range(min(len(words), MAX_WORDS))]
+
+
+def entry_keys(payload):
+    keys = name_keys(payload.get("name")) + name_keys((payload.get("twitter") or "").lstrip("@"))
+    keys += [address.lower() for address in payload.get("addresses", [])]
+    return set(keys)
+
+
+def precompute(keys, entry_ids, weights):
+    '''
+    Returns {prefix: best entry ids} for every prefix shared by more than
+    MAX_SCAN of the sorted `keys`
+    '''
+    top = {}
+
+    def best(entries):
+        return heapq.nlargest(TOP_K, set(entries), key=weights.__getitem__)
+
+    def visit(lo, hi, depth):
+        # Best matches for keys[lo:hi], which share their first `depth`
+        # characters. Long ranges are merged from their children's results.
+        if hi - lo <= MAX_SCAN:
+            return best(entry_ids[lo:hi])
+
+        candidates = []
+        i = lo
+        while i < hi:
+            if len(keys[i]) <= depth:
+                candidates.append(entry_ids[i])
+                i += 1
+                continue
+            j = bisect.bisect_left(keys, keys[i][:depth + 1] + "\uffff", i, hi)
+            candidates.extend(visit(i, j, depth + 1))
+            i = j
+
+        result = best(candidates)
+        if depth:
+            top[keys[lo][:depth]] = result
+        return result
+
+    visit(0, len(keys), 0)
+    return top
+
+
+class PrefixIndex:
+    '''
+    Sorted keys with a parallel list of entry ids. Entries are the
+    suggestions themselves (a profile or an asset); several keys can point at
+    one entry and each entry has a like-count weight.
+
+    While building, add() appends and finish() sorts once. Once finished the
+    main key list is never modified in place: keys added later go into a
+    small sorted `extra` list and removed ones into `removed`, and both are
+    folded into a new main list from a background thread every MERGE_AT
+    changes.
+    '''
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._sorted = False
+        self._merging = False
+        self.keys = []
+        self.entry_ids = []
+        self.extra_keys = []
+        self.extra_ids = []
+        self.changes = []
+        self.removed = set()
+        self.entries = []
+        self.weights = []
+        self.refs = {}
+        self.top = {}
+        self.built_at = None
+
+    def add(self, ref, payload, weight=0):
+        '''
+        Adds the entry for `ref` ("asset:<token id>" or "profile:<profile id>"),
+        or replaces its payload and keys if it exists. An existing entry keeps
+        its weight.
+        '''
+        keys = entry_keys(payload)
+        with self._lock:
+            entry_id = self.refs.get(ref)
+            if entry_id is None:
+                if not keys:
+                    return
+                entry_id = len(self.entries)
+                self.refs[ref] = entry_id
+                self.entries.append(payload)
+                self.weights.append(weight)
+                old_keys = set()
+            else:
+                old_keys = entry_keys(self.entries[entry_id])
+                self.entries[entry_id] = payload
+
+            if not self._sorted:
+                for key in keys - old_keys:
+                    self.keys.append(key)
+                    self.entry_ids.append(entry_id)
+                return
+
+            for key in old_keys - keys:
+                self.removed.add((key, entry_id))
+                self.changes.append(None)
+            for key in keys - old_keys:
+                if (key, entry_id) in self.removed:
+                    self.removed.discard((key, entry_id))
+                    continue
+                i = bisect.bisect_left(self.extra_keys, key)
+                self.extra_keys.insert(i, key)
+                self.extra_ids.insert(i, entry_id)
+                self.changes.append((key, entry_id))
+                self._promote(key, entry_id)
+
+            if len(self.changes) >= MERGE_AT and not self._merging:
+                self._merging = True
+                threading.Thread(target=self.merge, daemon=True).start()
+
+    def add_likes(self, ref, delta):
+        with self._lock:
+            entry_id = self.refs.get(ref)
+            if entry_id is None:
+                return
+            self.weights[entry_id] += delta
+            if self._sorted:
+                for key in entry_keys(self.entries[entry_id]):
+                    self._promote(key, entry_id)
+
+    def _promote(self, key, entry_id):
+        # Keeps precomputed best matches right as keys are added and likes change
+        for length in range(1, len(key) + 1):
+            top = self.top.get(key[:length])
+            if top is None:
+                continue
+            if entry_id in top:
+                top.remove(entry_id)
+            top.append(entry_id)
+            top.sort(key=lambda i: -self.weights[i])
+            del top[TOP_K:]
+
+    def finish(self):
+        '''Sorts the keys added so far and precomputes best matches'''
+        with self._lock:
+            order = sorted(range(len(self.keys)), key=self.keys.__getitem__)
+            self.keys = [self.keys[i] for i in order]
+            self.entry_ids = [self.entry_ids[i] for i in order]
+            self.top = precompute(self.keys, self.entry_ids, self.weights)
+            self._sorted = True
+
+    def merge(self):
+        '''Folds added and removed keys into a new main key list'''
+        try:
+            with self._lock:
+                keys, entry_ids = self.keys, self.entry_ids
+                extra = list(zip(self.extra_keys, self.extra_ids))
+                removed = set(self.removed)
+                merged_changes = len(self.changes)
+
+            pairs = heapq.merge(zip(keys, entry_ids), extra)
+            if removed:
+                pairs = (pair for pair in pairs if pair not in removed)
+            merged = list(pairs)
+            keys = [pair[0] for pair in merged]
+            entry_ids = [pair[1] for pair in merged]
+            top = precompute(keys, entry_ids, self.weights)
+
+            with self._lock:
+                self.keys, self.entry_ids, self.top = keys, entry_ids, top
+                merged_pairs = set(extra)
+                extra = [change for change in self.changes[merged_changes:]
+                         if change and change not in merged_pairs]
+                extra.sort()
+                self.extra_keys = [pair[0] for pair in extra]
+                self.extra_ids = [pair[1] for pair in extra]
+                self.changes = self.changes[merged_changes:]
+                self.removed -= removed
+        finally:
+            self._merging = False
+
+    def lookup(self, prefix, limit=10):
+        '''Returns up to `limit` entries with a key starting with `prefix`, most liked first'''
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+        end = prefix + "\uffff"
+        with self._lock:
+            lo = bisect.bisect_left(self.keys, prefix)
+            hi = bisect.bisect_left(self.keys, end, lo)
+            extra_lo = bisect.bisect_left(self.extra_keys, prefix)
+            extra_hi = bisect.bisect_left(self.extra_keys, end, extra_lo)
+
+            if hi - lo > MAX_SCAN and prefix in self.top:
+                candidates = self.top[prefix]
+                if self.removed:
+                    candidates = [i for i in candidates
+                                  if any(key.startswith(prefix) for key in entry_keys(self.entries[i]))]
+            else:
+                # Ranges only grow past MAX_SCAN without precomputed
+                # matches between merges, then the first MAX_SCAN keys are used
+                hi = min(hi, lo + MAX_SCAN)
+                candidates = [entry_id for key, entry_id in zip(self.keys[lo:hi], self.entry_ids[lo:hi])
+                              if not self.removed or (key, entry_id) not in self.removed]
+                candidates += self.extra_ids[extra_lo:extra_hi]
+
+            best = heapq.nlargest(limit, set(candidates), key=self.weights.__getitem__)
+            return [self.entries[i] for i in best]
+
+    def dump(self, path):
+        '''
+        Writes the index as zlib-compressed JSON, sorted and with its
+        precomputed matches, so loading it is mostly parsing. Only call this
+        on a freshly built index.
+        '''
+        with self._lock:
+            data = {
+                "version": SNAPSHOT_VERSION,
+                "built_at": self.built_at,
+                "refs": sorted(self.refs, key=self.refs.get),
+                "entries": self.entries,
+                "weights": self.weights,
+                "keys": self.keys,
+                "entry_ids": self.entry_ids,
+                "top": self.top,
+            }
+        payload = zlib.compress(json.dumps(data, separators=(",", ":")).encode(), 6)
+        tmp = "%s.%d.tmp" % (path, os.getpid())
+        with open(tmp, "wb") as f:
+            f.write(payload)
+        os.replace(tmp, path)
+        return len(payload)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "rb") as f:
+            data = json.loads(zlib.decompress(f.read()))
+        if data.get("version") != SNAPSHOT_VERSION:
+            raise ValueError("Unsupported autocomplete snapshot version")
+        index = cls()
+        index.built_at = data["built_at"]
+        index.refs = {ref: i for i, ref in enumerate(data["refs"])}
+        index.entries = data["entries"]
+        index.weights = data["weights"]
+        index.keys = data["keys"]
+        index.entry_ids = data["entry_ids"]
+        index.top = data["top"]
+        index._sorted = True
+        return index
+
+
+def profile_payload(profile, addresses):
+    return {
+        "type": "profile",
+        "name": profile.name,
+        "twitter": profile.twitter,
+        "img_url": profile.img_url,
+        "address": addresses[0] if addresses else None,
+        "addresses": addresses,
+    }
+
+
+def asset_payload(contract_address, token_identifier, name, image_url):
+    return {
+        "type": "asset",
+        "name": name,
+        "contract_address": contract_address,
+        "token_id": token_identifier,
+        "image_url": image_url,
+    }
+
+
+def add_profiles(index, profile_ids=None, changed_since=None):
+    profiles = Profile.objects.all()
+    if profile_ids is not None:
+        profiles = profiles.filter(id__in=profile_ids)
+    if changed_since is not None:
+        profiles = profiles.filter(updated__gte=changed_since)
+
+    addresses = {}
+    for profile_id, address in Wallet.objects.filter(profile__in=profiles).order_by('id').values_list('profile_id', 'address'):
+        addresses.setdefault(profile_id, []).append(address)
+
+    likes = dict(LikeHistory.objects.filter(token__creator__profile__in=profiles).values_list(
+        'token__creator__profile_id').annotate(Sum('value')))
+
+    for profile in profiles.order_by('id').iterator():
+        payload = profile_payload(profile, addresses.get(profile.id, []))
+        index.add("profile:%s" % profile.id, payload, likes.get(profile.id) or 0)
+
+
+def add_assets(index, assets):
+    '''Adds api.Asset rows with their token's contract loaded'''
+    assets = [asset for asset in assets if asset.name]
+    likes = dict(LikeHistory.objects.filter(token_id__in=[asset.token_id for asset in assets]).values_list(
+        'token_id').annotate(Sum('value')))
+    for asset in assets:
+        payload = asset_payload(asset.token.contract.address, asset.token.token_identifier, asset.name, asset.image_url)
+        index.add("asset:%s" % asset.token_id, payload, likes.get(asset.token_id) or 0)
+
+
+def build():
+    '''Builds a complete index from the database'''
+    index = PrefixIndex()
+    index.built_at = time.time()
+    add_profiles(index)
+    rows = Asset.objects.exclude(name__isnull=True).exclude(name="").select_related('token__contract').only(
+        'token_id', 'name', 'image_url', 'token__token_identifier', 'token__contract__address')
+    batch = []
+    for asset in rows.iterator(chunk_size=5000):
+        batch.append(asset)
+        if len(batch) == 5000:
+            add_assets(index, batch)
+            batch = []
+    add_assets(index, batch)
+    index.finish()
+    return index
+
+
+def catch_up(index):
+    '''Applies profiles, assets and likes added or edited since the index was built'''
+    since = datetime.datetime.fromtimestamp(index.built_at, tz=datetime.timezone.utc)
+    index.built_at = time.time()
+    # Likes first: new profiles and assets are added with their full counts
+    rows = LikeHistory.objects.filter(added__gte=since).values_list('token_id', 'token__creator__profile_id', 'value')
+    for token_id, profile_id, value in rows:
+        index.add_likes("asset:%s" % token_id, value)
+        if profile_id:
+            index.add_likes("profile:%s" % profile_id, value)
+    add_profiles(index, changed_since=since)
+    add_assets(index, Asset.objects.filter(fetched_at__gte=since).select_related('token__contract'))
+
+
+_index = None
+_index_lock = threading.Lock()
+_loading = False
+
+
+def load(allow_build=True):
+    '''
+    Loads this process's index from the snapshot and catches it up, or
+    builds it from the database if there is no snapshot and `allow_build`
+    is set. For warmup, not requests.
+    '''
+    global _index
+    with _index_lock:
+        if _index is None:
+            path = settings.AUTOCOMPLETE_SNAPSHOT
+            if path and os.path.exists(path):
+                index = PrefixIndex.load(path)
+                catch_up(index)
+            elif allow_build:
+                index = build()
+            else:
+                logger.warning("No autocomplete snapshot at %s, run build_autocomplete", path)
+                return None
+            _index = index
+    return _index
+
+
+def _load_in_background():
+    global _loading
+    try:
+        load(allow_build=False)
+    except Exception:
+        logger.exception("Loading the autocomplete index failed")
+    finally:
+        _loading = False
+        # This thread outlives requests, so it mustn't keep a pooled connection
+        connections.close_all()
+
+
+def get_index():
+    '''
+    Returns this process's index, or None while it isn't loaded yet, in
+    which case loading the snapshot starts in the background
+    '''
+    global _loading
+    if _index is None and not _loading:
+        with _index_lock:
+            if _index is None and not _loading:
+                _loading = True
+                threading.Thread(target=_load_in_background, name="autocomplete-load", daemon=True).start()
+    return _index
+
+
+def loaded():
+    return _index is not None
+
+
+# Incremental updates. These only touch an index that is already loaded;
+# one loaded later picks the change up from the database.
+
+def assets_stored(assets):
+    if loaded():
+        assets = Asset.objects.filter(token_id__in=[asset.token_id for asset in assets]).select_related('token__contract')
+        add_assets(_index, assets)
+
+
+def profiles_changed(profile_ids):
+    if loaded():
+        add_profiles(_index, profile_ids=set(filter(None, profile_ids)))
+
+
+def likes_changed(token, value):
+    if loaded():
+        _index.add_likes("asset:%s" % token.id, value)
+        if token.creator_id and token.creator.profile_id:
+            _index.add_likes("profile:%s" % token.creator.profile_id, value)
@@ -0,0 +1,42 @@
+'''
+Bulk UPDATEs without per-row ORM expressions
+
+QuerySet.bulk_update() builds and resolves a Case(When(...)) expression for
+every row and field. For batches of hundreds of rows that takes far longer
+than running the UPDATE itself. update_rows() sends the same CASE UPDATE as
+plain SQL with parameters.
+'''
+
+from django.db import connections, router
+
+
+def update_rows(objects, fields):
+    '''
+    Saves `fields` of a list of model instances with one UPDATE per batch.
+    Values are sent as parameters without casts, so the fields should be
+    text columns.
+    '''
+    if not objects:
+        return
+    model = type(objects[0])
+    meta = model._meta
+    connection = connections[router.db_for_write(model)]
+    quote = connection.ops.quote_name
+    fields = [meta.get_field(name) for name in fields]
+    pk = meta.pk
+
+    # Each row takes two parameters per field plus one in the WHERE
+    batch_size = connection.ops.bulk_batch_size([pk] * (2 * len(fields) + 1), objects)
+    with connection.cursor() as cursor:
+        for start in range(0, len(objects), batch_size):
+            batch = objects[start:start + batch_size]
+            assignments = []
+            params = []
+            for field in fields:
+                assignments.append("%s = CASE %s %s END" % (
+                    quote(field.column), quote(pk.column), " ".join(["WHEN %s THEN %s"] * len(batch))))
+                for obj in batch:
+                    params += [obj.pk, field.get_db_prep_save(getattr(obj, field.attname), connection)]
+            params += [obj.pk for obj in batch]
+            cursor.execute("UPDATE %s SET %s WHERE %s IN (%s)" % (
+                quote(meta.db_table), ", ".join(assignments), quote(pk.column), ", ".join(["%s"] * len(batch))), params)
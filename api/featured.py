@@ -0,0 +1,50 @@
+'''
+Homepage curation for /v1/featured
+
+Featured tokens are api.FeaturedSlot rows, managed from the Django admin.
+Cached featured responses depend on the tags.FEATURED tag, and editing a
+slot invalidates it, so only the featured caches are dropped. A cached
+response also expires when the next slot's active window opens or closes.
+'''
+
+from django.db.models import Q
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import tags
+from .models import FeaturedSlot
+
+
+def cache_key(limit):
+    return "featured_%s" % limit
+
+
+def active_slots(limit, now=None):
+    '''
+    Returns (active slots in position order, seconds until the active set
+    next changes or None), from one query for current and upcoming slots
+    '''
+    now = now or timezone.now()
+    slots = FeaturedSlot.objects.filter(Q(ends_at__isnull=True) | Q(ends_at__gt=now))
+
+    active = []
+    upcoming = []
+    for slot in slots:
+        if slot.starts_at and slot.starts_at > now:
+            upcoming.append(slot.starts_at)
+            continue
+        active.append(slot)
+        if slot.ends_at:
+            upcoming.append(slot.ends_at)
+
+    expires_in = None
+    if upcoming:
+        expires_in = max(int((min(upcoming) - now).total_seconds()) + 1, 1)
+    return active[:limit], expires_in
+
+
+@receiver(post_save, sender=FeaturedSlot)
+@receiver(post_delete, sender=FeaturedSlot)
+def featured_changed(**kwargs):
+    tags.invalidate(tags.FEATURED)
@@ -0,0 +1,140 @@
+'''
+Wallet to profile identity map
+
+Views resolve an address to its profile and every address linked to it
+through resolve(), which answers from memory or the shared cache and
+touches the database only on a miss. It is kept in two levels:
+
+    identity_wallet_<address>   -> profile id, or 0 for no profile
+    identity_profile_<id>       -> the profile's addresses
+
+Addresses are matched case-insensitively, like the lowercased cache keys.
+Each process also keeps the entries it used for IDENTITY_LOCAL_TTL seconds.
+Saving or deleting a Wallet or deleting a Profile drops the affected
+entries, here and in the shared cache, and invalidates the address and
+profile tags of cached responses; other processes see the change once
+their own copy expires. Bulk changes that skip model signals (update(),
+bulk_create()) must call links_changed() themselves.
+'''
+
+import collections
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_init, post_save, pre_delete
+from django.dispatch import receiver
+
+from . import metrics, tags
+from .models import Profile, Wallet
+
+Identity = collections.namedtuple('Identity', 'profile_id addresses')
+
+# Most entries kept in one process before they are all dropped
+LOCAL_MAX_ENTRIES = 10000
+
+_lock = threading.Lock()
+_local = {}
+
+
+def _wallet_key(address):
+    return "identity_wallet_" + address.lower()
+
+
+def _profile_key(profile_id):
+    return "identity_profile_%d" % profile_id
+
+
+def _get(key):
+    entry = _local.get(key)
+    if entry and entry[0] > time.monotonic():
+        return entry[1]
+    value = cache.get(key)
+    if value is not None:
+        _remember(key, value, shared=False)
+    return value
+
+
+def _remember(key, value, shared=True):
+    if shared:
+        cache.set(key, value, settings.IDENTITY_CACHE_TTL)
+    with _lock:
+        if len(_local) >= LOCAL_MAX_ENTRIES:
+            _local.clear()
+        _local[key] = (time.monotonic() + settings.IDENTITY_LOCAL_TTL, value)
+
+
+def resolve(address):
+    '''
+    Returns the Identity for `address`. An address without a profile is
+    its own identity, with a profile_id of None.
+    '''
+    profile_id = _get(_wallet_key(address))
+    addresses = _get(_profile_key(profile_id)) if profile_id else None
+
+    if profile_id is None or (profile_id and addresses is None):
+        metrics.incr("identity_misses")
+        rows = list(Wallet.objects.filter(profile__wallet__address__iexact=address).values_list('profile_id', 'address'))
+        profile_id = rows[0][0] if rows else 0
+        addresses = tuple(sorted(row[1] for row in rows))
+        _remember(_wallet_key(address), profile_id)
+        if profile_id:
+            _remember(_profile_key(profile_id), addresses)
+
+    if not profile_id or not addresses:
+        return Identity(None, (address,))
+    return Identity(profile_id, addresses)
+
+
+def profile_for(address):
+    '''
+    Returns the profile id for `address`, creating the wallet and an empty
+    profile if it has none yet
+    '''
+    profile_id = resolve(address).profile_id
+    if profile_id:
+        return profile_id
+    wallet = Wallet.objects.filter(address__iexact=address).first() or Wallet.objects.get_or_create(address=address)[0]
+    if not wallet.profile_id:
+        wallet.profile = Profile.objects.create()
+        wallet.save()
+    return wallet.profile_id
+
+
+def links_changed(addresses=(), profile_ids=()):
+    '''
+    Drops the cached identity of these addresses and profiles
+    '''
+    keys = [_wallet_key(address) for address in addresses] + [_profile_key(i) for i in profile_ids if i]
+    cache.delete_many(keys)
+    with _lock:
+        for key in keys:
+            _local.pop(key, None)
+    tags.invalidate(*[tags.address_tag(address) for address in addresses],
+                    *[tags.profile_tag(profile_id) for profile_id in profile_ids if profile_id])
+
+
+def reset():
+    with _lock:
+        _local.clear()
+
+
+@receiver(post_init, sender=Wallet)
+def remember_profile(sender, instance, **kwargs):
+    # The profile a wallet was loaded with, so moving it also drops the old profile's entry
+    instance._loaded_profile_id = instance.profile_id
+
+
+@receiver(post_save, sender=Wallet)
+@receiver(post_delete, sender=Wallet)
+def wallet_changed(sender, instance, **kwargs):
+    links_changed([instance.address], {instance._loaded_profile_id, instance.profile_id})
+    instance._loaded_profile_id = instance.profile_id
+
+
+@receiver(pre_delete, sender=Profile)
+def profile_deleted(sender, instance, **kwargs):
+    # Its wallets are unlinked with an UPDATE, which sends no signals
+    addresses = Wallet.objects.filter(profile=instance).values_list('address', flat=True)
+    links_changed(addresses, [instance.id])
@@ -0,0 +1,169 @@
+'''
+Bulk profile ingestion for the scraper bot
+
+    POST /api/v1/bot-only/profiles
+    {"address": "0x...", "name": "Lil Miquela", "twitter": "lilmiquela", "img_url": "https://..."}
+    {"address": "0x...", "name": "..."}
+
+The body is NDJSON, one creator per line, read as it arrives rather than
+loaded whole. Records are upserted in chunks of CHUNK_SIZE. Each chunk
+loads its wallets and their profiles in one query, creates the missing
+profiles and wallets with bulk_create and saves changed profiles with
+bulk.update_rows(), so a chunk takes the same handful of queries however
+many creators it holds.
+
+A record sets the fields it has, an empty string clears one and fields it
+leaves out are kept. Addresses match existing wallets whatever their case.
+Wallets without a profile get a new one. Bulk writes send no signals, so
+each chunk drops the cached identity of the wallets it linked and the
+caller reindexes the profiles it returns.
+'''
+
+import json
+import re
+
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Max, Q
+from django.utils import timezone
+
+from . import bulk, identity, metrics
+from .models import Profile, Wallet
+
+ADDRESS_RE = re.compile(r"0x[0-9a-zA-Z]{40}$")
+
+# Field: longest value the column takes
+FIELDS = {
+    "name": Profile._meta.get_field('name').max_length,
+    "twitter": Profile._meta.get_field('twitter').max_length,
+    "img_url": None,
+}
+
+# Records upserted per transaction
+CHUNK_SIZE = 500
+
+# Queries a chunk may take, on top of the request's QUERY_BUDGET
+CHUNK_QUERY_BUDGET = 30
+
+# Times a chunk is retried when a concurrent write takes one of its rows
+ATTEMPTS = 3
+
+
+def parse_record(line):
+    '''
+    Returns the record on an NDJSON line, or raises ValueError saying what is wrong with it
+    '''
+    try:
+        record = json.loads(line)
+    except ValueError:
+        raise ValueError("not valid JSON")
+    if not isinstance(record, dict):
+        raise ValueError("not a JSON object")
+
+    address = record.get('address')
+    if not isinstance(address, str) or not ADDRESS_RE.match(address.strip()):
+        raise ValueError("address not in expected format")
+
+    parsed = {"address": address.strip()}
+    for field, max_length in FIELDS.items():
+        if field not in record:
+            continue
+        value = record[field]
+        if value is not None and not isinstance(value, str):
+            raise ValueError("%s must be a string" % field)
+        value = value.strip() if value else None
+        if value and max_length and len(value) > max_length:
+            raise ValueError("%s is longer than %d characters" % (field, max_length))
+        parsed[field] = value or None
+    return parsed
+
+
+def _create_profiles(profiles):
+    if not connection.features.can_return_rows_from_bulk_insert:
+        # MySQL and SQLite don't return the new ids, so they are assigned here.
+        # A concurrent insert taking one of them raises IntegrityError, and
+        # ingest_chunk() retries the chunk with fresh ids.
+        first = (Profile.objects.aggregate(Max('id'))['id__max'] or 0) + 1
+        for i, profile in enumerate(profiles):
+            profile.id = first + i
+    Profile.objects.bulk_create(profiles)
+
+
+def _upsert(records):
+    # Stored addresses may be checksummed, and SQLite compares case-sensitively
+    matches = Q()
+    for record in records:
+        matches |= Q(address__iexact=record['address'])
+    wallets = {wallet.address.lower(): wallet for wallet in Wallet.objects.filter(matches).select_related('profile')}
+
+    created, changed, linked, new_wallets = [], {}, [], []
+    unchanged = 0
+    for record in records:
+        fields = {field: record[field] for field in FIELDS if field in record}
+        wallet = wallets.get(record['address'].lower())
+        if wallet and wallet.profile:
+            # Linked wallets of one profile share its instance, so it is saved once
+            profile = changed.get(wallet.profile_id, wallet.profile)
+            if all(getattr(profile, field) == value for field, value in fields.items()):
+                unchanged += 1
+                continue
+            for field, value in fields.items():
+                setattr(profile, field, value)
+            changed[profile.id] = profile
+        else:
+            profile = Profile(**fields)
+            created.append(profile)
+            if wallet:
+                linked.append((wallet, profile))
+            else:
+                new_wallets.append((record['address'], profile))
+
+    if created:
+        _create_profiles(created)
+    if changed:
+        bulk.update_rows(list(changed.values()), list(FIELDS))
+        # The raw UPDATE skips auto_now, and the autocomplete index catches up on it
+        Profile.objects.filter(id__in=list(changed)).update(updated=timezone.now())
+    if linked:
+        for wallet, profile in linked:
+            wallet.profile = profile
+        Wallet.objects.bulk_update([wallet for wallet, _ in linked], ['profile'])
+    if new_wallets:
+        Wallet.objects.bulk_create([Wallet(address=address, profile=profile) for address, profile in new_wallets])
+
+    summary = {
+        "profiles_created": len(created),
+        "profiles_updated": len(changed),
+        "wallets_created": len(new_wallets),
+        "wallets_linked": len(linked),
+        "unchanged": unchanged,
+    }
+    addresses = [wallet.address for wallet, _ in linked] + [address for address, _ in new_wallets]
+    return summary, addresses, [profile.id for profile in created] + list(changed)
+
+
+def ingest_chunk(records):
+    '''
+    Upserts a chunk of parsed records in one transaction. Returns its summary
+    and the ids of the profiles that were created or changed.
+    '''
+    # The last record for an address wins
+    by_address = {}
+    for record in records:
+        key = record['address'].lower()
+        by_address[key] = dict(by_address.get(key, {}), **record)
+    records = list(by_address.values())
+
+    for attempt in range(ATTEMPTS):
+        try:
+            with transaction.atomic():
+                summary, addresses, profile_ids = _upsert(records)
+            break
+        except IntegrityError:
+            if attempt == ATTEMPTS - 1:
+                raise
+            metrics.incr("ingest_chunk_retries")
+
+    identity.links_changed(addresses, [])
+    metrics.incr("ingest_profiles_created", summary["profiles_created"])
+    metrics.incr("ingest_profiles_updated", summary["profiles_updated"])
+    return summary, profile_ids
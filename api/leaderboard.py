@@ -0,0 +1,111 @@
+'''
+Debounced leaderboard
+
+The leaderboard aggregates the likes on every creator's tokens, too much
+work to redo after each like. Likes and profile edits only mark it dirty.
+The first reader to find it dirty and at least LEADERBOARD_REFRESH seconds
+old starts a single recomputation in the background, and readers get the
+previous version until it is done. Only a cold cache is computed in the
+request.
+
+Metrics: leaderboard_recompute_seconds, leaderboard_staleness_seconds (how
+long the served version has been out of date) and leaderboard_recomputes_saved
+(changes folded into a recomputation that was already due).
+'''
+
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+
+from . import metrics, replica
+
+logger = logging.getLogger(__name__)
+
+CACHE_KEY = "leaderboard"
+DIRTY_KEY = "leaderboard_dirty"
+LOCK_KEY = "leaderboard_recomputing"
+
+# Seconds after which a recomputation that never finished is given up on
+LOCK_TIMEOUT = 60
+
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="leaderboard")
+
+
+def compute():
+    '''
+    Returns the top 10 creators by likes on their tokens
+    '''
+    top_creators = []
+    with replica.reads() as alias, connections[alias].cursor() as cursor:
+        cursor.execute("""
+        select p.id, p.name, p.img_url, min(w.address) as 'address', sum(value) as 'likes', max(h.added) as 'last_like'
+        from api_likehistory h
+        join api_token t on t.id = h.token_id
+        join api_wallet w on w.id = t.creator_id
+        join api_profile p on p.id = w.profile_id
+        group by p.id, p.name, p.img_url
+        having likes > 0
+        order by likes desc, name desc, last_like desc
+
+        limit 10
+        """)
+        rows = cursor.fetchall()
+        for row in rows:
+            top_creators.append({
+                "profile_id": row[0],
+                "name": row[1],
+                "image_url": row[2],
+                "address": row[3],
+                "like_count": row[4]
+            })
+    return top_creators
+
+
+def recompute():
+    started = time.monotonic()
+    # Cleared first, so changes made while the query runs mark it dirty again
+    cache.delete(DIRTY_KEY)
+    top_creators = compute()
+    cache.set(CACHE_KEY, {"data": top_creators, "computed_at": time.time()}, None)
+    metrics.observe("leaderboard_recompute_seconds", time.monotonic() - started)
+    return top_creators
+
+
+def _recompute_in_background():
+    try:
+        recompute()
+    except Exception:
+        logger.exception("Leaderboard recomputation failed")
+    finally:
+        cache.delete(LOCK_KEY)
+        # This thread outlives requests, so it mustn't keep a pooled connection
+        connections.close_all()
+
+
+def get():
+    '''
+    Returns the current leaderboard, starting a recomputation if it is due
+    '''
+    entry = cache.get(CACHE_KEY)
+    if entry is None:
+        return recompute()
+
+    dirty_since = cache.get(DIRTY_KEY)
+    staleness = time.time() - dirty_since if dirty_since is not None else 0
+    metrics.set_gauge("leaderboard_staleness_seconds", round(staleness, 3))
+    if dirty_since is not None and time.time() - entry["computed_at"] >= settings.LEADERBOARD_REFRESH:
+        if cache.add(LOCK_KEY, True, LOCK_TIMEOUT):
+            _executor.submit(_recompute_in_background)
+    return entry["data"]
+
+
+def mark_dirty():
+    '''
+    Records that likes or creator profiles changed
+    '''
+    if not cache.add(DIRTY_KEY, time.time(), None):
+        metrics.incr("leaderboard_recomputes_saved")
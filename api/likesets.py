@@ -0,0 +1,114 @@
+'''
+Like lookups served from the cache: per-token like counts, and per-profile
+liked-token sets for "have I liked these" checks
+
+Each profile's currently liked tokens are cached as a sorted array of
+64-bit hashes of "contract:token_id", 8 bytes per like, so checking a page
+of assets is a binary search per asset with no database query, however
+many likes the profile has. Sets depend on the profile's likes tag, so a
+like or unlike invalidates the set and the next check reloads it with one
+grouped query.
+
+Both are normally loaded from the read replica. Counts and sets for tags
+pinned by a recent like are loaded from the primary instead, and a request
+pinned to the primary neither reads nor fills the cache, so nobody is
+served a count from before their own like (see api/replica.py).
+'''
+
+import array
+import bisect
+import contextlib
+import hashlib
+
+from django.conf import settings
+from django.db.models import Sum
+
+from . import replica, tags
+from .models import LikeHistory
+
+
+def token_hash(contract_address, token_id):
+    item = "%s:%s" % (contract_address.lower(), token_id)
+    return int.from_bytes(hashlib.blake2b(item.encode(), digest_size=8).digest(), 'little')
+
+
+def like_counts(keys):
+    '''
+    Returns {(contract address, token_id): like count}. Each count is cached
+    until the token is liked or unliked, and all the others come from a
+    single grouped query, however many there are.
+    '''
+    pinned = replica.pinned()
+    cache_keys = {key: "like_count_%s_%s" % key for key in keys}
+    cached = tags.get_many(list(cache_keys.values())) if not pinned else {}
+    like_counts = {key: cached[cache_key] for key, cache_key in cache_keys.items() if cache_key in cached}
+
+    missing = [key for key in keys if key not in like_counts]
+    if missing:
+        dependencies = tags.depend_on([tags.token_tag(*key) for key in missing])
+        recent = replica.pinned_tags([tags.token_tag(*key) for key in missing])
+        fetched = dict.fromkeys(missing, 0)
+        rows = _count_likes([key for key in missing if tags.token_tag(*key) not in recent])
+        with replica.primary():
+            rows += _count_likes([key for key in missing if tags.token_tag(*key) in recent])
+        for contract_address, token_id, like_count in rows:
+            if (contract_address, token_id) in fetched:
+                fetched[(contract_address, token_id)] = like_count or 0
+
+        if not pinned:
+            tags.set_many({
+                cache_keys[key]: (like_count, {tags.token_tag(*key): dependencies[tags.token_tag(*key)]})
+                for key, like_count in fetched.items()
+            }, settings.LIKE_COUNT_CACHE_TTL)
+        like_counts.update(fetched)
+    return like_counts
+
+
+def _count_likes(keys):
+    if not keys:
+        return []
+    with replica.reads():
+        return list(LikeHistory.objects.filter(
+            token__contract__address__in={key[0] for key in keys},
+            token__token_identifier__in={key[1] for key in keys}
+        ).values_list('token__contract__address', 'token__token_identifier').annotate(Sum('value')))
+
+
+def _key(profile_id):
+    return "liked_set_%d" % profile_id
+
+
+def liked_set(profile_id):
+    '''
+    Returns the sorted array of token hashes the profile currently likes
+    '''
+    pinned = replica.pinned()
+    data = tags.get(_key(profile_id)) if not pinned else None
+    if data is None:
+        tag = tags.likes_tag(profile_id)
+        dependencies = tags.depend_on([tag])
+        primary = replica.primary() if replica.pinned_tags([tag]) else contextlib.nullcontext()
+        with primary:
+            with replica.reads():
+                rows = LikeHistory.objects.filter(profile_id=profile_id).values_list(
+                    'token__contract__address', 'token__token_identifier').annotate(likes=Sum('value')).filter(likes__gt=0)
+                hashes = array.array('Q', sorted(token_hash(address, token_id) for address, token_id, _ in rows))
+        data = hashes.tobytes()
+        if not pinned:
+            tags.set(_key(profile_id), data, dependencies)
+    hashes = array.array('Q')
+    hashes.frombytes(data)
+    return hashes
+
+
+def has_liked(profile_id, keys):
+    '''
+    Returns whether the profile likes each (contract address, token_id) in `keys`
+    '''
+    hashes = liked_set(profile_id)
+    liked = []
+    for contract_address, token_id in keys:
+        item = token_hash(contract_address, token_id)
+        position = bisect.bisect_left(hashes, item)
+        liked.append(position < len(hashes) and hashes[position] == item)
+    return liked
@@ -0,0 +1,302 @@
+'''
+Live like counts over server-sent events
+
+    GET /api/v1/live?tokens=<contract>:<token_id>,...&key=<API key>
+
+is served by app(), a plain ASGI app that stbackend/asgi.py mounts in
+front of Django. It needs an ASGI server (`uvicorn stbackend.asgi:application`)
+on a host that doesn't buffer responses, which rules out App Engine
+standard. The stream starts with a "snapshot" event holding each token's
+like count, then sends a "likes" event with the new count of each token
+that was liked or unliked:
+
+    event: likes
+    data: [{"contract": "0x...", "token_id": "1", "like_count": 12}]
+
+Counts are read through the shared like-count cache, so one stream reloads
+a changed count and the others get it from the cache.
+
+Likes are published from the like write path through a backend:
+LIVE_BACKEND "redis", the default, fans them out through a Redis channel
+(LIVE_REDIS_URL) to every process, since likes are served by App Engine
+and streams by a separate ASGI service. "local" fans them out to
+subscribers in the same process only, for running everything in one
+process. It can also be the dotted path of a custom backend class.
+
+A subscriber only holds the set of tokens that changed since its last
+event, so a client that reads slowly gets changes merged instead of making
+publishers wait or queues grow. Each process serves at most
+LIVE_MAX_CONNECTIONS streams, and streams are closed after LIVE_MAX_SECONDS
+for the client to reconnect.
+'''
+
+import asyncio
+import json
+import logging
+import threading
+import time
+import urllib.parse
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import close_old_connections
+from django.utils.module_loading import import_string
+
+from . import likesets, metrics, replica
+from .ingest import ADDRESS_RE
+
+logger = logging.getLogger(__name__)
+
+# Most tokens one stream can follow
+MAX_TOKENS = 50
+
+
+def token_key(contract_address, token_id):
+    return (contract_address.lower(), str(token_id))
+
+
+class Subscriber:
+    '''
+    One stream's tokens and the changes not yet sent to it
+    '''
+
+    def __init__(self, keys, loop):
+        self.keys = keys
+        self.loop = loop
+        self.pending = set()
+        self.ready = asyncio.Event()
+
+    def push(self, key):
+        # Runs on the stream's event loop
+        if key in self.pending:
+            metrics.incr("live_changes_coalesced")
+        self.pending.add(key)
+        self.ready.set()
+
+    def take(self):
+        pending, self.pending = self.pending, set()
+        self.ready.clear()
+        return pending
+
+
+class Hub:
+    '''
+    The streams open in this process, by token
+    '''
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._by_key = {}
+        self.connections = 0
+
+    def add(self, subscriber, limit):
+        '''
+        Adds the stream unless `limit` streams are already open. Returns
+        whether it was added.
+        '''
+        with self._lock:
+            if self.connections >= limit:
+                return False
+            for key in subscriber.keys:
+                self._by_key.setdefault(key, set()).add(subscriber)
+            self.connections += 1
+        metrics.set_gauge("live_connections", self.connections)
+        return True
+
+    def remove(self, subscriber):
+        with self._lock:
+            for key in subscriber.keys:
+                subscribers = self._by_key.get(key)
+                subscribers.discard(subscriber)
+                if not subscribers:
+                    del self._by_key[key]
+            self.connections -= 1
+        metrics.set_gauge("live_connections", self.connections)
+
+    def deliver(self, key):
+        '''
+        Tells the streams following the token that its count changed. Safe
+        to call from any thread.
+        '''
+        with self._lock:
+            subscribers = list(self._by_key.get(key, ()))
+        for subscriber in subscribers:
+            try:
+                subscriber.loop.call_soon_threadsafe(subscriber.push, key)
+            except RuntimeError:
+                pass  # Its event loop has shut down
+
+
+hub = Hub()
+
+
+class LocalBackend:
+    '''
+    Delivers changes to the streams in this process only
+    '''
+
+    def publish(self, key):
+        hub.deliver(key)
+
+    def start(self):
+        pass
+
+
+class RedisBackend:
+    '''
+    Delivers changes to the streams of every process through a Redis channel
+    '''
+
+    CHANNEL = "showtime_live_likes"
+
+    def __init__(self, url=None):
+        try:
+            import redis
+        except ImportError:
+            raise ImproperlyConfigured('LIVE_BACKEND "redis" needs the redis package, or set LIVE_BACKEND "local" '
+                                       'if likes and streams are served by the same process')
+        self.client = redis.Redis.from_url(url or settings.LIVE_REDIS_URL)
+        self._lock = threading.Lock()
+        self._listener = None
+
+    def publish(self, key):
+        self.client.publish(self.CHANNEL, json.dumps(key))
+
+    def start(self):
+        with self._lock:
+            if self._listener is None:
+                self._listener = threading.Thread(target=self._listen, name="live-redis", daemon=True)
+                self._listener.start()
+
+    def _listen(self):
+        while True:
+            try:
+                pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self.CHANNEL)
+                for message in pubsub.listen():
+                    hub.deliver(token_key(*json.loads(message['data'])))
+            except Exception:
+                logger.exception("Live Redis subscription failed, resubscribing")
+                time.sleep(1)
+
+
+BACKENDS = {
+    "local": LocalBackend,
+    "redis": RedisBackend,
+}
+
+_backend_lock = threading.Lock()
+_backend = None
+
+
+def backend():
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            name = settings.LIVE_BACKEND
+            _backend = (BACKENDS.get(name) or import_string(name))()
+        return _backend
+
+
+def like_changed(contract_address, token_id):
+    '''
+    Publishes that a token's like count changed. Never fails the like.
+    '''
+    try:
+        backend().publish(token_key(contract_address, token_id))
+    except Exception:
+        logger.exception("Couldn't publish a live like change")
+        metrics.incr("live_publish_errors")
+
+
+def _like_counts(keys):
+    # Runs in a worker thread outside Django's request handling, so it
+    # closes connections the way a request would. Read from the primary:
+    # a lagging replica could still have the count from before the change.
+    close_old_connections()
+    try:
+        with replica.primary():
+            like_counts = likesets.like_counts(keys)
+    finally:
+        close_old_connections()
+    return [{"contract": key[0], "token_id": key[1], "like_count": like_counts.get(key, 0)} for key in keys]
+
+
+def _event(name, data):
+    return ("event: %s\ndata: %s\n\n" % (name, json.dumps(data))).encode()
+
+
+async def _send_error(send, status_code, message):
+    response_body = {
+        "error": {
+            "code": status_code,
+            "message": message
+        }
+    }
+    await send({'type': 'http.response.start', 'status': status_code,
+                'headers': [(b'content-type', b'application/json')]})
+    await send({'type': 'http.response.body', 'body': json.dumps(response_body).encode()})
+
+
+async def _wait_for_disconnect(receive):
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+
+async def app(scope, receive, send):
+    params = urllib.parse.parse_qs(scope.get('query_string', b'').decode())
+    headers = dict(scope.get('headers') or [])
+    # EventSource can't send headers, so the key can also be a parameter
+    api_key = headers.get(b'x-api-key', b'').decode() or params.get('key', [None])[0]
+    if not settings.SHOWTIME_FRONTEND_API_KEY or api_key != settings.SHOWTIME_FRONTEND_API_KEY:
+        return await _send_error(send, 401, "Unauthorized")
+
+    tokens = params.get('tokens', [''])[0]
+    pairs = [token.split(":", 1) for token in tokens.split(",")] if tokens else []
+    if not pairs or len(pairs) > MAX_TOKENS or not all(
+            len(pair) == 2 and ADDRESS_RE.match(pair[0]) and pair[1].isdigit() for pair in pairs):
+        return await _send_error(send, 400, "tokens must be 1 to %d comma-separated contract:token_id pairs" % MAX_TOKENS)
+
+    loop = asyncio.get_running_loop()
+    keys = list(dict.fromkeys(token_key(*pair) for pair in pairs))
+    subscriber = Subscriber(keys, loop)
+    # Subscribed before the snapshot is read, so no change falls in between
+    if not hub.add(subscriber, settings.LIVE_MAX_CONNECTIONS):
+        metrics.incr("live_connections_refused")
+        return await _send_error(send, 503, "Too many live connections")
+    disconnected = asyncio.ensure_future(_wait_for_disconnect(receive))
+    try:
+        backend().start()
+        await send({'type': 'http.response.start', 'status': 200, 'headers': [
+            (b'content-type', b'text/event-stream'),
+            (b'cache-control', b'no-cache'),
+            (b'x-accel-buffering', b'no'),
+        ]})
+        snapshot = await sync_to_async(_like_counts)(keys)
+        await send({'type': 'http.response.body', 'body': b'retry: 3000\n\n' + _event("snapshot", snapshot),
+                    'more_body': True})
+
+        closes_at = loop.time() + settings.LIVE_MAX_SECONDS
+        while not disconnected.done() and loop.time() < closes_at:
+            ready = asyncio.ensure_future(subscriber.ready.wait())
+            await asyncio.wait({ready, disconnected}, timeout=settings.LIVE_KEEPALIVE,
+                               return_when=asyncio.FIRST_COMPLETED)
+            ready.cancel()
+            if disconnected.done():
+                break
+
+            changed = subscriber.take()
+            if changed:
+                body = _event("likes", await sync_to_async(_like_counts)(sorted(changed)))
+                metrics.incr("live_events_sent")
+            else:
+                # A comment line keeps proxies from timing out a quiet stream
+                body = b": keepalive\n\n"
+            await send({'type': 'http.response.body', 'body': body, 'more_body': True})
+
+        if not disconnected.done():
+            await send({'type': 'http.response.body', 'body': b'', 'more_body': False})
+    finally:
+        disconnected.cancel()
+        hub.remove(subscriber)
@@ -0,0 +1,32 @@
+'''
+Builds the /v1/autocomplete index from the database and writes its snapshot
+
+Run before deploying so new instances load the snapshot instead of building
+the index themselves on their first autocomplete request.
+
+    python manage.py build_autocomplete
+'''
+
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from api import autocomplete
+
+
+class Command(BaseCommand):
+    help = 'Builds the autocomplete index and writes it to AUTOCOMPLETE_SNAPSHOT'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', default=None,
+                            help='snapshot path (default: AUTOCOMPLETE_SNAPSHOT)')
+
+    def handle(self, *args, **options):
+        started = time.time()
+        index = autocomplete.build()
+        self.stdout.write('Entries: %d, keys: %d, precomputed prefixes: %d' % (
+            len(index.entries), len(index.keys), len(index.top)))
+
+        size = index.dump(options['output'] or settings.AUTOCOMPLETE_SNAPSHOT)
+        self.stdout.write(self.style.SUCCESS('Wrote %d bytes in %.1fs' % (size, time.time() - started)))
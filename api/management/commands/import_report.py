@@ -0,0 +1,66 @@
+'''
+Reports the slowest imports of a cold start
+
+Imports the app the way a new App Engine instance does (Django setup, the
+WSGI app and the URL conf with every view module) in a fresh interpreter
+under `python -X importtime`, and lists the most expensive modules.
+
+    python manage.py import_report
+    python manage.py import_report --sort self --limit 40
+    python manage.py import_report --budget 500
+'''
+
+import os
+import subprocess
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+COLD_START = (
+    "import django; django.setup(); "
+    "import stbackend.wsgi; "
+    "from django.urls import get_resolver; get_resolver().url_patterns"
+)
+
+
+def parse_importtime(output):
+    '''
+    Returns [(module, self ms, cumulative ms)] from `-X importtime` output
+    '''
+    rows = []
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        own, cumulative, module = line[len("import time:"):].split("|", 2)
+        if not own.strip().isdigit():
+            continue  # the header line
+        rows.append((module.strip(), int(own) / 1000, int(cumulative) / 1000))
+    return rows
+
+
+class Command(BaseCommand):
+    help = 'Lists the slowest imports of a cold start'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=25)
+        parser.add_argument('--sort', choices=['cumulative', 'self'], default='cumulative')
+        parser.add_argument('--budget', type=float, help='Fail if all imports take longer than this many ms')
+
+    def handle(self, *args, **options):
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE=os.environ.get('DJANGO_SETTINGS_MODULE', 'stbackend.settings'))
+        result = subprocess.run([sys.executable, "-X", "importtime", "-c", COLD_START],
+                                env=env, stderr=subprocess.PIPE, universal_newlines=True)
+        if result.returncode:
+            raise CommandError(result.stderr[-2000:])
+
+        rows = parse_importtime(result.stderr)
+        total = sum(own for _, own, _ in rows)
+        column = 1 if options['sort'] == 'self' else 2
+
+        self.stdout.write("%10s %10s  %s" % ("self ms", "total ms", "module"))
+        for module, own, cumulative in sorted(rows, key=lambda row: row[column], reverse=True)[:options['limit']]:
+            self.stdout.write("%10.1f %10.1f  %s" % (own, cumulative, module))
+        self.stdout.write("%d modules imported in %.0fms" % (len(rows), total))
+
+        if options['budget'] is not None and total > options['budget']:
+            raise CommandError("Imports took %.0fms, over the %.0fms budget" % (total, options['budget']))
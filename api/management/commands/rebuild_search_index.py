@@ -0,0 +1,26 @@
+'''
+Reindexes every stored asset and named profile for /v1/search
+
+Only needed after bulk loads that bypass store_assets(), or to backfill an
+existing database; normal writes keep the index up to date.
+
+    python manage.py rebuild_search_index
+'''
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from api import search
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the full-text search index from stored assets and profiles'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        started = time.time()
+        search.rebuild(batch_size=options['batch_size'], log=self.stdout.write)
+        self.stdout.write(self.style.SUCCESS('Done in %.1fs' % (time.time() - started)))
@@ -0,0 +1,231 @@
+'''
+Bulk-generates synthetic Profiles, Wallets, Contracts, Tokens and LikeHistory
+
+The same --seed always produces the same rows, so runs can be compared.
+Rows are appended after the highest existing ids, so the command can also
+be run against a database that already has data.
+
+    python manage.py seed_synthetic --profiles 200000 --tokens 2000000 --likes 20000000
+'''
+
+import bisect
+import datetime
+import math
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from api.models import Contract, LikeHistory, Profile, Token, Wallet
+
+
+def zipf_cum_weights(n, s):
+    '''Cumulative weights for ranks 1..n under a Zipf(s) distribution'''
+    total = 0.0
+    weights = []
+    for rank in range(1, n + 1):
+        total += 1.0 / rank ** s
+        weights.append(total)
+    return weights
+
+
+def zipf_sample(rng, population, cum_weights):
+    return population[bisect.bisect(cum_weights, rng.random() * cum_weights[-1])]
+
+
+def next_id(model):
+    return (model.objects.aggregate(Max('id'))['id__max'] or 0) + 1
+
+
+class Command(BaseCommand):
+    help = 'Bulk-generates a reproducible synthetic dataset for scale testing'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--profiles', type=int, default=100000)
+        parser.add_argument('--multi-wallet-fraction', type=float, default=0.15,
+                            help='share of profiles with more than one linked wallet')
+        parser.add_argument('--max-wallets', type=int, default=5,
+                            help='most wallets a single profile can have')
+        parser.add_argument('--contracts', type=int, default=2000)
+        parser.add_argument('--tokens', type=int, default=1000000)
+        parser.add_argument('--likes', type=int, default=10000000,
+                            help='approximate number of distinct (profile, token) likes')
+        parser.add_argument('--zipf', type=float, default=1.1,
+                            help='skew of token popularity and creator output')
+        parser.add_argument('--activity-zipf', type=float, default=0.8,
+                            help='skew of how many likes each profile makes')
+        parser.add_argument('--unlike-rate', type=float, default=0.1,
+                            help='chance a like is later taken back')
+        parser.add_argument('--relike-rate', type=float, default=0.3,
+                            help='chance an unlike is followed by a new like')
+        parser.add_argument('--days', type=int, default=365,
+                            help='spread of like timestamps, ending now')
+        parser.add_argument('--batch-size', type=int, default=10000)
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        self.zipf = options['zipf']
+        started = time.time()
+
+        profile_ids = self.create_profiles(options['profiles'])
+        wallet_ids = self.create_wallets(profile_ids, options['multi_wallet_fraction'], options['max_wallets'])
+        contract_ids = self.create_contracts(options['contracts'])
+        token_ids = self.create_tokens(options['tokens'], contract_ids, wallet_ids)
+        self.create_likes(options['likes'], profile_ids, token_ids, options['activity_zipf'],
+                          options['unlike_rate'], options['relike_rate'], options['days'])
+
+        self.stdout.write(self.style.SUCCESS('Done in %.1fs' % (time.time() - started)))
+
+    def bulk_create(self, model, rows):
+        for i in range(0, len(rows), self.batch_size):
+            with transaction.atomic():
+                model.objects.bulk_create(rows[i:i + self.batch_size], batch_size=self.batch_size)
+
+    def create_profiles(self, count):
+        first = next_id(Profile)
+        rows = [Profile(id=first + i, name='Synthetic %d' % (first + i)) for i in range(count)]
+        self.bulk_create(Profile, rows)
+        self.stdout.write('Profiles: %d' % count)
+        return list(range(first, first + count))
+
+    def create_wallets(self, profile_ids, multi_fraction, max_wallets):
+        rng = self.rng
+        first = next_id(Wallet)
+        now = timezone.now()
+        rows = []
+        for profile_id in profile_ids:
+            linked = 1
+            if rng.random() < multi_fraction:
+                linked = rng.randint(2, max(2, max_wallets))
+            for _ in range(linked):
+                rows.append(Wallet(
+                    id=first + len(rows),
+                    address='0x%040x' % rng.getrandbits(160),
+                    profile_id=profile_id,
+                    last_authenticated=now - datetime.timedelta(seconds=rng.randrange(86400 * 90)),
+                ))
+        self.bulk_create(Wallet, rows)
+        self.stdout.write('Wallets: %d' % len(rows))
+        return [row.id for row in rows]
+
+    def create_contracts(self, count):
+        rng = self.rng
+        first = next_id(Contract)
+        rows = [Contract(id=first + i, address='0x%040x' % rng.getrandbits(160)) for i in range(count)]
+        self.bulk_create(Contract, rows)
+        self.stdout.write('Contracts: %d' % count)
+        return [row.id for row in rows]
+
+    def create_tokens(self, count, contract_ids, wallet_ids):
+        rng = self.rng
+        first = next_id(Token)
+
+        # A few contracts and creators account for most tokens
+        contract_weights = zipf_cum_weights(len(contract_ids), self.zipf)
+        creators = list(wallet_ids)
+        rng.shuffle(creators)
+        creator_weights = zipf_cum_weights(len(creators), self.zipf)
+        next_identifier = {}
+
+        rows = []
+        for i in range(count):
+            contract_id = zipf_sample(rng, contract_ids, contract_weights)
+            identifier = next_identifier.get(contract_id, rng.randrange(1, 10000))
+            next_identifier[contract_id] = identifier + rng.randint(1, 50)
+            rows.append(Token(
+                id=first + i,
+                contract_id=contract_id,
+                token_identifier=str(identifier),
+                creator_id=zipf_sample(rng, creators, creator_weights) if rng.random() < 0.7 else None,
+            ))
+            if len(rows) >= self.batch_size:
+                self.bulk_create(Token, rows)
+                rows = []
+        self.bulk_create(Token, rows)
+        self.stdout.write('Tokens: %d' % count)
+        return list(range(first, first + count))
+
+    def create_likes(self, target, profile_ids, token_ids, activity_zipf, unlike_rate, relike_rate, days):
+        '''
+        Likes are generated per profile: activity per profile is Zipfian,
+        each profile likes distinct tokens drawn from a Zipfian popularity
+        ranking, and its likes cluster into a handful of sessions.
+        '''
+        rng = self.rng
+        popularity = list(token_ids)
+        rng.shuffle(popularity)
+        token_weights = zipf_cum_weights(len(popularity), self.zipf)
+
+        activity = zipf_cum_weights(len(profile_ids), activity_zipf)
+        activity_total = activity[-1]
+        active_profiles = list(profile_ids)
+        rng.shuffle(active_profiles)
+
+        # Nobody likes more than 5% of all tokens
+        max_per_profile = max(1, len(popularity) // 20)
+
+        now = timezone.now()
+        span = days * 86400
+        rows = []
+        inserted = 0
+        previous = 0.0
+
+        for profile_id, cumulative in zip(active_profiles, activity):
+            share = (cumulative - previous) / activity_total
+            previous = cumulative
+            count = min(max_per_profile, int(round(share * target + rng.random())))
+            if not count:
+                continue
+
+            liked = set()
+            attempts = 0
+            while len(liked) < count:
+                attempts += 1
+                if attempts < count * 20:
+                    liked.add(zipf_sample(rng, popularity, token_weights))
+                else:
+                    # Popular tokens are exhausted for this profile, fill from the long tail
+                    liked.add(rng.choice(popularity))
+
+            sessions = [span * rng.random() for _ in range(1 + int(math.log2(count + 1)))]
+            for token_id in liked:
+                # Seconds before now, clustered around one of the sessions
+                ago = max(0.0, rng.choice(sessions) + rng.expovariate(1 / 600.0))
+                added = now - datetime.timedelta(seconds=ago)
+                rows.append((added, token_id, profile_id, 1))
+                if rng.random() < unlike_rate:
+                    added = min(now, added + datetime.timedelta(seconds=rng.expovariate(1 / 86400.0)))
+                    rows.append((added, token_id, profile_id, -1))
+                    if rng.random() < relike_rate:
+                        added = min(now, added + datetime.timedelta(seconds=rng.expovariate(1 / 86400.0)))
+                        rows.append((added, token_id, profile_id, 1))
+
+            if len(rows) >= self.batch_size:
+                inserted += self.insert_history(rows)
+                rows = []
+                self.stdout.write('LikeHistory: %d' % inserted)
+
+        inserted += self.insert_history(rows)
+        self.stdout.write('LikeHistory: %d' % inserted)
+
+    def insert_history(self, rows):
+        '''
+        LikeHistory.added is auto_now_add, so bulk_create would overwrite the
+        generated timestamps. Insert with executemany instead.
+        '''
+        if not rows:
+            return 0
+        table = connection.ops.quote_name(LikeHistory._meta.db_table)
+        sql = 'INSERT INTO %s (added, token_id, profile_id, value) VALUES (%%s, %%s, %%s, %%s)' % table
+        adapt = connection.ops.adapt_datetimefield_value
+        for i in range(0, len(rows), self.batch_size):
+            chunk = [(adapt(added), token_id, profile_id, value)
+                     for added, token_id, profile_id, value in rows[i:i + self.batch_size]]
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.executemany(sql, chunk)
+        return len(rows)
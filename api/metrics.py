@@ -0,0 +1,87 @@
+'''
+In-process metrics registry
+
+Counters, gauges and latency summaries kept in memory per process and
+exposed as JSON by /v1/metrics. Labels are passed as keyword arguments and
+become part of the metric name, e.g. opensea_requests{endpoint=assets,status=200}.
+'''
+
+import collections
+import threading
+import time
+
+# Most recent observations kept per latency summary
+SAMPLES = 500
+
+_lock = threading.Lock()
+_counters = {}
+_gauges = {}
+_summaries = {}
+_started = time.time()
+
+
+def metric_name(name, labels):
+    if not labels:
+        return name
+    return "%s{%s}" % (name, ",".join("%s=%s" % item for item in sorted(labels.items())))
+
+
+def incr(name, value=1, **labels):
+    key = metric_name(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def set_gauge(name, value, **labels):
+    key = metric_name(name, labels)
+    with _lock:
+        _gauges[key] = value
+
+
+def observe(name, value, **labels):
+    key = metric_name(name, labels)
+    with _lock:
+        samples = _summaries.get(key)
+        if samples is None:
+            samples = _summaries[key] = collections.deque(maxlen=SAMPLES)
+        samples.append(value)
+
+
+def percentiles(name, quantiles=(0.5, 0.95, 0.99), **labels):
+    '''
+    Returns (number of samples, [value at each quantile]) over the most
+    recent observations, or (0, None) if there are none
+    '''
+    key = metric_name(name, labels)
+    with _lock:
+        samples = list(_summaries.get(key) or ())
+    if not samples:
+        return 0, None
+    return len(samples), _quantiles(samples, quantiles)
+
+
+def _quantiles(samples, quantiles):
+    samples = sorted(samples)
+    return [samples[min(int(q * len(samples)), len(samples) - 1)] for q in quantiles]
+
+
+def snapshot():
+    with _lock:
+        summaries = {key: list(samples) for key, samples in _summaries.items()}
+        result = {
+            "uptime": round(time.time() - _started, 1),
+            "counters": dict(_counters),
+            "gauges": dict(_gauges),
+        }
+    result["summaries"] = {}
+    for key, samples in summaries.items():
+        p50, p95, p99 = _quantiles(samples, (0.5, 0.95, 0.99))
+        result["summaries"][key] = {"count": len(samples), "p50": p50, "p95": p95, "p99": p99}
+    return result
+
+
+def reset():
+    with _lock:
+        _counters.clear()
+        _gauges.clear()
+        _summaries.clear()
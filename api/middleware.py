@@ -0,0 +1,55 @@
+'''
+Per-request query budget
+
+Counts the queries each request runs on every database. A request that
+runs more than QUERY_BUDGET logs a warning naming the view, or raises
+QueryBudgetExceeded with QUERY_BUDGET_STRICT set, which the tests use to
+catch a new per-item query anywhere. api/tests.py holds the tighter
+per-endpoint budgets. Views whose work grows with the request body, like
+bulk ingestion, set request.query_budget to the budget they are held to.
+'''
+
+import contextlib
+import logging
+
+from django.conf import settings
+from django.db import connections
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+class QueryBudgetMiddleware:
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        queries = []
+
+        def count(execute, sql, params, many, context):
+            queries.append(context['connection'].alias)
+            return execute(sql, params, many, context)
+
+        with contextlib.ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(count))
+            response = self.get_response(request)
+
+        match = getattr(request, 'resolver_match', None)
+        view = match.url_name if match and match.url_name else "other"
+        metrics.observe("db_queries_per_request", len(queries), view=view)
+        budget = getattr(request, 'query_budget', settings.QUERY_BUDGET)
+        if len(queries) > budget:
+            metrics.incr("query_budget_exceeded", view=view)
+            message = "%s %s ran %d queries, over the budget of %d" % (
+                request.method, request.path, len(queries), budget)
+            if settings.QUERY_BUDGET_STRICT:
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+        return response
@@ -0,0 +1,29 @@
+# Generated by Django 3.1.2 on 2026-10-19 18:36
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_auto_20210110_1918'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Asset',
+            fields=[
+                ('token', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, serialize=False, to='api.token')),
+                ('name', models.CharField(blank=True, max_length=500, null=True)),
+                ('description', models.TextField(blank=True, null=True)),
+                ('image_url', models.TextField(blank=True, null=True)),
+                ('collection_slug', models.CharField(blank=True, db_index=True, max_length=200, null=True)),
+                ('collection_name', models.CharField(blank=True, max_length=200, null=True)),
+                ('creator_address', models.CharField(blank=True, max_length=100, null=True)),
+                ('data', models.JSONField()),
+                ('etag', models.CharField(max_length=40)),
+                ('fetched_at', models.DateTimeField(db_index=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,68 @@
+# Generated by Django 3.1.2 on 2026-10-19 18:40
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+SQLITE_FTS = [
+    """CREATE VIRTUAL TABLE api_searchdocument_fts USING fts5(
+        title, body, content='api_searchdocument', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3')""",
+    """CREATE TRIGGER api_searchdocument_fts_ai AFTER INSERT ON api_searchdocument BEGIN
+        INSERT INTO api_searchdocument_fts(rowid, title, body) VALUES (new.id, new.title, new.body);
+    END""",
+    """CREATE TRIGGER api_searchdocument_fts_ad AFTER DELETE ON api_searchdocument BEGIN
+        INSERT INTO api_searchdocument_fts(api_searchdocument_fts, rowid, title, body)
+        VALUES ('delete', old.id, old.title, old.body);
+    END""",
+    """CREATE TRIGGER api_searchdocument_fts_au AFTER UPDATE ON api_searchdocument BEGIN
+        INSERT INTO api_searchdocument_fts(api_searchdocument_fts, rowid, title, body)
+        VALUES ('delete', old.id, old.title, old.body);
+        INSERT INTO api_searchdocument_fts(rowid, title, body) VALUES (new.id, new.title, new.body);
+    END""",
+]
+
+SQLITE_FTS_DROP = [
+    "DROP TRIGGER IF EXISTS api_searchdocument_fts_ai",
+    "DROP TRIGGER IF EXISTS api_searchdocument_fts_ad",
+    "DROP TRIGGER IF EXISTS api_searchdocument_fts_au",
+    "DROP TABLE IF EXISTS api_searchdocument_fts",
+]
+
+MYSQL_FTS = ["ALTER TABLE api_searchdocument ADD FULLTEXT INDEX api_searchdocument_ft (title, body)"]
+
+MYSQL_FTS_DROP = ["ALTER TABLE api_searchdocument DROP INDEX api_searchdocument_ft"]
+
+
+def run_for_vendor(statements):
+    def run(apps, schema_editor):
+        for statement in statements.get(schema_editor.connection.vendor, []):
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_asset'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchDocument',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=100, unique=True)),
+                ('kind', models.CharField(max_length=20)),
+                ('title', models.CharField(max_length=500)),
+                ('body', models.TextField()),
+                ('updated', models.DateTimeField(auto_now=True)),
+                ('profile', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='api.profile')),
+                ('token', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='api.token')),
+            ],
+        ),
+        migrations.RunPython(
+            run_for_vendor({'sqlite': SQLITE_FTS, 'mysql': MYSQL_FTS}),
+            run_for_vendor({'sqlite': SQLITE_FTS_DROP, 'mysql': MYSQL_FTS_DROP}),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 3.1.2 on 2026-10-19 18:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_searchdocument'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HiddenAsset',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('contract_address', models.CharField(max_length=100)),
+                ('token_identifier', models.CharField(max_length=500)),
+                ('name', models.CharField(blank=True, max_length=500, null=True)),
+                ('reason', models.TextField(blank=True, null=True)),
+                ('added', models.DateTimeField(auto_now_add=True)),
+                ('updated', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'unique_together': {('contract_address', 'token_identifier')},
+            },
+        ),
+    ]
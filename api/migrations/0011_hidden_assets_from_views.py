@@ -0,0 +1,35 @@
+# Generated by Django 3.1.2 on 2026-10-19 18:53
+
+from django.db import migrations
+
+# Previously hard-coded in CollectionView
+HIDDEN_ASSETS = [
+    ("0xd07dc4262bcdbf85190c01c996b4c06a461d2430", "18359", "CryptoFinally x Stanley J Collab #1"),
+    ("0xd07dc4262bcdbf85190c01c996b4c06a461d2430", "18232", "Cum Rag"),
+    ("0x60f80121c31a0d46b5279700f9df786054aa5ee5", "7665", "Anjani"),
+    ("0xd07dc4262bcdbf85190c01c996b4c06a461d2430", "69135", "#01 The Joy of Bitcoin (Pink) [NSFW]"),
+]
+
+
+def add_hidden_assets(apps, schema_editor):
+    HiddenAsset = apps.get_model('api', 'HiddenAsset')
+    for contract_address, token_identifier, name in HIDDEN_ASSETS:
+        HiddenAsset.objects.get_or_create(
+            contract_address=contract_address, token_identifier=token_identifier, defaults={"name": name})
+
+
+def remove_hidden_assets(apps, schema_editor):
+    HiddenAsset = apps.get_model('api', 'HiddenAsset')
+    for contract_address, token_identifier, name in HIDDEN_ASSETS:
+        HiddenAsset.objects.filter(contract_address=contract_address, token_identifier=token_identifier).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_hiddenasset'),
+    ]
+
+    operations = [
+        migrations.RunPython(add_hidden_assets, remove_hidden_assets),
+    ]
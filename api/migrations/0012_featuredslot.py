@@ -0,0 +1,28 @@
+# Generated by Django 3.1.2 on 2026-10-19 18:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0011_hidden_assets_from_views'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FeaturedSlot',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('position', models.PositiveIntegerField(db_index=True)),
+                ('contract_address', models.CharField(max_length=100)),
+                ('token_identifier', models.CharField(max_length=500)),
+                ('name', models.CharField(blank=True, max_length=500, null=True)),
+                ('starts_at', models.DateTimeField(blank=True, null=True)),
+                ('ends_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'ordering': ['position', 'id'],
+            },
+        ),
+    ]
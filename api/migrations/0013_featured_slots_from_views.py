@@ -0,0 +1,41 @@
+# Generated by Django 3.1.2 on 2026-10-19 18:54
+
+from django.db import migrations
+
+# Previously hard-coded in FeaturedView
+FEATURED_ASSETS = [
+    ("0xb932a70a57673d89f4acffbe830e8ed7f75fb9e0", "5178", "Ikaros"),
+    ("0xb932a70a57673d89f4acffbe830e8ed7f75fb9e0", "16297", "Rebirth of Venus"),
+    ("0x397206a955a6a20d1688ede77a7c767a101a8cfc", "4800010007", "UNISWAP - Slimesunday"),
+    ("0xc937c594cb126fed0db22b41ab070bc206080825", "6100010025", "Carl Cox Portrait"),
+    ("0xfdd633b978f181d5a78ab10bc8e03466bcdf264a", "12100020002", "TEN #2/10 - SYM"),
+    ("0xd07dc4262bcdbf85190c01c996b4c06a461d2430", "54837", "Walking on the edge"),
+    ("0xd07dc4262bcdbf85190c01c996b4c06a461d2430", "65526", "Modern Sculpture"),
+    ("0xb932a70a57673d89f4acffbe830e8ed7f75fb9e0", "13307", "Face Machine"),
+    ("0x41a322b28d0ff354040e2cbc676f0320d8c8850d", "1611", "Mona Lisa re-imagined"),
+]
+
+
+def add_featured_slots(apps, schema_editor):
+    FeaturedSlot = apps.get_model('api', 'FeaturedSlot')
+    for position, (contract_address, token_identifier, name) in enumerate(FEATURED_ASSETS):
+        FeaturedSlot.objects.get_or_create(
+            contract_address=contract_address, token_identifier=token_identifier,
+            defaults={"position": position, "name": name})
+
+
+def remove_featured_slots(apps, schema_editor):
+    FeaturedSlot = apps.get_model('api', 'FeaturedSlot')
+    for contract_address, token_identifier, name in FEATURED_ASSETS:
+        FeaturedSlot.objects.filter(contract_address=contract_address, token_identifier=token_identifier).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0012_featuredslot'),
+    ]
+
+    operations = [
+        migrations.RunPython(add_featured_slots, remove_featured_slots),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 3.1.2 on 2026-10-19 21:10
+
+from django.db import migrations
+from django.db.models import Count, Min
+
+
+def merge_duplicate_tokens(apps, schema_editor):
+    '''
+    Folds Tokens created twice for the same contract and token_identifier
+    into the oldest one, moving their likes and stored asset over
+    '''
+    Token = apps.get_model('api', 'Token')
+    LikeHistory = apps.get_model('api', 'LikeHistory')
+    Asset = apps.get_model('api', 'Asset')
+    SearchDocument = apps.get_model('api', 'SearchDocument')
+
+    duplicated = Token.objects.values('contract_id', 'token_identifier').annotate(
+        count=Count('id'), keep=Min('id')).filter(count__gt=1)
+    for row in duplicated:
+        keep = Token.objects.get(id=row['keep'])
+        duplicates = list(Token.objects.filter(
+            contract_id=row['contract_id'], token_identifier=row['token_identifier']).exclude(id=keep.id))
+        duplicate_ids = [token.id for token in duplicates]
+
+        LikeHistory.objects.filter(token_id__in=duplicate_ids).update(token_id=keep.id)
+        if not Asset.objects.filter(token_id=keep.id).exists():
+            newest = Asset.objects.filter(token_id__in=duplicate_ids).order_by('-fetched_at').first()
+            if newest:
+                Asset.objects.filter(token_id=newest.token_id).update(token_id=keep.id)
+        Asset.objects.filter(token_id__in=duplicate_ids).delete()
+        # The kept token's document stays, or is written the next time its asset is stored
+        SearchDocument.objects.filter(token_id__in=duplicate_ids).delete()
+        if keep.creator_id is None:
+            creator_id = next((token.creator_id for token in duplicates if token.creator_id), None)
+            if creator_id:
+                Token.objects.filter(id=keep.id).update(creator_id=creator_id)
+        Token.objects.filter(id__in=duplicate_ids).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0013_featured_slots_from_views'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_tokens, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='token',
+            unique_together={('contract', 'token_identifier')},
+        ),
+    ]
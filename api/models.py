@@ -8,6 +8,8 @@ class Profile(models.Model):
     name = models.CharField(max_length=200, null=True, blank=True)
     twitter = models.CharField(max_length=100, null=True, blank=True)
     img_url = models.TextField(null=True, blank=True)
+    # Watermark for catching indexes up on edits; bulk updates set it themselves
+    updated = models.DateTimeField(auto_now=True, null=True, db_index=True)
 
 class Wallet(models.Model):
     address = models.CharField(max_length=100, unique=True)
@@ -23,8 +25,73 @@ class Token(models.Model):
     token_identifier = models.CharField(max_length=500)
     creator = models.ForeignKey(Wallet, null=True, blank=True, on_delete=SET_NULL)
 
+    class Meta:
+        unique_together = ('contract', 'token_identifier')
+
 class LikeHistory(models.Model):
     added = models.DateTimeField(auto_now_add=True)
     token = models.ForeignKey(Token, on_delete=CASCADE)
     profile = models.ForeignKey(Profile, on_delete=CASCADE)
     value = models.IntegerField() # +1 or -1 for like/unlike
+
+class Asset(models.Model):
+    # Projected OpenSea asset JSON, so restarts and new instances don't refetch it
+    token = models.OneToOneField(Token, primary_key=True, on_delete=CASCADE)
+    name = models.CharField(max_length=500, null=True, blank=True)
+    description = models.TextField(null=True, blank=True)
+    image_url = models.TextField(null=True, blank=True)
+    collection_slug = models.CharField(max_length=200, null=True, blank=True, db_index=True)
+    collection_name = models.CharField(max_length=200, null=True, blank=True)
+    creator_address = models.CharField(max_length=100, null=True, blank=True)
+    data = models.JSONField()
+    etag = models.CharField(max_length=40) # sha1 of data, to skip rewriting unchanged assets
+    fetched_at = models.DateTimeField(db_index=True)
+
+class SearchDocument(models.Model):
+    # One searchable asset or creator profile. The full-text index over
+    # title/body is created per database in migrations, see api/search.py
+    key = models.CharField(max_length=100, unique=True) # "asset:<token id>" or "profile:<profile id>"
+    kind = models.CharField(max_length=20)
+    token = models.ForeignKey(Token, null=True, blank=True, on_delete=CASCADE)
+    profile = models.ForeignKey(Profile, null=True, blank=True, on_delete=CASCADE)
+    title = models.CharField(max_length=500)
+    body = models.TextField()
+    updated = models.DateTimeField(auto_now=True)
+
+class HiddenAsset(models.Model):
+    # Takedowns: flagged with showtime.hide in every list, see api/moderation.py
+    contract_address = models.CharField(max_length=100)
+    token_identifier = models.CharField(max_length=500)
+    name = models.CharField(max_length=500, null=True, blank=True)
+    reason = models.TextField(null=True, blank=True)
+    added = models.DateTimeField(auto_now_add=True)
+    updated = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('contract_address', 'token_identifier')
+
+    def save(self, *args, **kwargs):
+        self.contract_address = self.contract_address.lower()
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return self.name or "%s/%s" % (self.contract_address, self.token_identifier)
+
+class FeaturedSlot(models.Model):
+    # Homepage curation, listed by /v1/featured in position order while active
+    position = models.PositiveIntegerField(db_index=True)
+    contract_address = models.CharField(max_length=100)
+    token_identifier = models.CharField(max_length=500)
+    name = models.CharField(max_length=500, null=True, blank=True)
+    starts_at = models.DateTimeField(null=True, blank=True)
+    ends_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['position', 'id']
+
+    def save(self, *args, **kwargs):
+        self.contract_address = self.contract_address.lower()
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return self.name or "%s/%s" % (self.contract_address, self.token_identifier)
@@ -0,0 +1,62 @@
+'''
+Hidden-asset blocklist
+
+Takedowns are rows in api.HiddenAsset, managed from the Django admin. Each
+process keeps them in a set of (contract address, token_id) so checking an
+asset is a single hash lookup. Every HIDDEN_ASSETS_REFRESH seconds one
+aggregate query compares the table's version (row count and last update)
+with the loaded one, and the set is reloaded only when it changed, so
+takedowns reach every instance without a deploy.
+'''
+
+import threading
+import time
+
+from django.conf import settings
+from django.db.models import Count, Max
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import HiddenAsset
+
+_lock = threading.Lock()
+_hidden = frozenset()
+_version = None
+_checked_at = 0
+
+
+def table_version():
+    row = HiddenAsset.objects.aggregate(Count('id'), Max('updated'))
+    return (row['id__count'], row['updated__max'])
+
+
+def hidden_assets():
+    '''
+    Returns the set of hidden (contract address, token_id), refreshed if the
+    table changed
+    '''
+    global _hidden, _version, _checked_at
+    if time.time() - _checked_at < settings.HIDDEN_ASSETS_REFRESH:
+        return _hidden
+
+    with _lock:
+        if time.time() - _checked_at >= settings.HIDDEN_ASSETS_REFRESH:
+            version = table_version()
+            if version != _version:
+                _hidden = frozenset(HiddenAsset.objects.values_list('contract_address', 'token_identifier'))
+                _version = version
+            _checked_at = time.time()
+    return _hidden
+
+
+def is_hidden(contract_address, token_id):
+    return (contract_address.lower(), str(token_id)) in hidden_assets()
+
+
+@receiver(post_save, sender=HiddenAsset)
+@receiver(post_delete, sender=HiddenAsset)
+def hidden_assets_changed(**kwargs):
+    # Changes made in this process apply right away, other processes
+    # pick them up on their next version check
+    global _checked_at
+    _checked_at = 0
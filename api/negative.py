@@ -0,0 +1,116 @@
+'''
+Negative caching of OpenSea "not found" answers
+
+When OpenSea answers 400/404 for a token, contract, collection or owner, or
+leaves a requested token out of an /assets result, the answer is cached for
+NEGATIVE_CACHE_TTL seconds so bots and broken links don't send the same bad
+request upstream again and again.
+
+Each process also adds the bad keys to an in-memory Bloom filter. Good keys
+are almost never in it, so for them lookup() returns without touching the
+cache at all; a key the filter has seen is confirmed against the cache,
+which also expires it, so a false positive never rejects a good key. The
+filter is swapped for an empty one every NEGATIVE_CACHE_TTL seconds, keeping
+the last generation, so it doesn't fill up. Other processes find out about a
+bad key after their own first upstream call for it.
+
+Keys are tuples such as ("token", contract address, token_id).
+'''
+
+import hashlib
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from . import metrics
+
+# Bits per Bloom filter generation (128KB) and bits set per key: about a 1%
+# false-positive rate at 100k bad keys
+BLOOM_BITS = 1 << 20
+BLOOM_HASHES = 7
+
+# Upstream statuses that mean the request itself is bad. Server errors and
+# 429s are left to the circuit breaker and rate limiter.
+NEGATIVE_STATUSES = (400, 404)
+
+
+class BloomFilter:
+    '''
+    Fixed-size set of strings with no false negatives and a false-positive
+    rate that grows with the number of items added
+    '''
+
+    def __init__(self, bits=BLOOM_BITS, hashes=BLOOM_HASHES):
+        self.bits = bits
+        self.hashes = hashes
+        self._array = bytearray(bits // 8)
+        self._lock = threading.Lock()
+
+    def _positions(self, item):
+        # Double hashing: positions h1 + i * h2 from one 128-bit digest
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.bits for i in range(self.hashes)]
+
+    def add(self, item):
+        positions = self._positions(item)
+        with self._lock:
+            for position in positions:
+                self._array[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, item):
+        return all(self._array[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+
+_lock = threading.Lock()
+_filters = (BloomFilter(), BloomFilter())
+_rotated_at = time.time()
+
+
+def _key(key):
+    return ":".join(str(part).lower() for part in key)
+
+
+def _current_filters():
+    global _filters, _rotated_at
+    if time.time() - _rotated_at >= settings.NEGATIVE_CACHE_TTL:
+        with _lock:
+            if time.time() - _rotated_at >= settings.NEGATIVE_CACHE_TTL:
+                _filters = (BloomFilter(), _filters[0])
+                _rotated_at = time.time()
+    return _filters
+
+
+def lookup(key):
+    '''
+    Returns the upstream status cached for a known-bad key, or None
+    '''
+    item = _key(key)
+    if not any(item in bloom for bloom in _current_filters()):
+        return None
+    status_code = cache.get("negative_" + item)
+    if status_code is not None:
+        metrics.incr("negative_cache_hits", kind=key[0])
+    return status_code
+
+
+def remember(key, status_code):
+    '''
+    Caches a bad upstream answer for `key`. Statuses that don't say the key
+    is bad are ignored.
+    '''
+    if status_code not in NEGATIVE_STATUSES:
+        return
+    item = _key(key)
+    _current_filters()[0].add(item)
+    cache.set("negative_" + item, status_code, settings.NEGATIVE_CACHE_TTL)
+
+
+def reset():
+    global _filters, _rotated_at
+    with _lock:
+        _filters = (BloomFilter(), BloomFilter())
+        _rotated_at = time.time()
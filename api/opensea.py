@@ -0,0 +1,540 @@
+'''
+OpenSea API client
+
+All outbound OpenSea calls go through get(), which fails fast while the
+circuit breaker is open and otherwise waits for a token from the rate
+limiter first. Timeouts follow each endpoint's recent latency, and a call
+that is slower than usual is hedged with a second, identical one. Token metadata lookups go through asset_loader,
+which batches lookups from concurrent requests into combined /assets calls.
+'''
+
+import collections
+import heapq
+import itertools
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+
+import requests
+from django.conf import settings
+from django.core.cache import cache
+
+from . import metrics
+from .assets import asset_key
+
+# Most tokens OpenSea returns from one /assets call
+BATCH_SIZE = 50
+
+# Priority lanes, served in this order when calls have to queue
+INTERACTIVE = 0  # a user is waiting on this one token or wallet
+BULK = 1         # list pages that are cached for everyone (featured, collections)
+BACKGROUND = 2   # warmers and other work nobody is waiting on
+LANES = {INTERACTIVE: "interactive", BULK: "bulk", BACKGROUND: "background"}
+
+# Longest a call waits in each lane before giving up with a 429
+MAX_WAIT = {INTERACTIVE: 3, BULK: 10, BACKGROUND: 60}
+
+# Retries after OpenSea answers 429, and the wait when it sends no Retry-After
+MAX_RETRIES = 2
+DEFAULT_RETRY_AFTER = 1
+
+# Latency samples an endpoint needs before its timeout adapts and calls are hedged
+MIN_LATENCY_SAMPLES = 20
+# Adaptive timeouts are this multiple of the endpoint's p99
+TIMEOUT_P99_FACTOR = 3
+# Threads sending OpenSea calls, so a hedged call can finish before the original
+MAX_CONCURRENT_CALLS = 64
+
+# Circuit breaker states
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class OpenSeaError(Exception):
+    '''
+    Raised when OpenSea answers with a non-200 status or can't be reached
+    '''
+
+    def __init__(self, status_code):
+        super().__init__("Error from OpenSea API: %s" % status_code)
+        self.status_code = status_code
+
+
+class CircuitOpenError(OpenSeaError):
+    '''
+    Raised instead of calling OpenSea while the circuit breaker is open
+    '''
+
+    def __init__(self):
+        super().__init__(503)
+
+
+class RateLimiter:
+    '''
+    Token bucket for outbound OpenSea calls, shared by every thread in the
+    process.
+
+    Callers queue by lane and a token is only handed to the head of the
+    queue, so interactive calls always go ahead of bulk and background ones.
+    On top of the local bucket, every call also counts against a per-second
+    budget in the cache (OPENSEA_RATE_LIMIT in total), so processes sharing
+    a cache share the limit. After a 429 all processes sharing the cache
+    hold off until OpenSea's Retry-After has passed. The lock only covers
+    the queue and the local bucket, and cache round trips happen outside it,
+    so a slow cache doesn't hold up every call in the process.
+    '''
+
+    PAUSE_KEY = "opensea_throttled_until"
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._queue = []
+        self._seq = itertools.count()
+        self._tokens = None
+        self._updated = time.monotonic()
+        self._paused_until = 0
+
+    def acquire(self, priority=INTERACTIVE, max_wait=None):
+        '''
+        Blocks until the call may go out and returns the seconds waited.
+        Raises OpenSeaError(429) if that would take longer than `max_wait`,
+        by default MAX_WAIT for the lane.
+        '''
+        started = time.monotonic()
+        deadline = started + (MAX_WAIT[priority] if max_wait is None else max_wait)
+        entry = (priority, next(self._seq))
+        lane = LANES[priority]
+
+        with self._cond:
+            heapq.heappush(self._queue, entry)
+            self._report_depth()
+        try:
+            while True:
+                paused = self._shared_pause()
+                with self._cond:
+                    wait = max(paused, self._wait_time())
+                    if wait <= 0 and self._queue[0] == entry:
+                        # Held while the shared budget is checked, and handed back if it is spent
+                        self._tokens -= 1
+                    else:
+                        # Not at the head: sleep until the queue moves
+                        self._wait(wait, deadline, lane)
+                        continue
+
+                wait = self._claim_shared()
+                if wait <= 0:
+                    waited = time.monotonic() - started
+                    metrics.incr("opensea_wait_seconds", waited, lane=lane)
+                    return waited
+                with self._cond:
+                    self._tokens += 1
+                    self._wait(wait, deadline, lane)
+        finally:
+            with self._cond:
+                self._queue.remove(entry)
+                heapq.heapify(self._queue)
+                self._report_depth()
+                self._cond.notify_all()
+
+    def _wait(self, wait, deadline, lane):
+        # Caller holds self._cond
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            metrics.incr("opensea_rejected", lane=lane)
+            raise OpenSeaError(429)
+        self._cond.wait(min(wait, remaining) if wait > 0 else remaining)
+
+    def pause(self, seconds):
+        '''Stops all calls for `seconds`, after OpenSea throttled us'''
+        until = time.time() + seconds
+        with self._cond:
+            self._paused_until = max(self._paused_until, until)
+            self._cond.notify_all()
+        cache.set(self.PAUSE_KEY, until, int(seconds) + 1)
+
+    def _shared_pause(self):
+        # Seconds left of a pause set by any process sharing the cache
+        return (cache.get(self.PAUSE_KEY) or 0) - time.time()
+
+    def _wait_time(self):
+        # Seconds until a local token is free and no local pause is in effect.
+        # Caller holds self._cond.
+        now = time.time()
+        if self._paused_until > now:
+            return self._paused_until - now
+
+        rate = settings.OPENSEA_RATE_LIMIT
+        burst = max(settings.OPENSEA_RATE_BURST, 1)
+        monotonic = time.monotonic()
+        if self._tokens is None:
+            self._tokens = burst
+        self._tokens = min(burst, self._tokens + (monotonic - self._updated) * rate)
+        self._updated = monotonic
+        if self._tokens >= 1:
+            return 0
+        return (1 - self._tokens) / rate
+
+    def _claim_shared(self):
+        # Counts the call against the shared per-second budget. Returns 0,
+        # or the seconds to wait if the budget is spent.
+        now = time.time()
+        key = "opensea_calls_%d" % now
+        cache.add(key, 0, 5)
+        try:
+            calls = cache.incr(key)
+        except ValueError:
+            calls = 1
+        if calls > settings.OPENSEA_RATE_LIMIT:
+            return 1 - (now % 1)
+        return 0
+
+    def _report_depth(self):
+        for priority, lane in LANES.items():
+            metrics.set_gauge("opensea_queue_depth", sum(1 for entry in self._queue if entry[0] == priority), lane=lane)
+
+
+rate_limiter = RateLimiter()
+
+
+class CircuitBreaker:
+    '''
+    Stops calling OpenSea while it is failing, so requests fail in
+    milliseconds and views can fall back to stored data, instead of each
+    one waiting on a dead upstream.
+
+    While closed, the outcomes of the last OPENSEA_BREAKER_WINDOW seconds of
+    calls are kept, and the breaker opens once OPENSEA_BREAKER_ERROR_RATE of
+    them failed. Open, it refuses every call for OPENSEA_BREAKER_COOLDOWN
+    seconds and then turns half-open: a single probe call goes out, which
+    closes the breaker if it succeeds and reopens it if not. Server errors,
+    timeouts and connection errors count as failures, 429s and other 4xx
+    answers don't. The state is kept per process.
+    '''
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._outcomes = collections.deque()
+            self._failures = 0
+            self._opened_at = 0
+            self._probing = False
+            self._set_state(CLOSED)
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._state == OPEN and self._cooled_down():
+                return HALF_OPEN
+            return self._state
+
+    def before_call(self):
+        '''
+        Raises CircuitOpenError if a call mustn't go out now. Every call that
+        is let through has to report back with after_call().
+        '''
+        with self._lock:
+            if self._state == CLOSED:
+                return
+            if self._state == OPEN and self._cooled_down():
+                self._set_state(HALF_OPEN)
+            if self._state == OPEN or self._probing:
+                metrics.incr("opensea_short_circuited")
+                raise CircuitOpenError()
+            self._probing = True
+
+    def after_call(self, ok):
+        '''
+        Records how a call went: True, False for a failure, or None if it
+        never reached OpenSea or says nothing about its health
+        '''
+        with self._lock:
+            if self._state == HALF_OPEN:
+                self._probing = False
+                if ok:
+                    self._close()
+                elif ok is not None:
+                    self._open()
+                return
+            if self._state == OPEN or ok is None:
+                return
+
+            now = time.monotonic()
+            self._outcomes.append((now, ok))
+            if not ok:
+                self._failures += 1
+            cutoff = now - settings.OPENSEA_BREAKER_WINDOW
+            while self._outcomes and self._outcomes[0][0] < cutoff:
+                if not self._outcomes.popleft()[1]:
+                    self._failures -= 1
+
+            calls = len(self._outcomes)
+            if calls >= settings.OPENSEA_BREAKER_MIN_CALLS and \
+                    self._failures >= calls * settings.OPENSEA_BREAKER_ERROR_RATE:
+                self._open()
+
+    def _cooled_down(self):
+        return time.monotonic() - self._opened_at >= settings.OPENSEA_BREAKER_COOLDOWN
+
+    def _open(self):
+        self._opened_at = time.monotonic()
+        self._set_state(OPEN)
+        metrics.incr("opensea_breaker_opened")
+
+    def _close(self):
+        self._outcomes.clear()
+        self._failures = 0
+        self._set_state(CLOSED)
+
+    def _set_state(self, state):
+        self._state = state
+        metrics.set_gauge("opensea_breaker_state", state)
+
+
+breaker = CircuitBreaker()
+
+
+class HedgeBudget:
+    '''
+    Caps hedged calls at OPENSEA_HEDGE_BUDGET of all calls, counted per minute
+    '''
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._minute = None
+        self._calls = 0
+        self._hedges = 0
+
+    def count_call(self):
+        with self._lock:
+            self._roll()
+            self._calls += 1
+
+    def take(self):
+        '''Returns True if another hedged call fits in the budget'''
+        with self._lock:
+            self._roll()
+            if self._hedges >= self._calls * settings.OPENSEA_HEDGE_BUDGET:
+                return False
+            self._hedges += 1
+            return True
+
+    def _roll(self):
+        minute = int(time.time() // 60)
+        if minute != self._minute:
+            self._minute, self._calls, self._hedges = minute, 0, 0
+
+
+hedge_budget = HedgeBudget()
+_executor = ThreadPoolExecutor(max_workers=MAX_CONCURRENT_CALLS, thread_name_prefix="opensea")
+
+
+def latency_policy(endpoint):
+    '''
+    Returns (timeout, hedge delay or None) for a call to `endpoint`: the
+    timeout is TIMEOUT_P99_FACTOR times its recent p99 and calls are hedged
+    after its p95, once there are enough samples to go by
+    '''
+    count, values = metrics.percentiles("opensea_latency_seconds", (0.95, 0.99), endpoint=endpoint)
+    if count < MIN_LATENCY_SAMPLES:
+        return settings.OPENSEA_TIMEOUT, None
+    p95, p99 = values
+    timeout = min(max(p99 * TIMEOUT_P99_FACTOR, settings.OPENSEA_MIN_TIMEOUT), settings.OPENSEA_TIMEOUT)
+    return timeout, p95
+
+
+def _timed_get(url, params, timeout, endpoint):
+    started = time.monotonic()
+    try:
+        return requests.get(url, params=params, timeout=timeout)
+    finally:
+        # Timeouts and failures count too, or the p99 would only cover the
+        # calls that got through and the timeout would shrink under a slowdown
+        metrics.observe("opensea_latency_seconds", time.monotonic() - started, endpoint=endpoint)
+
+
+def _hedged_get(path, params, endpoint, priority):
+    '''
+    Sends the GET, and if it hasn't been answered after the endpoint's p95
+    latency, sends it again and returns whichever answer arrives first.
+    Hedges need a free rate limiter token and room in the hedge budget.
+    '''
+    url = settings.OPENSEA_API_URL + path
+    timeout, hedge_delay = latency_policy(endpoint)
+    hedge_budget.count_call()
+    futures = [_executor.submit(_timed_get, url, params, timeout, endpoint)]
+
+    if hedge_delay is not None and not wait(futures, hedge_delay).done and breaker.state == CLOSED \
+            and hedge_budget.take():
+        try:
+            rate_limiter.acquire(priority, max_wait=0)
+        except OpenSeaError:
+            pass
+        else:
+            metrics.incr("opensea_hedged", endpoint=endpoint)
+            futures.append(_executor.submit(_timed_get, url, params, timeout, endpoint))
+
+    # The first good answer wins; errors only count if both calls fail
+    pending = set(futures)
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is None and future.result().status_code < 500:
+                if future is not futures[0]:
+                    metrics.incr("opensea_hedge_won", endpoint=endpoint)
+                return future.result()
+    return futures[0].result()
+
+
+def get(path, params=None, priority=INTERACTIVE):
+    '''
+    Sends a GET to an OpenSea API path such as "/assets" once the rate
+    limiter allows it, retrying after 429s. Raises CircuitOpenError while
+    OpenSea is failing.
+    '''
+    endpoint = path.strip("/").split("/")[0]
+    for attempt in range(MAX_RETRIES + 1):
+        breaker.before_call()
+        try:
+            rate_limiter.acquire(priority)
+            response = _hedged_get(path, params, endpoint, priority)
+        except OpenSeaError:
+            breaker.after_call(None)
+            raise
+        except requests.RequestException:
+            metrics.incr("opensea_requests", endpoint=endpoint, status="error")
+            breaker.after_call(False)
+            raise
+
+        metrics.incr("opensea_requests", endpoint=endpoint, status=response.status_code)
+        breaker.after_call(None if response.status_code == 429 else response.status_code < 500)
+        if response.status_code != 429:
+            return response
+
+        metrics.incr("opensea_throttled", endpoint=endpoint)
+        try:
+            retry_after = float(response.headers.get("Retry-After", ""))
+        except ValueError:
+            retry_after = DEFAULT_RETRY_AFTER * 2 ** attempt
+        rate_limiter.pause(retry_after)
+    return response
+
+
+def list_assets(params, priority=INTERACTIVE):
+    '''
+    Returns the asset list from /assets. Raises OpenSeaError if OpenSea
+    fails, can't be reached or we're throttled.
+    '''
+    try:
+        response = get("/assets", params, priority)
+    except requests.RequestException:
+        raise OpenSeaError(502)
+    if response.status_code != 200:
+        raise OpenSeaError(response.status_code)
+    return response.json().get('assets') or []
+
+
+class AssetLoader:
+    '''
+    DataLoader-style batching of token metadata lookups.
+
+    Lookups that arrive within OPENSEA_BATCH_WINDOW seconds of each other, from
+    any thread, are deduped and fetched with /assets calls of up to 50
+    tokens. A batch is sent early once it is full. Each caller gets back the
+    asset for its own token, or None if OpenSea didn't return it.
+    '''
+
+    def __init__(self, window=None, batch_size=BATCH_SIZE):
+        self.window = window
+        self.batch_size = batch_size
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._in_flight = {}
+        self._priority = BACKGROUND
+        self._timer = None
+
+    def load(self, contract_address, token_id, priority=INTERACTIVE):
+        return self.load_many([(contract_address, token_id)], priority)[(contract_address, token_id)]
+
+    def load_many(self, keys, priority=INTERACTIVE):
+        '''
+        Returns {(contract address, token_id): asset or None}. Raises
+        OpenSeaError if OpenSea fails for any of the keys. A batch goes out
+        in the most urgent lane of the lookups in it.
+        '''
+        futures = {key: self._enqueue(key, priority) for key in keys}
+        return {key: future.result() for key, future in futures.items()}
+
+    def _enqueue(self, key, priority):
+        key = (key[0].lower(), str(key[1]))
+        with self._lock:
+            future = self._pending.get(key) or self._in_flight.get(key)
+            if future:
+                self._priority = min(self._priority, priority)
+                return future
+
+            future = Future()
+            self._pending[key] = future
+            self._priority = min(self._priority, priority)
+            if len(self._pending) >= self.batch_size:
+                batch, priority = self._take()
+                threading.Thread(target=self._fetch, args=(batch, priority), daemon=True).start()
+            elif self._timer is None:
+                window = self.window if self.window is not None else settings.OPENSEA_BATCH_WINDOW
+                self._timer = threading.Timer(window, self._flush)
+                self._timer.daemon = True
+                self._timer.start()
+        return future
+
+    def _take(self):
+        # Caller holds self._lock
+        batch, priority = self._pending, self._priority
+        self._pending = {}
+        self._priority = BACKGROUND
+        self._in_flight.update(batch)
+        if self._timer:
+            self._timer.cancel()
+            self._timer = None
+        return batch, priority
+
+    def _flush(self):
+        with self._lock:
+            batch, priority = self._take()
+        if batch:
+            self._fetch(batch, priority)
+
+    def _fetch(self, batch, priority):
+        keys = list(batch)
+        for i in range(0, len(keys), self.batch_size):
+            chunk = keys[i:i + self.batch_size]
+            try:
+                assets = list_assets({
+                    "token_ids": [key[1] for key in chunk],
+                    "asset_contract_addresses": [key[0] for key in chunk],
+                    "limit": len(chunk),
+                }, priority)
+
+                found = {}
+                for asset in assets:
+                    key = asset_key(asset)
+                    if key:
+                        found[(key[0].lower(), key[1])] = asset
+                for key in chunk:
+                    batch[key].set_result(found.get(key))
+            except Exception as error:
+                if not isinstance(error, OpenSeaError):
+                    error = OpenSeaError(502)
+                for key in chunk:
+                    if not batch[key].done():
+                        batch[key].set_exception(error)
+            finally:
+                with self._lock:
+                    for key in chunk:
+                        if self._in_flight.get(key) is batch[key]:
+                            del self._in_flight[key]
+
+
+asset_loader = AssetLoader()
@@ -0,0 +1,160 @@
+'''
+Read-replica routing with read-your-writes
+
+The heavy reads (the leaderboard, like lists and like counts) run inside
+reads(), which sends them to the DB_READ_REPLICA database when one is
+configured. ReplicaRouter routes ORM queries and raw SQL uses
+connections[alias] with the alias reads() yields. Everything else, and
+every write, stays on the primary.
+
+A replica lags behind the primary, so after a like pin() sends that
+address's reads to the primary for REPLICA_PIN_SECONDS, and the user sees
+their own like right away. ReplicaMiddleware takes the request's address
+from the UserAddress header or the address parameter. Pins are kept in the
+shared cache (CACHE_MEMCACHED_LOCATION) so every instance sees them.
+
+Cached values computed from the replica can't hold a write back either.
+The writer pins the tags it is about to invalidate with pin_tags(), and
+whoever refills an entry for a pinned tag reads it from the primary, so a
+lagging replica never puts the old value back in the cache. A pinned
+request bypasses such caches altogether.
+'''
+
+import contextlib
+import threading
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from . import metrics
+
+_local = threading.local()
+
+
+def _pin_key(address):
+    return "replica_pin_" + address.lower()
+
+
+def _tag_pin_key(tag):
+    return "replica_pin_tag_" + tag
+
+
+def _configured():
+    alias = settings.DB_READ_REPLICA
+    return bool(alias) and alias in connections.databases
+
+
+def pin(address):
+    '''
+    Reads for `address` go to the primary for the next REPLICA_PIN_SECONDS
+    '''
+    if address:
+        cache.set(_pin_key(address), True, settings.REPLICA_PIN_SECONDS)
+
+
+def pin_tags(tags):
+    '''
+    Data behind `tags` is read from the primary for the next
+    REPLICA_PIN_SECONDS. Call it before invalidating the tags.
+    '''
+    if _configured():
+        cache.set_many({_tag_pin_key(tag): True for tag in tags}, settings.REPLICA_PIN_SECONDS)
+
+
+def pinned_tags(tags):
+    '''
+    Returns the set of `tags` that were pinned within REPLICA_PIN_SECONDS
+    '''
+    if not _configured():
+        return set()
+    found = cache.get_many([_tag_pin_key(tag) for tag in tags])
+    return {tag for tag in tags if _tag_pin_key(tag) in found}
+
+
+def pinned():
+    '''
+    Whether this request reads from the primary because its address was pinned
+    '''
+    return _configured() and _pinned()
+
+
+def _pinned():
+    address = getattr(_local, 'address', None)
+    if not address:
+        return False
+    if _local.pinned is None:
+        _local.pinned = cache.get(_pin_key(address)) is not None
+    return _local.pinned
+
+
+def replica_alias():
+    '''
+    Returns the replica alias to read from in this request, or None
+    '''
+    if not _configured() or _pinned() or getattr(_local, 'primary', False):
+        return None
+    return settings.DB_READ_REPLICA
+
+
+@contextlib.contextmanager
+def primary():
+    '''
+    Keeps the reads inside the block on the primary
+    '''
+    previous = getattr(_local, 'primary', False)
+    _local.primary = True
+    try:
+        yield
+    finally:
+        _local.primary = previous
+
+
+@contextlib.contextmanager
+def reads():
+    '''
+    Routes the reads inside the block to the replica and yields the alias
+    they use
+    '''
+    previous = getattr(_local, 'alias', None)
+    _local.alias = replica_alias()
+    alias = _local.alias or DEFAULT_DB_ALIAS
+    metrics.incr("db_reads_routed", database=alias)
+    try:
+        yield alias
+    finally:
+        _local.alias = previous
+
+
+class ReplicaRouter:
+
+    def db_for_read(self, model, **hints):
+        return getattr(_local, 'alias', None)
+
+    def db_for_write(self, model, **hints):
+        # Explicit, or Django would save objects read from the replica back to it
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+
+class ReplicaMiddleware:
+    '''
+    Remembers the address a request is for, so reads() can check its pin
+    '''
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        _local.address = request.headers.get('UserAddress') or request.GET.get('address')
+        _local.pinned = None
+        try:
+            return self.get_response(request)
+        finally:
+            _local.address = None
+            _local.pinned = None
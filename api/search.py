@@ -0,0 +1,230 @@
+'''
+Full-text search over assets and creator profiles
+
+Searchable text lives in api.SearchDocument: one row per stored asset
+(name, description, collection, creator) and one per named profile (name,
+twitter handle, wallet addresses). The database keeps the full-text index
+in sync - an FTS5 table maintained by triggers on SQLite, a FULLTEXT index
+on MySQL - and get_backend() picks the matching query implementation.
+
+Documents are updated incrementally from store_assets() and wherever
+profiles change; `python manage.py rebuild_search_index` rebuilds them all.
+'''
+
+import re
+import time
+
+from django.db import OperationalError, connection
+
+from . import bulk
+from .models import Asset, Profile, SearchDocument, Wallet
+
+WORD_RE = re.compile(r"\w+", re.UNICODE)
+WRITE_ATTEMPTS = 5
+
+
+class SearchBackend:
+    '''
+    Returns SearchDocument ids for a query, best match first
+    '''
+
+    def search(self, terms, offset, limit):
+        raise NotImplementedError
+
+
+class SQLiteBackend(SearchBackend):
+    '''
+    FTS5 with bm25 ranking, names weighted above descriptions. The last term
+    is matched as a prefix so partially typed words still hit. FTS5 ranks
+    the whole match set through its rank column.
+    '''
+
+    def search(self, terms, offset, limit):
+        match = " ".join('"%s"' % term for term in terms) + "*"
+        with connection.cursor() as cursor:
+            cursor.execute("""
+            select rowid
+            from api_searchdocument_fts
+            where api_searchdocument_fts match %s
+            and rank match 'bm25(5.0, 1.0)'
+            order by rank
+            limit %s offset %s
+            """, (match, limit, offset))
+            return [row[0] for row in cursor.fetchall()]
+
+
+class MySQLBackend(SearchBackend):
+    '''
+    InnoDB FULLTEXT in boolean mode, every term required, ranked by relevance
+    '''
+
+    def search(self, terms, offset, limit):
+        match = " ".join("+%s" % term for term in terms) + "*"
+        with connection.cursor() as cursor:
+            cursor.execute("""
+            select id
+            from api_searchdocument
+            where match(title, body) against (%s in boolean mode)
+            order by match(title, body) against (%s in boolean mode) desc
+            limit %s offset %s
+            """, (match, match, limit, offset))
+            return [row[0] for row in cursor.fetchall()]
+
+
+class BasicBackend(SearchBackend):
+    '''
+    Unindexed fallback for other databases
+    '''
+
+    def search(self, terms, offset, limit):
+        documents = SearchDocument.objects.all()
+        for term in terms:
+            documents = documents.filter(title__icontains=term) | documents.filter(body__icontains=term)
+        return list(documents.order_by('id').values_list('id', flat=True)[offset:offset + limit])
+
+
+def get_backend():
+    if connection.vendor == 'sqlite':
+        return SQLiteBackend()
+    if connection.vendor == 'mysql':
+        return MySQLBackend()
+    return BasicBackend()
+
+
+def search(query, offset=0, limit=20):
+    '''
+    Returns ranked SearchDocuments matching `query`, with the stored asset or
+    profile preloaded
+    '''
+    terms = WORD_RE.findall(query.lower())
+    if not terms:
+        return []
+
+    ids = get_backend().search(terms, offset, limit)
+    documents = SearchDocument.objects.filter(id__in=ids).select_related('token__asset', 'profile')
+    by_id = {document.id: document for document in documents
+             if document.kind != "asset" or hasattr(document.token, 'asset')}
+    return [by_id[i] for i in ids if i in by_id]
+
+
+def retry_locked(write):
+    '''
+    The FTS5 triggers read the index before writing to it, and SQLite fails
+    a transaction that has to upgrade from reading to writing while another
+    connection writes instead of waiting, so document writes are retried.
+    Each one is idempotent and runs in its own transaction.
+    '''
+    for attempt in range(WRITE_ATTEMPTS):
+        try:
+            return write()
+        except OperationalError as error:
+            if connection.vendor != 'sqlite' or 'locked' not in str(error) or attempt == WRITE_ATTEMPTS - 1:
+                raise
+            time.sleep(0.05 * (attempt + 1))
+
+
+def save_documents(documents):
+    '''
+    Upserts {key: SearchDocument} in bulk, skipping unchanged rows. Documents
+    with no title are removed from the index.
+    '''
+    if not documents:
+        return
+
+    existing = {row[0]: row[1:] for row in SearchDocument.objects.filter(
+        key__in=documents.keys()).values_list('key', 'id', 'title', 'body')}
+
+    to_create = []
+    to_update = []
+    to_delete = []
+    for key, document in documents.items():
+        if key in existing:
+            document.id, title, body = existing[key]
+            if not document.title:
+                to_delete.append(document.id)
+            elif (title, body) != (document.title, document.body):
+                to_update.append(document)
+        elif document.title:
+            to_create.append(document)
+
+    if to_create:
+        retry_locked(lambda: SearchDocument.objects.bulk_create(to_create, ignore_conflicts=True))
+    if to_update:
+        retry_locked(lambda: bulk.update_rows(to_update, ['title', 'body']))
+    if to_delete:
+        retry_locked(lambda: SearchDocument.objects.filter(id__in=to_delete).delete())
+
+
+def index_assets(assets):
+    '''
+    Indexes api.Asset rows (name, description, collection, creator)
+    '''
+    documents = {}
+    for asset in assets:
+        creator = (asset.data or {}).get('creator') or {}
+        creator_name = (creator.get('user') or {}).get('username')
+        key = "asset:%s" % asset.token_id
+        documents[key] = SearchDocument(
+            key=key,
+            kind="asset",
+            token_id=asset.token_id,
+            title=(asset.name or "")[:500],
+            body=" ".join(filter(None, [asset.collection_name, creator_name, asset.description])),
+        )
+    save_documents(documents)
+
+
+def index_profiles(profile_ids):
+    '''
+    Indexes profiles (name, twitter handle, wallet addresses)
+    '''
+    profile_ids = set(filter(None, profile_ids))
+    if not profile_ids:
+        return
+
+    addresses = {}
+    for profile_id, address in Wallet.objects.filter(profile_id__in=profile_ids).values_list('profile_id', 'address'):
+        addresses.setdefault(profile_id, []).append(address)
+
+    documents = {}
+    for profile in Profile.objects.filter(id__in=profile_ids):
+        key = "profile:%s" % profile.id
+        documents[key] = SearchDocument(
+            key=key,
+            kind="profile",
+            profile_id=profile.id,
+            title=(profile.name or "")[:500],
+            body=" ".join(filter(None, [profile.twitter] + addresses.get(profile.id, []))),
+        )
+    save_documents(documents)
+
+
+def rebuild(batch_size=2000, log=None):
+    '''
+    Reindexes every stored asset and named profile
+    '''
+    count = 0
+    assets = Asset.objects.order_by('token_id')
+    last = 0
+    while True:
+        batch = list(assets.filter(token_id__gt=last)[:batch_size])
+        if not batch:
+            break
+        index_assets(batch)
+        last = batch[-1].token_id
+        count += len(batch)
+        if log:
+            log("Assets: %d" % count)
+
+    count = 0
+    profile_ids = Profile.objects.exclude(name__isnull=True).exclude(name="").order_by('id').values_list('id', flat=True)
+    last = 0
+    while True:
+        batch = list(profile_ids.filter(id__gt=last)[:batch_size])
+        if not batch:
+            break
+        index_profiles(batch)
+        last = batch[-1]
+        count += len(batch)
+        if log:
+            log("Profiles: %d" % count)
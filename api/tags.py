@@ -0,0 +1,125 @@
+'''
+Tag-based cache invalidation
+
+Cache entries set through this module record the tags they depend on,
+such as a token, a wallet address, a profile or its likes, and the
+generation each tag was at when they were computed. invalidate() bumps a
+tag's generation, and get() treats any entry recorded under an older
+generation as a miss. One write therefore invalidates exactly the entries
+that depend on it, on every instance sharing the cache
+(CACHE_MEMCACHED_LOCATION), without knowing or scanning their keys.
+
+Read the generations with depend_on() before computing a value, so a write
+that lands in between still invalidates it:
+
+    dependencies = tags.depend_on([tags.likes_tag(profile_id)])
+    value = ...
+    tags.set(key, value, dependencies)
+
+Generations start from the clock, so a generation that was evicted can't
+come back with a number entries were already stored under.
+'''
+
+import time
+
+from django.core.cache import cache
+
+from . import metrics
+
+FEATURED = "featured"
+
+
+def token_tag(contract_address, token_id):
+    return "token:%s:%s" % (contract_address.lower(), token_id)
+
+
+def address_tag(address):
+    return "address:%s" % address.lower()
+
+
+def profile_tag(profile_id):
+    # Profile details and its linked wallets
+    return "profile:%d" % profile_id
+
+
+def likes_tag(profile_id):
+    # What the profile has liked
+    return "likes:%d" % profile_id
+
+
+def _tag_key(tag):
+    return "tag_" + tag
+
+
+def _clock():
+    return int(time.time() * 1000)
+
+
+def generations(tags, create=False):
+    '''
+    Returns {tag: current generation}, leaving out tags that have none
+    unless `create` is set
+    '''
+    tags = list(tags)
+    found = cache.get_many([_tag_key(tag) for tag in tags])
+    current = {tag: found[_tag_key(tag)] for tag in tags if _tag_key(tag) in found}
+    missing = [tag for tag in tags if tag not in current]
+    if create and missing:
+        for tag in missing:
+            cache.add(_tag_key(tag), _clock(), None)
+        found = cache.get_many([_tag_key(tag) for tag in missing])
+        current.update((tag, found.get(_tag_key(tag))) for tag in missing)
+    return current
+
+
+def _valid(entry, current):
+    return all(generation is not None and current.get(tag) == generation for tag, generation in entry[1].items())
+
+
+def get(key):
+    return get_many([key]).get(key)
+
+
+def get_many(keys):
+    '''
+    Returns {key: value} for the entries that are cached and still current
+    '''
+    entries = cache.get_many(keys)
+    current = generations({tag for entry in entries.values() for tag in entry[1]})
+    values = {}
+    for key, entry in entries.items():
+        if _valid(entry, current):
+            values[key] = entry[0]
+        else:
+            metrics.incr("tagged_cache_invalidated")
+    return values
+
+
+def depend_on(tags):
+    '''
+    Returns the current generations of `tags`, to pass to set()
+    '''
+    return generations(tags, create=True)
+
+
+def set(key, value, dependencies, timeout=None):
+    set_many({key: (value, dependencies)}, timeout)
+
+
+def set_many(entries, timeout=None):
+    '''
+    Caches {key: (value, dependencies from depend_on())}
+    '''
+    cache.set_many({key: (value, dependencies) for key, (value, dependencies) in entries.items()}, timeout)
+
+
+def invalidate(*tags):
+    '''
+    Invalidates every entry that depends on any of `tags`
+    '''
+    for tag in tags:
+        try:
+            cache.incr(_tag_key(tag))
+        except ValueError:
+            # Nothing cached depends on it
+            pass
@@ -0,0 +1,1278 @@
+'''
+Query-count and upstream-call regression tests
+
+Every endpoint runs against a local OpenSea stub with asset lists of
+size 1, 10 and 50 and with 1 or 5 linked wallets. The number of DB queries
+and OpenSea calls has to stay within a fixed budget and must not change
+with the list size, so adding a per-item query fails here.
+
+    python manage.py test api
+'''
+
+import asyncio
+import datetime
+import json
+import os
+import tempfile
+import threading
+import time
+from unittest import mock
+
+import requests
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.db import IntegrityError, OperationalError, connection, connections
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from bench.opensea_stub import OpenSeaStub, make_asset
+from stbackend import secret_manager
+
+from .assets import get_tokens, load_assets, store_assets
+from .middleware import QueryBudgetExceeded
+from .opensea import AssetLoader, CircuitBreaker, CircuitOpenError, RateLimiter
+from . import activity, autocomplete, identity, ingest, leaderboard, likesets, live, metrics, moderation, negative, opensea, replica, search, tags
+from .models import Asset, Contract, FeaturedSlot, HiddenAsset, LikeHistory, Profile, SearchDocument, Token, Wallet
+
+API_KEY = "test-key"
+LIST_SIZES = (1, 10, 50)
+WALLET_COUNTS = (1, 5)
+
+# endpoint: (max DB queries, max OpenSea calls) for a cold request.
+# Upstream calls for owned are per linked wallet, checked separately.
+BUDGETS = {
+    "token": (8, 1),
+    "tokens": (8, 1),
+    "like": (7, 0),
+    "featured": (13, 1),
+    "collection": (11, 1),
+    "contract": (11, 1),
+    "owned": (13, None),
+    "liked": (10, 1),
+    "mylikes": (4, 0),
+    "has_liked": (2, 0),
+    "profile": (3, 0),
+    "profile_ingest": (10, 0),
+    "leaderboard": (1, 0),
+    "search": (4, 0),
+    "autocomplete": (0, 0),
+}
+
+
+def count_queries(captured):
+    '''
+    Counts captured queries, treating consecutive INSERTs into the same table
+    as one: SQLite splits a single bulk_create into batches of 999 parameters.
+    '''
+    count = 0
+    previous = None
+    for query in captured:
+        sql = query['sql']
+        statement = sql.split('(', 1)[0] if sql.startswith('INSERT') else None
+        if statement is None or statement != previous:
+            count += 1
+        previous = statement
+    return count
+
+
+def ndjson(records):
+    return "".join((record if isinstance(record, str) else json.dumps(record)) + "\n" for record in records)
+
+
+def make_address(prefix, i):
+    return "0x" + "%s%039x" % (prefix, i)
+
+
+@override_settings(SHOWTIME_FRONTEND_API_KEY=API_KEY, HIDDEN_ASSETS_REFRESH=3600, OPENSEA_RATE_LIMIT=1000,
+                   OPENSEA_HEDGE_BUDGET=0, QUERY_BUDGET_STRICT=True, ACTIVITY_FLUSH_INTERVAL=3600,
+                   LEADERBOARD_REFRESH=3600, LIVE_BACKEND="local")
+class ApiTestCase(TestCase):
+    '''
+    Requests against the API with OpenSea stubbed out and every cache cleared
+    '''
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.stub = OpenSeaStub().start()
+        cls.settings_override = override_settings(OPENSEA_API_URL=cls.stub.url)
+        cls.settings_override.enable()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.settings_override.disable()
+        cls.stub.stop()
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        identity.reset()
+        activity.reset()
+        self.stub.reset()
+        self.stub.max_assets = 50
+        self.stub.error_rate = 0
+        self.stub.missing = set()
+        opensea.breaker.reset()
+        negative.reset()
+        # Loads the hidden-asset set, which is then only rechecked hourly
+        moderation.hidden_assets_changed()
+        moderation.hidden_assets()
+
+    def measure(self, method, path, **kwargs):
+        '''
+        Sends one request and returns (response, DB queries, OpenSea calls)
+        '''
+        cache.clear()
+        identity.reset()
+        self.stub.reset()
+        with CaptureQueriesContext(connection) as queries:
+            response = getattr(self.client, method)(path, HTTP_X_API_KEY=API_KEY, **kwargs)
+        self.assertLess(response.status_code, 400, response.content)
+        return response, count_queries(queries.captured_queries), sum(self.stub.calls.values())
+
+    def forget_assets(self):
+        '''Empties the asset metadata store so the next request starts cold'''
+        Asset.objects.all().delete()
+        Token.objects.filter(likehistory__isnull=True).delete()
+        Contract.objects.filter(token__isnull=True).delete()
+
+    def create_profile(self, wallet_count):
+        profile = Profile.objects.create(name="Tester")
+        wallets = [Wallet.objects.create(address=make_address("a", profile.id * 10 + i), profile=profile)
+                   for i in range(wallet_count)]
+        return profile, wallets
+
+    def create_likes(self, profile, count):
+        contract = Contract.objects.create(address=make_address("c", profile.id))
+        creator = Wallet.objects.create(address=make_address("b", profile.id), profile=Profile.objects.create(name="Creator"))
+        tokens = []
+        for i in range(count):
+            token = Token.objects.create(contract=contract, token_identifier=str(1000 + i), creator=creator)
+            LikeHistory.objects.create(token=token, profile=profile, value=1)
+            tokens.append(token)
+        return contract, tokens
+
+    def assertWithinBudget(self, endpoint, queries, upstream):
+        max_queries, max_upstream = BUDGETS[endpoint]
+        self.assertLessEqual(queries, max_queries, "%s made %d DB queries" % (endpoint, queries))
+        if max_upstream is not None:
+            self.assertLessEqual(upstream, max_upstream, "%s made %d OpenSea calls" % (endpoint, upstream))
+
+    def assertFlat(self, endpoint, counts):
+        '''Query counts must not depend on the list size'''
+        self.assertEqual(len(set(counts)), 1, "%s queries grow with list size: %s" % (endpoint, counts))
+
+
+class EndpointBudgetTests(ApiTestCase):
+
+    def test_token(self):
+        profile, _ = self.create_profile(1)
+        contract, tokens = self.create_likes(profile, 1)
+        path = "/api/v1/token/%s/%s" % (contract.address, tokens[0].token_identifier)
+        response, queries, upstream = self.measure("get", path)
+        self.assertEqual(response.json()["data"]["showtime"]["like_count"], 1)
+        self.assertWithinBudget("token", queries, upstream)
+
+    def test_tokens(self):
+        counts = []
+        for size in LIST_SIZES:
+            with self.subTest(size=size):
+                profile, _ = self.create_profile(1)
+                contract, tokens = self.create_likes(profile, size)
+                self.forget_assets()
+                pairs = ["%s:%s" % (contract.address, token.token_identifier) for token in tokens]
+                response, queries, upstream = self.measure("get", "/api/v1/tokens?tokens=%s" % ",".join(pairs))
+                data = response.json()["data"]
+                self.assertEqual([asset["token_id"] for asset in data], [token.token_identifier for token in tokens])
+                self.assertEqual({asset["showtime"]["like_count"] for asset in data}, {1})
+                self.assertWithinBudget("tokens", queries, upstream)
+                counts.append(queries)
+        self.assertFlat("tokens", counts)
+
+    def test_like(self):
+        for wallet_count in WALLET_COUNTS:
+            with self.subTest(wallets=wallet_count):
+                profile, wallets = self.create_profile(wallet_count)
+                contract, tokens = self.create_likes(profile, 1)
+                path = "/api/v1/token/%s/%s" % (contract.address, tokens[0].token_identifier)
+                _, queries, upstream = self.measure(
+                    "post", path, data=json.dumps({"action": "unlike"}), content_type="application/json",
+                    HTTP_USERADDRESS=wallets[-1].address)
+                self.assertWithinBudget("like", queries, upstream)
+
+    def test_list_endpoints(self):
+        paths = {
+            "featured": "/api/v1/featured",
+            "collection": "/api/v1/collection?collection=superrare",
+            "contract": "/api/v1/contract/%s" % make_address("c", 0),
+        }
+        for endpoint, path in paths.items():
+            counts = []
+            for size in LIST_SIZES:
+                with self.subTest(endpoint=endpoint, size=size):
+                    self.stub.max_assets = size
+                    self.forget_assets()
+                    _, queries, upstream = self.measure("get", path)
+                    self.assertWithinBudget(endpoint, queries, upstream)
+                    counts.append(queries)
+            self.assertFlat(endpoint, counts)
+
+    def test_owned(self):
+        for wallet_count in WALLET_COUNTS:
+            _, wallets = self.create_profile(wallet_count)
+            counts = []
+            for size in LIST_SIZES:
+                with self.subTest(wallets=wallet_count, size=size):
+                    self.stub.max_assets = size
+                    self.forget_assets()
+                    response, queries, upstream = self.measure(
+                        "get", "/api/v1/owned?address=%s&limit=%d" % (wallets[0].address, size))
+                    self.assertEqual(len(response.json()["data"]), size * wallet_count)
+                    self.assertWithinBudget("owned", queries, upstream)
+                    self.assertLessEqual(upstream, wallet_count)
+                    counts.append(queries)
+            self.assertFlat("owned", counts)
+
+    def test_liked(self):
+        for wallet_count in WALLET_COUNTS:
+            counts = []
+            for size in LIST_SIZES:
+                with self.subTest(wallets=wallet_count, size=size):
+                    profile, wallets = self.create_profile(wallet_count)
+                    self.create_likes(profile, size)
+                    response, queries, upstream = self.measure(
+                        "get", "/api/v1/liked?address=%s" % wallets[-1].address)
+                    self.assertEqual(len(response.json()["data"]), size)
+                    self.assertWithinBudget("liked", queries, upstream)
+                    counts.append(queries)
+            self.assertFlat("liked", counts)
+
+    def test_mylikes(self):
+        for wallet_count in WALLET_COUNTS:
+            counts = []
+            for size in LIST_SIZES:
+                with self.subTest(wallets=wallet_count, size=size):
+                    profile, wallets = self.create_profile(wallet_count)
+                    self.create_likes(profile, size)
+                    response, queries, upstream = self.measure(
+                        "get", "/api/v1/mylikes?address=%s" % wallets[-1].address)
+                    self.assertEqual(len(response.json()["data"]), size)
+                    self.assertWithinBudget("mylikes", queries, upstream)
+                    counts.append(queries)
+            self.assertFlat("mylikes", counts)
+
+    def test_has_liked(self):
+        counts = []
+        for size in LIST_SIZES:
+            with self.subTest(size=size):
+                profile, wallets = self.create_profile(1)
+                contract, tokens = self.create_likes(profile, size)
+                pairs = ["%s:%s" % (contract.address, token.token_identifier) for token in tokens[:3]]
+                pairs.append("%s:1" % contract.address)
+                path = "/api/v1/has_liked?address=%s&tokens=%s" % (wallets[0].address, ",".join(pairs))
+                response, queries, upstream = self.measure("get", path)
+                self.assertEqual(response.json()["data"], [True] * min(size, 3) + [False])
+                self.assertWithinBudget("has_liked", queries, upstream)
+                counts.append(queries)
+        self.assertFlat("has_liked", counts)
+
+    def test_profile(self):
+        for wallet_count in WALLET_COUNTS:
+            with self.subTest(wallets=wallet_count):
+                _, wallets = self.create_profile(wallet_count)
+                response, queries, upstream = self.measure(
+                    "get", "/api/v1/profile?address=%s" % wallets[0].address)
+                self.assertEqual(len(response.json()["data"]["wallet_addresses"]), wallet_count)
+                self.assertWithinBudget("profile", queries, upstream)
+
+    def test_profile_ingest(self):
+        counts = []
+        for size in LIST_SIZES:
+            with self.subTest(size=size):
+                records = [{"address": make_address("e", size * 100 + i), "name": "Scraped %d" % i} for i in range(size)]
+                response, queries, upstream = self.measure(
+                    "post", "/api/v1/bot-only/profiles", data=ndjson(records), content_type="application/x-ndjson")
+                self.assertEqual(response.json()["data"]["chunks"][0]["profiles_created"], size)
+                self.assertWithinBudget("profile_ingest", queries, upstream)
+                counts.append(queries)
+        self.assertFlat("profile_ingest", counts)
+
+    def test_leaderboard(self):
+        counts = []
+        for size in LIST_SIZES:
+            with self.subTest(size=size):
+                profile, _ = self.create_profile(1)
+                self.create_likes(profile, size)
+                _, queries, upstream = self.measure("get", "/api/v1/leaderboard")
+                self.assertWithinBudget("leaderboard", queries, upstream)
+                counts.append(queries)
+        self.assertFlat("leaderboard", counts)
+
+
+class TokensTests(ApiTestCase):
+
+    def test_cached_and_unknown_tokens(self):
+        profile, _ = self.create_profile(1)
+        contract, tokens = self.create_likes(profile, 1)
+        pair = "%s:%s" % (contract.address, tokens[0].token_identifier)
+
+        # Cached tokens take one cache read, and unknown ones come back as null
+        self.stub.missing = {"999"}
+        path = "/api/v1/tokens?tokens=%s,%s:999,%s" % (pair, contract.address, pair)
+        self.client.get(path, HTTP_X_API_KEY=API_KEY)
+        self.stub.reset()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(path, HTTP_X_API_KEY=API_KEY)
+        data = response.json()["data"]
+        self.assertEqual([asset and asset["token_id"] for asset in data], [tokens[0].token_identifier, None, tokens[0].token_identifier])
+        self.assertEqual(len(queries.captured_queries), 0)
+        self.assertEqual(sum(self.stub.calls.values()), 0)
+
+        response = self.client.get("/api/v1/tokens?tokens=%s" % contract.address, HTTP_X_API_KEY=API_KEY)
+        self.assertEqual(response.status_code, 400)
+
+
+class HasLikedTests(ApiTestCase):
+
+    def test_warm_checks_and_unlikes(self):
+        profile, wallets = self.create_profile(1)
+        contract, tokens = self.create_likes(profile, 3)
+        pairs = ["%s:%s" % (contract.address, token.token_identifier) for token in tokens] + ["%s:1" % contract.address]
+        path = "/api/v1/has_liked?address=%s&tokens=%s" % (wallets[0].address, ",".join(pairs))
+        self.client.get(path, HTTP_X_API_KEY=API_KEY)
+
+        # Warm checks take no queries, and an unlike shows up straight away
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(path, HTTP_X_API_KEY=API_KEY)
+        self.assertEqual(len(queries.captured_queries), 0)
+        self.assertEqual(response.json()["data"], [True, True, True, False])
+        self.client.post("/api/v1/token/%s/%s" % (contract.address, tokens[0].token_identifier),
+                         data=json.dumps({"action": "unlike"}), content_type="application/json",
+                         HTTP_X_API_KEY=API_KEY, HTTP_USERADDRESS=wallets[0].address)
+        response = self.client.get(path, HTTP_X_API_KEY=API_KEY)
+        self.assertEqual(response.json()["data"], [False, True, True, False])
+
+        response = self.client.get("/api/v1/has_liked?address=%s&tokens=%s:x" % (wallets[0].address, contract.address),
+                                   HTTP_X_API_KEY=API_KEY)
+        self.assertEqual(response.status_code, 400)
+
+
+class IdentityTests(ApiTestCase):
+
+    def test_lookups_are_cached(self):
+        profile, wallets = self.create_profile(2)
+        self.measure("get", "/api/v1/owned?address=%s" % wallets[0].address)
+
+        # A warm lookup takes no queries
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(identity.resolve(wallets[0].address),
+                             (profile.id, tuple(sorted(wallet.address for wallet in wallets))))
+        self.assertEqual(len(queries.captured_queries), 0)
+
+        # Linked wallets share the owned list
+        response = self.client.get("/api/v1/owned?address=%s&use_cached=1" % wallets[1].address,
+                                   HTTP_X_API_KEY=API_KEY)
+        self.assertEqual(len(response.json()["data"]), 2 * self.stub.max_assets)
+
+        # Linking another wallet shows up straight away
+        added = Wallet.objects.create(address=make_address("d", 1), profile=profile)
+        self.assertIn(added.address, identity.resolve(wallets[0].address).addresses)
+        self.assertEqual(identity.resolve(added.address).profile_id, profile.id)
+        added.delete()
+        self.assertEqual(identity.resolve(added.address), (None, (added.address,)))
+        self.assertNotIn(added.address, identity.resolve(wallets[0].address).addresses)
+
+        # Other casings share the entry instead of caching "no profile" over it
+        identity.reset()
+        cache.clear()
+        self.assertEqual(identity.resolve(wallets[0].address.upper().replace("0X", "0x")).profile_id, profile.id)
+        self.assertEqual(identity.resolve(wallets[0].address).profile_id, profile.id)
+        self.assertEqual(identity.profile_for(wallets[0].address.upper().replace("0X", "0x")), profile.id)
+
+
+class ActivityTests(ApiTestCase):
+
+    def test_writes_are_coalesced(self):
+        _, wallets = self.create_profile(2)
+        for wallet in wallets + wallets[:1]:
+            with CaptureQueriesContext(connection) as queries:
+                self.client.get("/api/v1/mylikes?address=%s" % wallet.address, HTTP_X_API_KEY=API_KEY)
+            self.assertFalse([query for query in queries.captured_queries if query['sql'].startswith("UPDATE")])
+        self.assertFalse(Wallet.objects.filter(last_authenticated__isnull=False).exists())
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(activity.flush(), 2)
+        self.assertEqual(len(queries.captured_queries), 1)
+        self.assertEqual(Wallet.objects.filter(last_authenticated__isnull=False).count(), 2)
+
+        # Seen again within ACTIVITY_GRANULARITY: nothing more to write
+        self.client.get("/api/v1/mylikes?address=%s" % wallets[0].address, HTTP_X_API_KEY=API_KEY)
+        self.assertEqual(activity.flush(), 0)
+
+
+class CachingTests(ApiTestCase):
+
+    def test_tag_invalidation(self):
+        profile, wallets = self.create_profile(1)
+        contract, tokens = self.create_likes(profile, 2)
+        token_path = "/api/v1/token/%s/%s" % (contract.address, tokens[0].token_identifier)
+        paths = [token_path, "/api/v1/mylikes?address=%s" % wallets[0].address,
+                 "/api/v1/profile?address=%s" % wallets[0].address]
+        for path in paths:
+            self.client.get(path, HTTP_X_API_KEY=API_KEY)
+
+        def queries_for(path):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(path, HTTP_X_API_KEY=API_KEY)
+            return response.json()["data"], len(queries.captured_queries)
+
+        self.assertEqual([queries_for(path)[1] for path in paths], [0, 0, 0])
+
+        # Someone else's like refreshes that token's count only
+        other = make_address("e", 1)
+        self.client.post(token_path, data=json.dumps({"action": "like"}), content_type="application/json",
+                         HTTP_X_API_KEY=API_KEY, HTTP_USERADDRESS=other)
+        data, queries = queries_for(token_path)
+        self.assertEqual((data["showtime"]["like_count"], queries), (2, 1))
+        self.assertEqual([queries_for(path)[1] for path in paths[1:]], [0, 0])
+
+        # Linking a wallet refreshes the profile
+        Wallet.objects.create(address=make_address("e", 2), profile=profile)
+        data, queries = queries_for(paths[2])
+        self.assertEqual(len(data["wallet_addresses"]), 2)
+
+        dependencies = tags.depend_on(["a", "b"])
+        tags.set("tagged", 1, dependencies)
+        tags.invalidate("c")
+        self.assertEqual(tags.get("tagged"), 1)
+        tags.invalidate("b")
+        self.assertIsNone(tags.get("tagged"))
+
+    def test_cached_responses_skip_upstream(self):
+        profile, wallets = self.create_profile(1)
+        self.create_likes(profile, 10)
+        for path in ("/api/v1/featured", "/api/v1/collection?collection=superrare",
+                     "/api/v1/liked?address=%s" % wallets[0].address):
+            with self.subTest(path=path):
+                self.client.get(path, HTTP_X_API_KEY=API_KEY)
+                self.stub.reset()
+                response = self.client.get(path, HTTP_X_API_KEY=API_KEY)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(sum(self.stub.calls.values()), 0)
+
+    def test_stored_assets_skip_upstream(self):
+        profile, wallets = self.create_profile(1)
+        contract, tokens = self.create_likes(profile, 10)
+        for path in ("/api/v1/token/%s/%s" % (contract.address, tokens[0].token_identifier),
+                     "/api/v1/featured",
+                     "/api/v1/liked?address=%s" % wallets[0].address):
+            with self.subTest(path=path):
+                self.measure("get", path)
+                # measure() clears the cache, so this is served from api.Asset
+                _, _, upstream = self.measure("get", path)
+                self.assertEqual(upstream, 0)
+
+
+class OpenSeaOutageTests(ApiTestCase):
+
+    @override_settings(OPENSEA_BREAKER_MIN_CALLS=2, OPENSEA_BREAKER_COOLDOWN=3600)
+    def test_stale_data_is_served(self):
+        profile, wallets = self.create_profile(1)
+        contract, tokens = self.create_likes(profile, 10)
+        path = "/api/v1/liked?address=%s" % wallets[0].address
+        self.measure("get", path)
+        Asset.objects.update(fetched_at=timezone.now() - datetime.timedelta(days=30))
+
+        self.stub.error_rate = 1.0
+        for attempt in range(3):
+            response, _, upstream = self.measure("get", path)
+            data = response.json()["data"]
+            self.assertEqual(len(data), 10)
+            self.assertTrue(all(asset["showtime"]["stale"] for asset in data))
+        # Open after two failed calls, so the last request didn't wait on OpenSea
+        self.assertEqual(opensea.breaker.state, opensea.OPEN)
+        self.assertEqual(upstream, 0)
+
+        response, _, _ = self.measure("get", "/api/v1/contract/%s" % contract.address)
+        self.assertEqual(len(response.json()["data"]["tokens_created"]), 10)
+        response = self.client.get("/api/v1/featured", HTTP_X_API_KEY=API_KEY)
+        self.assertEqual(response.status_code, 503)
+
+
+class QueryBudgetMiddlewareTests(ApiTestCase):
+
+    @override_settings(QUERY_BUDGET=2)
+    def test_strict_budget_raises(self):
+        profile, wallets = self.create_profile(1)
+        self.create_likes(profile, 10)
+        with self.assertRaises(QueryBudgetExceeded):
+            self.client.get("/api/v1/liked?address=%s" % wallets[0].address, HTTP_X_API_KEY=API_KEY)
+
+
+class WarmupTests(ApiTestCase):
+
+    @override_settings(AUTOCOMPLETE_SNAPSHOT="")
+    def test_loads_everything(self):
+        try:
+            response = self.client.get("/_ah/warmup")
+            self.assertEqual(set(response.json()["data"]), {"urls", "database", "hidden_assets", "autocomplete"})
+            self.assertTrue(autocomplete.loaded())
+        finally:
+            autocomplete._index = None
+
+
+@override_settings(SHOWTIME_FRONTEND_API_KEY=None)
+class ApiKeyTests(TestCase):
+
+    def test_unset_key_refuses_every_request(self):
+        self.assertEqual(self.client.get("/api/v1/metrics").status_code, 401)
+        self.assertEqual(self.client.get("/api/v1/metrics", HTTP_X_API_KEY="").status_code, 401)
+        response = self.client.post("/api/v1/bot-only/profiles", data="", content_type="application/x-ndjson")
+        self.assertEqual(response.status_code, 401)
+
+
+class OwnedTests(ApiTestCase):
+
+    def test_failing_wallet_is_left_out(self):
+        profile, wallets = self.create_profile(2)
+        self.stub.missing = {wallets[1].address.lower()}
+        path = "/api/v1/owned?address=%s" % wallets[0].address
+        response = self.client.get(path, HTTP_X_API_KEY=API_KEY)
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(len(data["data"]), self.stub.max_assets)
+        self.assertEqual(data["failed_addresses"], [wallets[1].address])
+        # The incomplete list isn't cached
+        self.assertIsNone(tags.get("owned_profile_%d" % profile.id))
+
+        # Only fails when no wallet can be listed
+        self.stub.missing.add(wallets[0].address.lower())
+        negative.reset()
+        response = self.client.get(path, HTTP_X_API_KEY=API_KEY)
+        self.assertEqual(response.status_code, 400)
+
+
+class CurationTests(ApiTestCase):
+
+    def test_featured_curation(self):
+        def featured(limit):
+            response = self.client.get("/api/v1/featured?limit=%d" % limit, HTTP_X_API_KEY=API_KEY)
+            return [(asset["asset_contract"]["address"], asset["token_id"]) for asset in response.json()["data"]]
+
+        self.assertEqual(len(featured(3)), 3)
+        self.assertEqual(len(featured(5)), 5)
+
+        # Editing a slot invalidates the cached responses
+        slot = FeaturedSlot.objects.get(position=0)
+        slot.contract_address, slot.token_identifier = make_address("f", 0), "1"
+        slot.save()
+        self.assertEqual(featured(3)[0], (make_address("f", 0), "1"))
+        slot.delete()
+        FeaturedSlot.objects.create(position=0, contract_address=make_address("f", 0), token_identifier="2",
+                                    starts_at=timezone.now() + datetime.timedelta(days=1))
+        self.assertNotIn((make_address("f", 0), "2"), featured(3))
+
+    def test_hidden_assets(self):
+        profile, wallets = self.create_profile(1)
+        contract, tokens = self.create_likes(profile, 10)
+        HiddenAsset.objects.create(contract_address=contract.address.upper(), token_identifier=tokens[3].token_identifier)
+        response, _, _ = self.measure("get", "/api/v1/liked?address=%s" % wallets[0].address)
+        hidden = [asset["token_id"] for asset in response.json()["data"] if asset["showtime"]["hide"]]
+        self.assertEqual(hidden, [tokens[3].token_identifier])
+        # Migrated from the list that used to live in CollectionView
+        self.assertIn(("0xd07dc4262bcdbf85190c01c996b4c06a461d2430", "18359"), moderation.hidden_assets())
+
+
+class NegativeCacheTests(ApiTestCase):
+
+    def test_misses_are_remembered(self):
+        self.stub.missing = {"404", make_address("e", 1)}
+        for path, status_code in (("/api/v1/token/%s/404" % make_address("c", 1), 404),
+                                  ("/api/v1/contract/%s" % make_address("e", 1), 400)):
+            with self.subTest(path=path):
+                self.stub.reset()
+                response = self.client.get(path, HTTP_X_API_KEY=API_KEY)
+                self.assertEqual(response.status_code, status_code)
+                # The second request is answered without DB queries or OpenSea calls
+                with CaptureQueriesContext(connection) as queries:
+                    response = self.client.get(path, HTTP_X_API_KEY=API_KEY)
+                self.assertEqual(response.status_code, status_code)
+                self.assertEqual(len(queries.captured_queries), 0)
+                self.assertEqual(sum(self.stub.calls.values()), 1)
+
+        # Known-bad tokens are left out of list lookups
+        profile, wallets = self.create_profile(1)
+        contract, tokens = self.create_likes(profile, 10)
+        self.stub.missing.add(tokens[0].token_identifier)
+        self.measure("get", "/api/v1/liked?address=%s" % wallets[0].address)
+        self.assertTrue(negative.lookup(("token", contract.address, tokens[0].token_identifier)))
+        self.assertIsNone(negative.lookup(("token", contract.address, tokens[1].token_identifier)))
+
+
+class SearchTests(ApiTestCase):
+
+    def test_within_budget(self):
+        profile, _ = self.create_profile(1)
+        profile.name = "Stub Collector"
+        profile.save()
+        search.index_profiles([profile.id])
+        for size in LIST_SIZES:
+            with self.subTest(size=size):
+                store_assets([make_asset(make_address("d", size), i) for i in range(size)])
+                response, queries, upstream = self.measure("get", "/api/v1/search?q=stub&limit=%d" % size)
+                data = response.json()["data"]
+                self.assertEqual(len(data["results"]), size)
+                self.assertTrue(data["has_more"])
+                self.assertWithinBudget("search", queries, upstream)
+
+    def test_profile_result(self):
+        profile, wallets = self.create_profile(1)
+        profile.name = "Stub Collector"
+        profile.twitter = "stubcollector"
+        profile.save()
+        search.index_profiles([profile.id])
+        store_assets([make_asset(make_address("d", 1), i) for i in range(10)])
+        response, _, _ = self.measure("get", "/api/v1/search?q=stubcoll")
+        results = response.json()["data"]["results"]
+        self.assertEqual(results, [{"type": "profile", "profile": {
+            "name": "Stub Collector", "twitter": "stubcollector", "img_url": None, "address": wallets[0].address}}])
+
+    def test_whole_match_set_is_ranked(self):
+        # An old name match outranks any number of newer description matches
+        old = Profile.objects.create(name="Quasar")
+        Wallet.objects.create(address=make_address("a", 1), profile=old)
+        search.index_profiles([old.id])
+        store_assets([dict(make_asset(make_address("d", 1), i), description="quasar %d" % i) for i in range(50)])
+        ids = search.get_backend().search(["quasar"], 0, 1)
+        self.assertEqual(SearchDocument.objects.get(id=ids[0]).profile_id, old.id)
+
+
+class AutocompleteTests(ApiTestCase):
+
+    def tearDown(self):
+        autocomplete._index = None
+
+    def test_within_budget(self):
+        profile, _ = self.create_profile(1)
+        profile.name = "Lil Miquela"
+        profile.save()
+        store_assets([make_asset(make_address("d", 0), i) for i in range(10)])
+        autocomplete._index = autocomplete.build()
+        try:
+            response, queries, upstream = self.measure("get", "/api/v1/autocomplete?q=miq")
+            self.assertEqual([result["name"] for result in response.json()["data"]["results"]], ["Lil Miquela"])
+            self.assertWithinBudget("autocomplete", queries, upstream)
+        finally:
+            autocomplete._index = None
+
+    def test_incremental_updates(self):
+        profile, wallets = self.create_profile(1)
+        profile.name = "Lil Miquela"
+        profile.save()
+        autocomplete._index = autocomplete.build()
+        # Picked up without a rebuild
+        store_assets([make_asset(make_address("e", 0), 77)])
+        response, _, _ = self.measure("get", "/api/v1/autocomplete?q=stub+token+77")
+        self.assertEqual(response.json()["data"]["results"][0]["token_id"], "77")
+        response, _, _ = self.measure("get", "/api/v1/autocomplete?q=%s" % wallets[0].address[:12])
+        self.assertEqual(response.json()["data"]["results"][0]["name"], "Lil Miquela")
+
+    def test_catch_up_applies_edits(self):
+        profile = Profile.objects.create(name="Lil Miquela")
+        wallet = Wallet.objects.create(address=make_address("a", 1), profile=profile)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "autocomplete.json")
+            autocomplete.build().dump(path)
+            # Renamed through the bulk path, which doesn't go through save()
+            ingest.ingest_chunk([{"address": wallet.address, "name": "Quasar Queen"}])
+            with override_settings(AUTOCOMPLETE_SNAPSHOT=path):
+                index = autocomplete.load()
+        self.assertEqual([result["name"] for result in index.lookup("quasar", 5)], ["Quasar Queen"])
+        self.assertEqual(index.lookup("miquela", 5), [])
+
+    @override_settings(AUTOCOMPLETE_SNAPSHOT="/nonexistent/autocomplete.json")
+    def test_requests_never_build(self):
+        Profile.objects.create(name="Lil Miquela")
+        with mock.patch.object(autocomplete, "build") as build:
+            response = self.client.get("/api/v1/autocomplete?q=miq", HTTP_X_API_KEY=API_KEY)
+            for thread in threading.enumerate():
+                if thread.name == "autocomplete-load":
+                    thread.join()
+        self.assertEqual(response.json()["data"]["results"], [])
+        build.assert_not_called()
+        self.assertFalse(autocomplete.loaded())
+
+
+class IngestTests(ApiTestCase):
+
+    def test_ndjson_endpoint(self):
+        # Updates, new and unlinked wallets, duplicates and bad lines, in chunks
+        named, wallets = self.create_profile(2)
+        bare = Wallet.objects.create(address=make_address("d", 1))
+        self.assertIsNone(identity.resolve(bare.address).profile_id)
+        records = [
+            {"address": wallets[0].address, "name": "Renamed"},
+            {"address": wallets[1].address, "twitter": "renamed"},
+            {"address": bare.address, "name": "Bare", "img_url": "https://example.com/bare.png"},
+            {"address": make_address("f", 1), "name": "New", "twitter": ""},
+            "not json",
+            {"address": make_address("f", 1), "twitter": "new"},
+            {"address": "0x1", "name": "Bad"},
+            {"address": make_address("f", 2), "name": "x" * 201},
+        ]
+        with mock.patch.object(ingest, "CHUNK_SIZE", 4):
+            response = self.client.post("/api/v1/bot-only/profiles", data=ndjson(records),
+                                        content_type="application/x-ndjson", HTTP_X_API_KEY=API_KEY)
+        data = response.json()["data"]
+        self.assertEqual((data["records"], data["rejected"]), (5, 3))
+        self.assertEqual([(chunk["first_line"], chunk["last_line"]) for chunk in data["chunks"]], [(1, 4), (5, 8)])
+        self.assertEqual(data["chunks"][0], {
+            "first_line": 1, "last_line": 4, "records": 4, "profiles_created": 2, "profiles_updated": 1,
+            "wallets_created": 1, "wallets_linked": 1, "unchanged": 0, "rejected": []})
+        self.assertEqual([line["line"] for line in data["chunks"][1]["rejected"]], [5, 7, 8])
+
+        named.refresh_from_db()
+        self.assertEqual((named.name, named.twitter), ("Renamed", "renamed"))
+        bare_profile = Profile.objects.get(id=identity.resolve(bare.address).profile_id)
+        self.assertEqual((bare_profile.name, bare_profile.img_url), ("Bare", "https://example.com/bare.png"))
+        new_profile = Profile.objects.get(wallet__address=make_address("f", 1))
+        self.assertEqual((new_profile.name, new_profile.twitter), ("New", "new"))
+        self.assertTrue(search.search("Renamed"))
+
+        response = self.client.post("/api/v1/bot-only/profiles", data=ndjson(records[:1]),
+                                    content_type="application/x-ndjson")
+        self.assertEqual(response.status_code, 401)
+
+    def test_user_add(self):
+        profile, wallets = self.create_profile(1)
+        for address, name in ((wallets[0].address, "Renamed"), (make_address("f", 3), "New")):
+            response = self.client.post("/api/v1/bot-only/user-add", data=json.dumps({"address": address, "name": name}),
+                                        content_type="application/json", HTTP_X_API_KEY=API_KEY)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(Profile.objects.get(wallet__address=address).name, name)
+        self.assertEqual(Profile.objects.get(id=profile.id).name, "Renamed")
+
+    def test_addresses_match_any_case(self):
+        address = make_address("a", 0xabc)
+        profile = Profile.objects.create(name="Checksummed")
+        Wallet.objects.create(address=address[:2] + address[2:].upper(), profile=profile)
+        records = [{"address": address, "name": "Renamed"}]
+        records += [{"address": make_address("f", i), "name": "New"} for i in range(ingest.CHUNK_SIZE - 1)]
+        summary, _ = ingest.ingest_chunk(records)
+        self.assertEqual((summary["profiles_updated"], summary["wallets_created"]), (1, ingest.CHUNK_SIZE - 1))
+        self.assertEqual(Wallet.objects.filter(address__iexact=address).count(), 1)
+        self.assertEqual(Profile.objects.get(id=profile.id).name, "Renamed")
+
+    def test_concurrent_insert_is_retried(self):
+        bulk_create = Profile.objects.bulk_create
+        raced = []
+
+        def racing_bulk_create(profiles, **kwargs):
+            # Another request creates a profile between the ids being assigned and the insert
+            if not raced:
+                raced.append(Profile.objects.create(id=profiles[0].id, name="Concurrent"))
+            return bulk_create(profiles, **kwargs)
+
+        retries = metrics.snapshot()["counters"].get("ingest_chunk_retries", 0)
+        with mock.patch.object(Profile.objects, "bulk_create", racing_bulk_create):
+            summary, profile_ids = ingest.ingest_chunk([{"address": make_address("f", 1), "name": "New"}])
+        self.assertEqual(summary["profiles_created"], 1)
+        self.assertEqual(Profile.objects.get(wallet__address=make_address("f", 1)).name, "New")
+        if not connection.features.can_return_rows_from_bulk_insert:
+            self.assertEqual(metrics.snapshot()["counters"]["ingest_chunk_retries"], retries + 1)
+
+
+class AssetStoreTests(TestCase):
+
+    def test_contract_case(self):
+        contract = make_address("c", 1)
+        checksummed = contract[:2] + contract[2:].upper()
+        asset = make_asset(contract, 1)
+        asset["asset_contract"]["address"] = checksummed
+        store_assets([asset])
+        store_assets([make_asset(contract, 1)])
+        self.assertEqual(Asset.objects.count(), 1)
+        self.assertEqual(list(load_assets([(checksummed, "1")], max_age=0)), [(checksummed, "1")])
+
+    def test_tokens_are_unique(self):
+        contract = make_address("c", 2)
+        bulk_create = Token.objects.bulk_create
+
+        def racing_bulk_create(tokens, **kwargs):
+            # A concurrent request creates the token between get_tokens' read and its insert
+            Token.objects.create(contract_id=tokens[0].contract_id, token_identifier="1")
+            return bulk_create(tokens, **kwargs)
+
+        with mock.patch.object(Token.objects, "bulk_create", racing_bulk_create):
+            token_ids = get_tokens([(contract, "1")])
+        self.assertEqual(Token.objects.filter(token_identifier="1").count(), 1)
+        self.assertEqual(token_ids[(contract, "1")], Token.objects.get(token_identifier="1").id)
+        with self.assertRaises(IntegrityError):
+            Token.objects.create(contract=Contract.objects.get(address=contract), token_identifier="1")
+
+
+@override_settings(OPENSEA_RATE_LIMIT=1000, OPENSEA_HEDGE_BUDGET=0)
+class AssetLoaderTests(SimpleTestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.stub = OpenSeaStub().start()
+        cls.settings_override = override_settings(OPENSEA_API_URL=cls.stub.url)
+        cls.settings_override.enable()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.settings_override.disable()
+        cls.stub.stop()
+        super().tearDownClass()
+
+    def setUp(self):
+        self.stub.reset()
+
+    def load_concurrently(self, loader, keys):
+        results = {}
+
+        def load(key):
+            results[key] = loader.load(*key)
+
+        threads = [threading.Thread(target=load, args=(key,)) for key in keys]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def test_concurrent_lookups_share_one_call(self):
+        loader = AssetLoader(window=0.2)
+        keys = [(make_address("c", i % 3), str(i)) for i in range(20)]
+        results = self.load_concurrently(loader, keys + keys)
+
+        self.assertEqual(self.stub.calls["assets"], 1)
+        for key in keys:
+            self.assertEqual(results[key]["token_id"], key[1])
+            self.assertEqual(results[key]["asset_contract"]["address"], key[0])
+
+    def test_full_batches_go_out_in_fifties(self):
+        loader = AssetLoader(window=0.2)
+        keys = [(make_address("c", 1), str(i)) for i in range(120)]
+        results = loader.load_many(keys)
+
+        self.assertEqual(self.stub.calls["assets"], 3)
+        self.assertEqual(len(results), 120)
+
+
+@override_settings(OPENSEA_BREAKER_MIN_CALLS=4, OPENSEA_BREAKER_ERROR_RATE=0.5, OPENSEA_BREAKER_COOLDOWN=0.05)
+class CircuitBreakerTests(SimpleTestCase):
+
+    def call(self, breaker, ok):
+        breaker.before_call()
+        breaker.after_call(ok)
+
+    def test_opens_on_error_rate_and_probes(self):
+        breaker = CircuitBreaker()
+        for ok in (True, False, None, True):
+            self.call(breaker, ok)
+        self.assertEqual(breaker.state, opensea.CLOSED)
+        self.call(breaker, False)
+        self.assertEqual(breaker.state, opensea.OPEN)
+        with self.assertRaises(CircuitOpenError):
+            breaker.before_call()
+
+        # One probe at a time once the cooldown has passed
+        time.sleep(0.06)
+        breaker.before_call()
+        with self.assertRaises(CircuitOpenError):
+            breaker.before_call()
+        breaker.after_call(False)
+        self.assertEqual(breaker.state, opensea.OPEN)
+
+        time.sleep(0.06)
+        self.call(breaker, True)
+        self.assertEqual(breaker.state, opensea.CLOSED)
+
+
+@override_settings(OPENSEA_RATE_LIMIT=1000, OPENSEA_HEDGE_BUDGET=0.5, OPENSEA_MIN_TIMEOUT=2)
+class HedgedRequestTests(SimpleTestCase):
+
+    def setUp(self):
+        metrics.reset()
+        opensea.breaker.reset()
+        opensea.hedge_budget = opensea.HedgeBudget()
+        # Recent /assets calls all took 10ms
+        for i in range(opensea.MIN_LATENCY_SAMPLES):
+            metrics.observe("opensea_latency_seconds", 0.01, endpoint="assets")
+
+    def test_slow_call_is_hedged(self):
+        calls = []
+        release = threading.Event()
+        finished = threading.Semaphore(0)
+        timed_get = opensea._timed_get
+
+        def get(url, params=None, timeout=None):
+            calls.append(timeout)
+            if len(calls) == 1:
+                release.wait(5)
+            response = requests.Response()
+            response.status_code = 200
+            return response
+
+        def tracked_get(*args):
+            try:
+                return timed_get(*args)
+            finally:
+                finished.release()
+
+        with mock.patch.object(opensea.requests, "get", get), mock.patch.object(opensea, "_timed_get", tracked_get):
+            started = time.monotonic()
+            response = opensea.get("/assets")
+            elapsed = time.monotonic() - started
+            # Let the losing call finish too, so it doesn't leak into other tests
+            release.set()
+            self.assertTrue(finished.acquire(timeout=5) and finished.acquire(timeout=5))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertLess(elapsed, 0.5)
+        # Both with the adaptive timeout, 3 * 10ms raised to the minimum
+        self.assertEqual(calls, [2, 2])
+        self.assertEqual(metrics.snapshot()["counters"]["opensea_hedge_won{endpoint=assets}"], 1)
+
+    def test_timeouts_are_sampled(self):
+        def get(url, params=None, timeout=None):
+            time.sleep(0.05)
+            raise requests.Timeout()
+
+        with mock.patch.object(opensea.requests, "get", get):
+            for i in range(opensea.MIN_LATENCY_SAMPLES):
+                with self.assertRaises(requests.Timeout):
+                    opensea._timed_get(settings.OPENSEA_API_URL, {}, 0.05, "assets")
+
+        count, (p99,) = metrics.percentiles("opensea_latency_seconds", (0.99,), endpoint="assets")
+        self.assertEqual(count, 2 * opensea.MIN_LATENCY_SAMPLES)
+        self.assertGreaterEqual(p99, 0.05)
+
+    def test_hedge_budget(self):
+        # At most one hedge for every two calls
+        opensea.hedge_budget.count_call()
+        self.assertTrue(opensea.hedge_budget.take())
+        self.assertFalse(opensea.hedge_budget.take())
+        opensea.hedge_budget.count_call()
+        self.assertFalse(opensea.hedge_budget.take())
+        opensea.hedge_budget.count_call()
+        self.assertTrue(opensea.hedge_budget.take())
+
+
+@override_settings(OPENSEA_RATE_LIMIT=5, OPENSEA_RATE_BURST=1)
+class RateLimiterTests(SimpleTestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def test_interactive_calls_go_first(self):
+        limiter = RateLimiter()
+        limiter.acquire()
+        order = []
+
+        def acquire(priority):
+            limiter.acquire(priority)
+            order.append(priority)
+
+        threads = []
+        for priority in (opensea.BACKGROUND, opensea.BULK, opensea.INTERACTIVE):
+            threads.append(threading.Thread(target=acquire, args=(priority,)))
+            threads[-1].start()
+            time.sleep(0.02)
+        self.assertEqual(metrics.snapshot()["gauges"]["opensea_queue_depth{lane=background}"], 1)
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(order, [opensea.INTERACTIVE, opensea.BULK, opensea.BACKGROUND])
+
+    def test_shared_budget(self):
+        # A second process sharing the cache has already used this second's calls
+        limiter = RateLimiter()
+        second = int(time.time())
+        cache.set("opensea_calls_%d" % second, 5, 5)
+        limiter.acquire()
+        self.assertGreater(int(time.time()), second)
+
+    def test_cache_is_read_outside_the_lock(self):
+        limiter = RateLimiter()
+        # Patched on the class: each thread has its own cache object
+        cache_class = type(caches['default'])
+        get = cache_class.get
+
+        def slow_get(self, *args, **kwargs):
+            time.sleep(0.3)
+            return get(self, *args, **kwargs)
+
+        with mock.patch.object(cache_class, "get", slow_get):
+            thread = threading.Thread(target=limiter.acquire)
+            thread.start()
+            time.sleep(0.05)
+            # Other callers can still queue while that call waits on the cache
+            self.assertTrue(limiter._cond.acquire(timeout=0.1))
+            limiter._cond.release()
+            thread.join()
+
+
+@override_settings(SHOWTIME_FRONTEND_API_KEY=API_KEY, DB_READ_REPLICA="replica", LIVE_BACKEND="local")
+class ReplicaRoutingTests(TransactionTestCase):
+    # "replica" mirrors the test database, so it sees the committed rows
+    databases = {"default", "replica"}
+
+    def setUp(self):
+        cache.clear()
+
+    def count_reads(self, path, **headers):
+        with CaptureQueriesContext(connections["default"]) as primary, \
+                CaptureQueriesContext(connections["replica"]) as secondary:
+            response = self.client.get(path, HTTP_X_API_KEY=API_KEY, **headers)
+        self.assertEqual(response.status_code, 200, response.content)
+        return len(primary.captured_queries), len(secondary.captured_queries)
+
+    def test_reads_go_to_replica_until_pinned(self):
+        creator = Wallet.objects.create(address=make_address("b", 1), profile=Profile.objects.create(name="Creator"))
+        contract = Contract.objects.create(address=make_address("c", 1))
+        token = Token.objects.create(contract=contract, token_identifier="1", creator=creator)
+        liker = make_address("a", 1)
+
+        self.assertEqual(self.count_reads("/api/v1/leaderboard"), (0, 1))
+
+        response = self.client.post("/api/v1/token/%s/1" % contract.address, data=json.dumps({"action": "like"}),
+                                    content_type="application/json", HTTP_X_API_KEY=API_KEY, HTTP_USERADDRESS=liker)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(LikeHistory.objects.using("default").get().token, token)
+
+        # The liker reads their own write from the primary, everyone else still uses the replica
+        cache.delete("leaderboard")
+        self.assertEqual(self.count_reads("/api/v1/leaderboard", HTTP_USERADDRESS=liker), (1, 0))
+        cache.delete("leaderboard")
+        self.assertEqual(self.count_reads("/api/v1/leaderboard"), (0, 1))
+
+        with replica.reads() as alias:
+            self.assertEqual(alias, "replica")
+            self.assertEqual(Token.objects.get().contract_id, contract.id)
+            Token.objects.update(token_identifier="2")
+        self.assertEqual(Token.objects.using("default").get().token_identifier, "2")
+
+    def test_cached_counts_keep_likes(self):
+        contract = Contract.objects.create(address=make_address("c", 1))
+        Token.objects.create(contract=contract, token_identifier="1")
+        key = (contract.address, "1")
+        liker = make_address("a", 1)
+
+        def read_as(address):
+            # What a request with this UserAddress gets
+            replica._local.address, replica._local.pinned = address, None
+            try:
+                return likesets.like_counts([key])[key]
+            finally:
+                replica._local.address, replica._local.pinned = None, None
+
+        self.assertEqual(read_as(None), 0)
+        count_likes = likesets._count_likes
+
+        def lagging(keys):
+            # The replica hasn't got the like yet
+            if replica.replica_alias():
+                return []
+            return count_likes(keys)
+
+        self.client.post("/api/v1/token/%s/1" % contract.address, data=json.dumps({"action": "like"}),
+                         content_type="application/json", HTTP_X_API_KEY=API_KEY, HTTP_USERADDRESS=liker)
+        with mock.patch.object(likesets, "_count_likes", lagging):
+            # Someone else refills the count first, then the liker reads it
+            self.assertEqual(read_as(make_address("a", 2)), 1)
+            self.assertEqual(read_as(liker), 1)
+            self.assertEqual(read_as(make_address("a", 2)), 1)
+
+
+@override_settings(SHOWTIME_FRONTEND_API_KEY=API_KEY)
+class LeaderboardTests(TransactionTestCase):
+    # A TransactionTestCase, so the background recomputation sees the rows
+
+    def setUp(self):
+        cache.clear()
+        creator = Wallet.objects.create(address=make_address("b", 1), profile=Profile.objects.create(name="Creator"))
+        self.token = Token.objects.create(contract=Contract.objects.create(address=make_address("c", 1)),
+                                          token_identifier="1", creator=creator)
+        self.liker = Profile.objects.create()
+
+    def like(self):
+        LikeHistory.objects.create(token=self.token, profile=self.liker, value=1)
+        leaderboard.mark_dirty()
+
+    def like_count(self):
+        response = self.client.get("/api/v1/leaderboard", HTTP_X_API_KEY=API_KEY)
+        return response.json()["data"][0]["like_count"] if response.json()["data"] else 0
+
+    def wait_for_recompute(self):
+        # The executor has one worker, so this runs after any recomputation already queued
+        leaderboard._executor.submit(lambda: None).result()
+
+    def test_recomputes_are_debounced(self):
+        self.assertEqual(self.like_count(), 0)
+        saved = metrics.snapshot()["counters"].get("leaderboard_recomputes_saved", 0)
+        for i in range(3):
+            self.like()
+        self.assertEqual(metrics.snapshot()["counters"]["leaderboard_recomputes_saved"], saved + 2)
+
+        # Not due yet: readers keep the previous version
+        with override_settings(LEADERBOARD_REFRESH=3600):
+            self.assertEqual(self.like_count(), 0)
+        self.assertGreater(metrics.snapshot()["gauges"]["leaderboard_staleness_seconds"], 0)
+
+        # Due: the reader that notices still gets the previous version, later ones the new one
+        with override_settings(LEADERBOARD_REFRESH=0):
+            self.assertEqual(self.like_count(), 0)
+            self.wait_for_recompute()
+            self.assertEqual(self.like_count(), 3)
+        self.assertIsNone(cache.get(leaderboard.DIRTY_KEY))
+
+
+@override_settings(SHOWTIME_FRONTEND_API_KEY=API_KEY, LIVE_BACKEND="local", LIVE_KEEPALIVE=5)
+class LiveStreamTests(TransactionTestCase):
+    # A TransactionTestCase, so the stream's worker threads see the rows
+
+    def setUp(self):
+        cache.clear()
+        identity.reset()
+        self.contract = Contract.objects.create(address=make_address("c", 1))
+        token = Token.objects.create(contract=self.contract, token_identifier="1")
+        LikeHistory.objects.create(token=token, profile=Profile.objects.create(), value=1)
+
+    def tearDown(self):
+        # The rows are flushed, so nothing cached about them may outlive the test
+        cache.clear()
+        identity.reset()
+
+    def like(self):
+        self.client.post("/api/v1/token/%s/1" % self.contract.address, data=json.dumps({"action": "like"}),
+                         content_type="application/json", HTTP_X_API_KEY=API_KEY,
+                         HTTP_USERADDRESS=make_address("a", 1))
+        connections.close_all()
+
+    def stream(self, query, steps=()):
+        '''
+        Opens a stream and, after each event, runs the next step in a worker
+        thread. Returns (status, [(event, data)]) once the steps are done.
+        '''
+        async def run():
+            loop = asyncio.get_running_loop()
+            messages = []
+            received = asyncio.Event()
+            disconnect = asyncio.Event()
+
+            async def receive():
+                await disconnect.wait()
+                return {'type': 'http.disconnect'}
+
+            async def send(message):
+                messages.append(message)
+                received.set()
+
+            def events():
+                body = b"".join(message.get('body', b'') for message in messages).decode()
+                return [(block.split("\n")[0][len("event: "):], json.loads(block.split("\n")[1][len("data: "):]))
+                        for block in body.split("\n\n") if "event: " in block]
+
+            scope = {'type': 'http', 'path': '/api/v1/live', 'query_string': query.encode(), 'headers': []}
+            task = asyncio.ensure_future(live.app(scope, receive, send))
+            remaining = list(steps)
+            while not task.done() and (remaining or len(events()) <= len(steps)):
+                await asyncio.wait_for(received.wait(), 5)
+                received.clear()
+                if remaining and len(events()) > len(steps) - len(remaining):
+                    await loop.run_in_executor(None, remaining.pop(0))
+            disconnect.set()
+            await asyncio.wait_for(task, 5)
+            return messages[0]['status'], events()
+
+        return asyncio.run(run())
+
+    def test_likes_are_pushed(self):
+        tokens = "tokens=%s:1,%s:2&key=%s" % (self.contract.address, self.contract.address, API_KEY)
+        status, events = self.stream(tokens, [lambda: (self.like(), self.like())])
+        self.assertEqual(status, 200)
+        self.assertEqual(events[0], ("snapshot", [
+            {"contract": self.contract.address, "token_id": "1", "like_count": 1},
+            {"contract": self.contract.address, "token_id": "2", "like_count": 0}]))
+        # The two likes are from the same user, so only the first changes the count
+        self.assertEqual(events[1], ("likes", [{"contract": self.contract.address, "token_id": "1", "like_count": 2}]))
+        self.assertEqual(live.hub.connections, 0)
+
+    def test_limits(self):
+        self.assertEqual(self.stream("tokens=%s:1" % self.contract.address)[0], 401)
+        with override_settings(SHOWTIME_FRONTEND_API_KEY=None):
+            self.assertEqual(self.stream("tokens=%s:1" % self.contract.address)[0], 401)
+        self.assertEqual(self.stream("tokens=%s&key=%s" % (self.contract.address, API_KEY))[0], 400)
+        self.assertEqual(self.stream("tokens=0x1:1&key=%s" % API_KEY)[0], 400)
+        with override_settings(LIVE_MAX_CONNECTIONS=0):
+            self.assertEqual(self.stream("tokens=%s:1&key=%s" % (self.contract.address, API_KEY))[0], 503)
+
+    def test_connection_limit_is_atomic(self):
+        # Streams racing for the last slot can't both take it
+        subscribers = [live.Subscriber([("0x", "1")], None) for i in range(20)]
+        added = []
+        threads = [threading.Thread(target=lambda subscriber=subscriber: added.append(live.hub.add(subscriber, 5)))
+                   for subscriber in subscribers]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        try:
+            self.assertEqual(added.count(True), 5)
+            self.assertEqual(live.hub.connections, 5)
+        finally:
+            for subscriber in subscribers:
+                if subscriber in live.hub._by_key.get(("0x", "1"), ()):
+                    live.hub.remove(subscriber)
+
+
+@override_settings(DB_POOL_SIZE=1, DB_POOL_TIMEOUT=0.1)
+class ConnectionPoolTests(SimpleTestCase):
+
+    def test_connection_limit(self):
+        with tempfile.TemporaryDirectory() as directory:
+            default = connections['default']
+            settings_dict = dict(default.settings_dict, NAME=os.path.join(directory, "pool.sqlite3"))
+            first, second = (type(default)(settings_dict, alias="pool_test") for i in range(2))
+            first.connect()
+            with self.assertRaises(OperationalError):
+                second.connect()
+            first.close()
+            second.connect()
+            second.close()
+        self.assertEqual(metrics.snapshot()["gauges"]["db_connections_open{alias=pool_test}"], 0)
+
+
+class SecretManagerTests(SimpleTestCase):
+    SECRETS = {"SECRET_KEY": "key", "DB_HOST": "host", "DB_NAME": "name", "DB_USER": "user", "DB_PASSWORD": "password"}
+
+    def test_lookups_run_in_parallel(self):
+        provider = secret_manager.FakeProvider(self.SECRETS, latency=0.2)
+        started = time.monotonic()
+        self.assertEqual(secret_manager.load(list(self.SECRETS), provider), self.SECRETS)
+        self.assertLess(time.monotonic() - started, 0.5)
+        self.assertEqual(provider.calls, 5)
+
+    def test_file_cache(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "secrets.json")
+            secret_manager.load(list(self.SECRETS), secret_manager.FakeProvider(self.SECRETS), path)
+            self.assertEqual(os.stat(path).st_mode & 0o777, 0o600)
+            self.assertEqual(os.listdir(directory), ["secrets.json"])
+
+            provider = secret_manager.FakeProvider(self.SECRETS)
+            self.assertEqual(secret_manager.load(list(self.SECRETS), provider, path), self.SECRETS)
+            self.assertEqual((provider.calls, secret_manager.timings["source"]), (0, "file"))
+
+            # Expired, or missing a secret that is asked for now
+            secret_manager.load(list(self.SECRETS), provider, path, cache_ttl=-1)
+            self.assertEqual(provider.calls, 5)
+            provider = secret_manager.FakeProvider(dict(self.SECRETS, API_KEY="api"))
+            secret_manager.load(list(self.SECRETS) + ["API_KEY"], provider, path)
+            self.assertEqual(provider.calls, 6)
@@ -10,6 +10,7 @@ app_name = 'api'
 urlpatterns = [
     url(r'^$', views.index, name='index'),
     url(r'^v1/mylikes$', views.mylikes, name='mylikes'),
+    url(r'^v1/has_liked$', views.HasLikedView.as_view(), name='has_liked'),
     url(r'^v1/profile$', views.ProfileView.as_view(), name='profile'),
     url(r'^v1/owned$', views.OwnedView.as_view(), name='owned'),
     url(r'^v1/liked$', views.LikedView.as_view(), name='liked'),
@@ -21,15 +22,20 @@ urlpatterns = [
 
     url(r'^v1/token/(?P<asset_contract_address>[0-9a-z]+)/(?P<token_id>[0-9]+)$', \
         views.TokenView.as_view(), name='token'),
+    url(r'^v1/tokens$', views.TokensView.as_view(), name='tokens'),
     
     url(r'^v1/contract/(?P<address>[0-9a-zA-Z]+)$', \
         views.ContractView.as_view(), name='contract'),
     url(r'^v1/leaderboard$', views.LeaderboardView.as_view(), name='leaderboard'),
     url(r'^v1/featured$', views.FeaturedView.as_view(), name='featured'),
 
+    url(r'^v1/metrics$', views.MetricsView.as_view(), name='metrics'),
+
     url(r'^v1/bot-only/user-add$', views.UserAddView.as_view(), name='user_add'),
+    url(r'^v1/bot-only/profiles$', views.ProfileIngestView.as_view(), name='profile_ingest'),
 
-    #TBD: url(r'^v1/search$', views.SearchView.as_view(), name='search'),
+    url(r'^v1/search$', views.SearchView.as_view(), name='search'),
+    url(r'^v1/autocomplete$', views.AutocompleteView.as_view(), name='autocomplete'),
 ]
 
 # Usage Examples
@@ -37,9 +43,12 @@ urlpatterns = [
 # GET: /api/v1/token/0x0000000000001b84b1cb32787b0d64758d019317/3259539015542658014133428223780909702996875844353040978646893663363117613056
 # POST: /api/v1/token/0x0000000000001b84b1cb32787b0d64758d019317/3259539015542658014133428223780909702996875844353040978646893663363117613056 \
     # json body: { "action": "like", "user_email": "test@gmail.com" }
+# GET: /api/v1/tokens?tokens=0x0000000000001b84b1cb32787b0d64758d019317:1,0x0000000000001b84b1cb32787b0d64758d019317:2
 # GET: /api/v1/profile/0xd3e9d60e4e4de615124d5239219f32946d10151d
 # GET: /api/v1/contract/0x0000000000001b84b1cb32787b0d64758d019317
 
 # GET: /api/v1/search?q=Lil+Miquela
+# GET: /api/v1/autocomplete?q=lil+mi
 # GET: /api/v1/featured
+# GET: /api/v1/has_liked?address=0xd3e9d60e4e4de615124d5239219f32946d10151d&tokens=0x0000000000001b84b1cb32787b0d64758d019317:1,0x0000000000001b84b1cb32787b0d64758d019317:2
 # GET: /api/v1/leaderboard
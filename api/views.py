@@ -30,28 +30,110 @@ Unsuccessful requests will return an "error" object:
 import json
 import urllib.parse
 import re
-import requests
-import datetime
-from django.utils import timezone
 from django.http import HttpResponse, JsonResponse
 from django.views import View
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
-from django.db.models import Sum
-from django.db import connection
+from django.db import connections
 from django.core.cache import cache
 
-from magic_admin import Magic
-# A util provided by `magic_admin` to parse the auth header value.
-from magic_admin.utils.http import parse_authorization_header_value
+# magic_admin pulls in web3 and takes ~300ms to import, so it is imported
+# where DID tokens are checked rather than here
 #from magic_admin.error import DIDTokenError
 #from magic_admin.error import RequestError
-from stbackend.settings import SHOWTIME_FRONTEND_API_KEY
+from django.conf import settings
 
 from .models import Contract, Token, LikeHistory, Profile, Wallet
+from .assets import asset_key, load_assets, store_assets, stored_assets
+from .warmup import warm_up
+from . import activity, autocomplete, featured, identity, ingest, leaderboard, likesets, live, metrics, moderation, negative, opensea, replica, search, tags
+
+# example: "0x0000000000001b84b1cb32787b0d64758d019317"
+ADDRESS_RE = re.compile(r"0x([0-9a-zA-Z]{40})+$")
+COLLECTION_RE = re.compile(r"([a-z\-])+$")
 
 def valid_api_key(api_key):
-    return api_key==SHOWTIME_FRONTEND_API_KEY
+    # Fails closed: with no key configured, no request is authorized
+    return bool(settings.SHOWTIME_FRONTEND_API_KEY) and api_key==settings.SHOWTIME_FRONTEND_API_KEY
+
+
+def add_showtime_data(assets):
+    '''
+    Adds the "showtime" block with like counts and the hidden flag to a list
+    of OpenSea assets, keeping the stale flag from mark_stale()
+    '''
+    keys = set(filter(None, (asset_key(asset) for asset in assets)))
+    hidden = moderation.hidden_assets()
+    like_counts = likesets.like_counts(keys) if keys else {}
+
+    for asset in assets:
+        key = asset_key(asset)
+        stale = is_stale([asset])
+        asset['showtime'] = {
+            "like_count": like_counts.get(key, 0),
+            "hide": bool(key) and (key[0].lower(), key[1]) in hidden
+        }
+        if stale:
+            asset['showtime']['stale'] = True
+
+
+def mark_stale(assets):
+    '''
+    Flags assets that are served from stored or cached data because OpenSea
+    is failing with "stale": true in their "showtime" block. Responses with
+    stale assets aren't cached.
+    '''
+    for asset in assets:
+        asset['showtime'] = {"stale": True}
+    if assets:
+        metrics.incr("stale_responses")
+    return assets
+
+
+def is_stale(assets):
+    return any((asset.get('showtime') or {}).get('stale') for asset in assets)
+
+
+def get_assets(keys, priority=opensea.INTERACTIVE):
+    '''
+    Returns ({(contract address, token_id): asset}, status_code) for a list of tokens.
+    Fresh stored metadata is used where we have it and only the rest is fetched
+    from OpenSea, batched with lookups from concurrent requests. If OpenSea
+    fails, stored metadata of any age is returned instead, marked stale.
+    Tokens OpenSea recently didn't know are skipped.
+    '''
+    assets = load_assets(keys)
+    missing = [key for key in keys if key not in assets and negative.lookup(("token",) + key) is None]
+
+    if missing:
+        try:
+            fetched = opensea.asset_loader.load_many(missing, priority)
+        except opensea.OpenSeaError as error:
+            stale = load_assets(missing, max_age=0)
+            if not stale:
+                return assets, error.status_code
+            mark_stale(list(stale.values()))
+            assets.update(stale)
+            return assets, 200
+
+        for key, asset in fetched.items():
+            if asset is None:
+                negative.remember(("token",) + key, 404)
+        fetched = {key: asset for key, asset in fetched.items() if asset}
+        store_assets(fetched.values())
+        assets.update(fetched)
+
+    return assets, 200
+
+
+def profiles_changed(profile_ids):
+    '''
+    Updates the search and autocomplete indexes after profiles are created or edited
+    '''
+    search.index_profiles(profile_ids)
+    autocomplete.profiles_changed(profile_ids)
+    tags.invalidate(*[tags.profile_tag(profile_id) for profile_id in profile_ids if profile_id])
+    leaderboard.mark_dirty()
 
 
 @method_decorator(csrf_exempt, name='dispatch')
@@ -62,6 +144,16 @@ def index(request):
     return HttpResponse("Index")
 
 
+def warmup(request):
+    '''
+    App Engine warmup request, sent to new instances before they get traffic
+    '''
+    response_body = {
+        "data": warm_up()
+    }
+    return JsonResponse(response_body)
+
+
 @method_decorator(csrf_exempt, name='dispatch')
 def mylikes(request):
     '''
@@ -96,7 +188,7 @@ def mylikes(request):
                 }
         return JsonResponse(response_body, status=status_code)
 
-    if not bool(re.match(r"0x([0-9a-zA-Z]{40})+$", public_address)):
+    if not bool(ADDRESS_RE.match(public_address)):
         # Return early with error message
         status_code = 400
         response_body = {
@@ -109,43 +201,41 @@ def mylikes(request):
 
 
 
-    response_body = cache.get(str(public_address)+"_likes")
+    activity.touch(public_address)
+
+    response_body = tags.get(str(public_address)+"_likes")
 
     if response_body:
         print("Used mylike cache")
         return JsonResponse(response_body)
 
-    wallet = Wallet.objects.get_or_create(address=public_address)[0]
-    if not wallet.profile:
-        wallet.profile = Profile.objects.create()
-    wallet.last_authenticated = datetime.datetime.now(tz=timezone.utc)
-    wallet.save()
-
-
-    with connection.cursor() as cursor:
-        cursor.execute("""
-        select c.address, token_identifier, SUM(value) as likes, max(added) as timestamp
-        from api_profile p
-        join api_wallet w
-        on w.profile_id = p.id
-        join api_likehistory h
-        on p.id = h.profile_id
-        join api_token t
-        on t.id = h.token_id
-        join api_contract c
-        on c.id = t.contract_id
-        where w.address = %s
-        group by c.address, token_identifier
-        having likes > 0
-        """, (public_address, ))
-        rows = cursor.fetchall()
-        like_list = []
-        for row in rows:
-            like_list.append({
-                "contract": row[0],
-                "token_id": row[1],
-                "timestamp": row[3]
-            })
+    # A read: unknown wallets get a profile when they first like something
+    profile_id = identity.resolve(public_address).profile_id
+    dependencies = tags.depend_on([tags.address_tag(public_address)] + ([tags.likes_tag(profile_id)] if profile_id else []))
+
+
+    rows = []
+    if profile_id:
+        with replica.reads() as alias, connections[alias].cursor() as cursor:
+            cursor.execute("""
+            select c.address, token_identifier, SUM(value) as likes, max(added) as timestamp
+            from api_likehistory h
+            join api_token t
+            on t.id = h.token_id
+            join api_contract c
+            on c.id = t.contract_id
+            where h.profile_id = %s
+            group by c.address, token_identifier
+            having likes > 0
+            """, (profile_id, ))
+            rows = cursor.fetchall()
+    like_list = []
+    for row in rows:
+        like_list.append({
+            "contract": row[0],
+            "token_id": row[1],
+            "timestamp": row[3]
+        })
 
     #my_wallet_addresses = list(Wallet.objects.filter(profile=wallet.profile).values_list("address"))
 
@@ -161,7 +251,7 @@ def mylikes(request):
     response_body = {
             "data": like_list
         }
-    cache.set(str(public_address)+"_likes", response_body, None)
+    tags.set(str(public_address)+"_likes", response_body, dependencies)
     return JsonResponse(response_body)
 
 
@@ -169,6 +259,59 @@ def mylikes(request):
 
 
 
+class HasLikedView(View):
+    '''
+    Says which of a page of tokens a user has liked
+    '''
+
+    def get(self, request):
+        '''
+        Params: address (required), tokens (required - up to 50 comma-separated contract:token_id pairs)
+        Returns a true/false for each token, in the order given
+        '''
+
+        if not valid_api_key(request.headers.get('X-API-Key')):
+            status_code = 401
+            response_body = {
+                        "error": {
+                            "code": status_code,
+                            "message": "Unauthorized"
+                        }
+                    }
+            return JsonResponse(response_body, status=status_code)
+
+        address = request.GET.get('address')
+        tokens = request.GET.get('tokens')
+
+        if not address or not bool(ADDRESS_RE.match(address)):
+            status_code = 400
+            response_body = {
+                        "error": {
+                            "code": status_code,
+                            "message": "Missing address"
+                        }
+                    }
+            return JsonResponse(response_body, status=status_code)
+
+        keys = [tuple(token.split(":", 1)) for token in tokens.split(",")] if tokens else []
+        if not keys or len(keys) > 50 or not all(
+                len(key) == 2 and ADDRESS_RE.match(key[0]) and key[1].isdigit() for key in keys):
+            status_code = 400
+            response_body = {
+                        "error": {
+                            "code": status_code,
+                            "message": "tokens must be 1 to 50 comma-separated contract:token_id pairs"
+                        }
+                    }
+            return JsonResponse(response_body, status=status_code)
+
+        profile_id = identity.resolve(address).profile_id
+        response_body = {
+            "data": likesets.has_liked(profile_id, keys) if profile_id else [False] * len(keys)
+        }
+        return JsonResponse(response_body)
+
+
 @method_decorator(csrf_exempt, name='dispatch')
 class TokenView(View):
     '''
@@ -217,7 +360,7 @@ class TokenView(View):
         # Check to see if it's a valid address format
         # example: "0x0000000000001b84b1cb32787b0d64758d019317"
 
-        if not bool(re.match(r"0x([0-9a-zA-Z]{40})+$", asset_contract_address)):
+        if not bool(ADDRESS_RE.match(asset_contract_address)):
             # Return early with error message
             status_code = 400
             response_body = {
@@ -229,14 +372,27 @@ class TokenView(View):
             return JsonResponse(response_body, status=status_code)
 
 
+        # OpenSea recently didn't know this token
+        status_code = negative.lookup(("token", asset_contract_address, token_id))
+        if status_code:
+            response_body = {
+                "error": {
+                    "code": status_code,
+                    "message": "Error from OpenSea API"
+                }
+            }
+            return JsonResponse(response_body, status=status_code)
+
         opensea_json = cache.get(asset_contract_address+"_"+token_id)
         if not opensea_json:
 
-            # Continue with query
-            response = requests.get("https://api.opensea.io/api/v1/asset/{asset_contract_address}/{token_id}".format(asset_contract_address=asset_contract_address, token_id=token_id))
+            # Stored metadata first, then OpenSea, batched with other lookups
+            key = (asset_contract_address, token_id)
+            assets_by_key, status_code = get_assets([key])
+            if status_code==200 and key not in assets_by_key:
+                status_code = 404
 
-            if response.status_code!=200:
-                status_code = response.status_code
+            if status_code!=200:
                 response_body = {
                     "error": {
                         "code": status_code,
@@ -245,20 +401,21 @@ class TokenView(View):
                 }
                 return JsonResponse(response_body, status=status_code)
 
-            opensea_json = response.json()
-            cache.set(asset_contract_address+"_"+token_id, opensea_json, None)
+            opensea_json = assets_by_key[key]
+            if not is_stale([opensea_json]):
+                cache.set(asset_contract_address+"_"+token_id, opensea_json, None)
         else:
             print("Used token cache")
 
         # Add the "showtime" data to the original response
-        like_count = list(LikeHistory.objects.filter(
-            token__token_identifier=token_id,
-            token__contract__address=asset_contract_address
-        ).aggregate(Sum('value')).values())[0] or 0
+        like_count = likesets.like_counts([(asset_contract_address, token_id)])[(asset_contract_address, token_id)]
 
+        stale = is_stale([opensea_json])
         opensea_json['showtime'] = {
             "like_count": like_count
         }
+        if stale:
+            opensea_json['showtime']['stale'] = True
 
         #For now, just return full opensea API response
         response_body = {
@@ -306,7 +463,7 @@ class TokenView(View):
                     }
             return JsonResponse(response_body, status=status_code)
 
-        if not bool(re.match(r"0x([0-9a-zA-Z]{40})+$", public_address)):
+        if not bool(ADDRESS_RE.match(public_address)):
             # Return early with error message
             status_code = 400
             response_body = {
@@ -350,7 +507,7 @@ class TokenView(View):
         # Check to see if it's a valid address format
         # example: "0x0000000000001b84b1cb32787b0d64758d019317"
 
-        if not bool(re.match(r"0x([0-9a-zA-Z]{40})+$", asset_contract_address)):
+        if not bool(ADDRESS_RE.match(asset_contract_address)):
             # Return early with error message
             status_code = 400
             response_body = {
@@ -386,11 +543,8 @@ class TokenView(View):
             return JsonResponse(response_body, status=status_code)
 
         # TBD: Process the Like/Unlike
-        wallet = Wallet.objects.get_or_create(address=public_address)[0]
-        if not wallet.profile:
-            wallet.profile = Profile.objects.create()
-        wallet.last_authenticated = datetime.datetime.now(tz=timezone.utc)
-        wallet.save()
+        profile_id = identity.profile_for(public_address)
+        activity.touch(public_address)
 
         contract = Contract.objects.get_or_create(address=asset_contract_address)[0]
         token = Token.objects.get_or_create(contract=contract, token_identifier=token_id)[0]
@@ -408,6 +562,7 @@ class TokenView(View):
                         # Create new a profile if needed
                         creator_wallet.profile = Profile.objects.create(name=creator_name, img_url=creator_img_url)
                         creator_wallet.save()
+                        profiles_changed([creator_wallet.profile_id])
                     else:
                         # See if we can augment an existing profile
                         creator_profile = creator_wallet.profile
@@ -420,6 +575,7 @@ class TokenView(View):
                             need_to_update = True
                         if need_to_update:
                             creator_profile.save()
+                            profiles_changed([creator_profile.id])
 
                     token.creator = creator_wallet
                     token.save()
@@ -431,22 +587,95 @@ class TokenView(View):
 
 
         # Skip duplicate submissions
-        recent_history = LikeHistory.objects.filter(profile=wallet.profile, token=token).order_by('-added').first()
+        recent_history = LikeHistory.objects.filter(profile_id=profile_id, token=token).order_by('-added').first()
         if recent_history and recent_history.value == value:
             pass
         else:
-            LikeHistory.objects.create(profile=wallet.profile, token=token, value=value)
+            LikeHistory.objects.create(profile_id=profile_id, token=token, value=value)
+            autocomplete.likes_changed(token, value)
 
-        # Invalidate caches for anything dependent on likes
-        cache.delete(str(public_address)+"_likes")
-        cache.delete(str(public_address)+"_liked_tokens")
-        cache.delete("leaderboard")
-        #cache.delete("featured")
+            # Invalidate caches for anything dependent on likes. Pinned first, so
+            # the entries aren't refilled from a replica that lacks the like.
+            changed = [tags.token_tag(asset_contract_address, token_id), tags.likes_tag(profile_id)]
+            replica.pin_tags(changed)
+            tags.invalidate(*changed)
+            leaderboard.mark_dirty()
+            live.like_changed(asset_contract_address, token_id)
+
+        # The replica may not have the like yet, so this user reads from the primary for a while
+        replica.pin(public_address)
 
         # Return empty 200
         return HttpResponse("")
 
 
+class TokensView(View):
+    '''
+    Returns several items at once, for cards showing an arbitrary set of tokens
+    '''
+
+    def get(self, request):
+        '''
+        Params: tokens (required - up to 50 comma-separated contract:token_id pairs)
+        Returns the items in the order given, with null for tokens OpenSea doesn't know
+        '''
+
+        if not valid_api_key(request.headers.get('X-API-Key')):
+            status_code = 401
+            response_body = {
+                        "error": {
+                            "code": status_code,
+                            "message": "Unauthorized"
+                        }
+                    }
+            return JsonResponse(response_body, status=status_code)
+
+        tokens = request.GET.get('tokens')
+        keys = [tuple(token.split(":", 1)) for token in tokens.split(",")] if tokens else []
+        if not keys or len(keys) > 50 or not all(
+                len(key) == 2 and ADDRESS_RE.match(key[0]) and key[1].isdigit() for key in keys):
+            status_code = 400
+            response_body = {
+                        "error": {
+                            "code": status_code,
+                            "message": "tokens must be 1 to 50 comma-separated contract:token_id pairs"
+                        }
+                    }
+            return JsonResponse(response_body, status=status_code)
+
+        # The same cache entries as the single token view, read in one round trip
+        unique_keys = list(dict.fromkeys(keys))
+        cache_keys = {key: key[0]+"_"+key[1] for key in unique_keys}
+        cached = cache.get_many(list(cache_keys.values()))
+        assets_by_key = {key: cached[cache_key] for key, cache_key in cache_keys.items() if cache_key in cached}
+
+        # Tokens OpenSea recently didn't know are left out without a lookup
+        missing = [key for key in unique_keys
+                   if key not in assets_by_key and negative.lookup(("token",) + key) is None]
+        if missing:
+            # Stored metadata first, then OpenSea, with the misses batched into /assets calls
+            fetched, status_code = get_assets(missing)
+            if status_code!=200:
+                response_body = {
+                    "error": {
+                        "code": status_code,
+                        "message": "Error from OpenSea API"
+                    }
+                }
+                return JsonResponse(response_body, status=status_code)
+
+            cache.set_many({cache_keys[key]: asset for key, asset in fetched.items() if not is_stale([asset])}, None)
+            assets_by_key.update(fetched)
+
+        # Like counts for all of them in one grouped query
+        add_showtime_data(list(assets_by_key.values()))
+
+        response_body = {
+            "data": [assets_by_key.get(key) for key in keys]
+        }
+        return JsonResponse(response_body)
+
+
 class SearchView(View):
     '''
     Returns list of items based on search query
@@ -454,7 +683,7 @@ class SearchView(View):
 
     def get(self, request):
         '''
-        Params: q (required - in query string)
+        Params: q (required - in query string), offset, limit (optional - in query string)
         '''
 
         if not valid_api_key(request.headers.get('X-API-Key')):
@@ -481,39 +710,109 @@ class SearchView(View):
 
         unquoted_query = urllib.parse.unquote(query)
 
-        # TBD: perform the search
-
-        items_list = [
-            {
-                "token": "0x752aa32a2cc49aed842874326379ea1f95b1cbe6",
-                "name": "Name",
-                "creator": "Creator",
-                "owner": "Owner",
-                "price": "Price",
-                "thumbnail_url": "",
-                "history": []
-            },
-            {
-                "token": "token2",
-                "name": "Name 2",
-                "creator": "Creator 2",
-                "owner": "Owner 2",
-                "price": "Price 2",
-                "thumbnail_url": "",
-                "history": []
-            }
-        ]
+        try:
+            offset = max(int(request.GET.get('offset', 0)), 0)
+            limit = min(max(int(request.GET.get('limit', 20)), 1), 100)
+        except ValueError:
+            status_code = 400
+            response_body = {
+                        "error": {
+                            "code": status_code,
+                            "message": "offset and limit must be integers"
+                        }
+                    }
+            return JsonResponse(response_body, status=status_code)
+
+        # Ask for one extra result to know whether there is another page
+        documents = search.search(unquoted_query, offset=offset, limit=limit + 1)
+        has_more = len(documents) > limit
+        documents = documents[:limit]
+
+        assets = [document.token.asset.data for document in documents if document.kind == "asset"]
+        add_showtime_data(assets)
+        assets = iter(assets)
+
+        profile_ids = [document.profile_id for document in documents if document.kind == "profile"]
+        addresses = {}
+        for profile_id, address in Wallet.objects.filter(profile_id__in=profile_ids).order_by('id').values_list('profile_id', 'address'):
+            addresses.setdefault(profile_id, address)
+
+        items_list = []
+        for document in documents:
+            if document.kind == "asset":
+                items_list.append({"type": "asset", "asset": next(assets)})
+            else:
+                profile = document.profile
+                items_list.append({
+                    "type": "profile",
+                    "profile": {
+                        "name": profile.name,
+                        "twitter": profile.twitter,
+                        "img_url": profile.img_url,
+                        "address": addresses.get(profile.id),
+                    }
+                })
 
-        # Could add in results_count, pages, etc. under data
         response_body = {
                         "data": {
                             "query": unquoted_query,
+                            "offset": offset,
+                            "limit": limit,
+                            "has_more": has_more,
                             "results": items_list
                         }
                     }
         return JsonResponse(response_body)
 
 
+class AutocompleteView(View):
+    '''
+    Returns creators and assets whose name, twitter handle or address starts with the query
+    '''
+
+    def get(self, request):
+        '''
+        Params: q (required - in query string), limit (optional - in query string)
+        '''
+
+        if not valid_api_key(request.headers.get('X-API-Key')):
+            status_code = 401
+            response_body = {
+                        "error": {
+                            "code": status_code,
+                            "message": "Unauthorized"
+                        }
+                    }
+            return JsonResponse(response_body, status=status_code)
+
+        query = request.GET.get('q')
+        if not query or query.strip()=="":
+            # Return early with error message
+            status_code = 400
+            response_body = {
+                        "error": {
+                            "code": status_code,
+                            "message": "Required parameter missing or blank: q"
+                        }
+                    }
+            return JsonResponse(response_body, status=status_code)
+
+        try:
+            limit = min(max(int(request.GET.get('limit', 10)), 1), 20)
+        except ValueError:
+            limit = 10
+
+        # No suggestions until this instance has its index loaded
+        index = autocomplete.get_index()
+        response_body = {
+                        "data": {
+                            "query": query,
+                            "results": index.lookup(query, limit) if index else []
+                        }
+                    }
+        return JsonResponse(response_body)
+
+
 class FeaturedView(View):
     '''
     Lists the Featured Digital Art on the homepage
@@ -521,7 +820,7 @@ class FeaturedView(View):
 
     def get(self, request):
         '''
-        Params: none
+        Params: limit (optional - in query string)
         '''
 
         if not valid_api_key(request.headers.get('X-API-Key')):
@@ -534,14 +833,16 @@ class FeaturedView(View):
                     }
             return JsonResponse(response_body, status=status_code)
 
-        opensea_json = cache.get("featured")
-        if opensea_json is None:
+        limit = request.GET.get('limit')
+        if limit and limit.isdigit() and int(limit)<=50:
+            limit = int(limit)
+        else:
+            limit = 50
 
-            limit = request.GET.get('limit')
-            if limit and limit.isdigit() and int(limit)<=50:
-                limit = int(limit)
-            else:
-                limit = 50
+        cache_key = featured.cache_key(limit)
+        opensea_json = tags.get(cache_key)
+        if opensea_json is None:
+            dependencies = tags.depend_on([tags.FEATURED])
 
             '''
             with connection.cursor() as cursor:
@@ -572,86 +873,11 @@ class FeaturedView(View):
                     token_list.append(row[1])
             '''
 
-            featured_assets = [
-                {
-                    "name": "Ikaros",
-                    "contract_address":"0xb932a70a57673d89f4acffbe830e8ed7f75fb9e0",
-                    "token_id": "5178",
-                    "link": "https://opensea.io/assets/0xb932a70a57673d89f4acffbe830e8ed7f75fb9e0/5178",
-                },
-                {
-                    "name": "Rebirth of Venus",
-                    "contract_address":"0xb932a70a57673d89f4acffbe830e8ed7f75fb9e0",
-                    "token_id": "16297",
-                    "link": "https://opensea.io/assets/0xb932a70a57673d89f4acffbe830e8ed7f75fb9e0/16297"
-                },
-                {
-                    "name": "UNISWAP - Slimesunday",
-                    "contract_address":"0x397206a955a6a20d1688ede77a7c767a101a8cfc",
-                    "token_id": "4800010007",
-                    "link": "https://opensea.io/assets/0x397206a955a6a20d1688ede77a7c767a101a8cfc/4800010007"
-                },
-                {
-                    "name": "Carl Cox Portrait",
-                    "contract_address":"0xc937c594cb126fed0db22b41ab070bc206080825",
-                    "token_id": "6100010025",
-                    "link": "https://opensea.io/assets/0xc937c594cb126fed0db22b41ab070bc206080825/6100010025"
-                },
-                {
-                    "name": "TEN #2/10 - SYM",
-                    "contract_address":"0xfdd633b978f181d5a78ab10bc8e03466bcdf264a",
-                    "token_id": "12100020002",
-                    "link": "https://opensea.io/assets/0xfdd633b978f181d5a78ab10bc8e03466bcdf264a/12100020002"
-                },
-                {
-                    "name": "Walking on the edge",
-                    "contract_address":"0xd07dc4262bcdbf85190c01c996b4c06a461d2430",
-                    "token_id": "54837",
-                    "link": "https://opensea.io/assets/0xd07dc4262bcdbf85190c01c996b4c06a461d2430/54837"
-                },
-                {
-                    "name": "Modern Sculpture",
-                    "contract_address":"0xd07dc4262bcdbf85190c01c996b4c06a461d2430",
-                    "token_id": "65526",
-                    "link": "https://opensea.io/assets/0xd07dc4262bcdbf85190c01c996b4c06a461d2430/65526"
-                },
-                {
-                    "name": "Face Machine",
-                    "contract_address":"0xb932a70a57673d89f4acffbe830e8ed7f75fb9e0",
-                    "token_id": "13307",
-                    "link": "https://opensea.io/assets/0xb932a70a57673d89f4acffbe830e8ed7f75fb9e0/13307"
-                },
-                {
-                    "name": "Mona Lisa re-imagined",
-                    "contract_address":"0x41a322b28d0ff354040e2cbc676f0320d8c8850d",
-                    "token_id": "1611",
-                    "link": "https://opensea.io/assets/0x41a322b28d0ff354040e2cbc676f0320d8c8850d/1611"
-                },
-            ]
-
-            contract_list = []
-            token_list = []
-
-            i = 0
-            for asset in featured_assets:
-                contract_list.append(asset['contract_address'])
-                token_list.append(asset['token_id'])
-                asset['order'] = i
-                i = i+1
-
-            # TBD - create the token list query
-            # Query
-            url = "https://api.opensea.io/api/v1/assets"
-            querystring = {
-                "offset":"0",
-                "token_ids": token_list,
-                "asset_contract_addresses": contract_list,
-                "limit":limit #Capped at 50
-            }
-            response = requests.request("GET", url, params=querystring)
+            slots, expires_in = featured.active_slots(limit)
+            keys = [(slot.contract_address, slot.token_identifier) for slot in slots]
+            assets_by_key, status_code = get_assets(keys, opensea.BULK)
 
-            if response.status_code!=200:
-                status_code = response.status_code
+            if status_code!=200:
                 response_body = {
                     "error": {
                         "code": status_code,
@@ -660,33 +886,22 @@ class FeaturedView(View):
                 }
                 return JsonResponse(response_body, status=status_code)
 
-            opensea_json = response.json().get('assets')
-            for opensea_asset in opensea_json:
-                for fa in featured_assets:
-                    if fa["contract_address"] == opensea_asset["asset_contract"]["address"] and fa["token_id"]==opensea_asset["token_id"]:
-                        opensea_asset['showtime_order'] = fa["order"]
-
-            opensea_json = sorted(opensea_json, key = lambda i: i['showtime_order'])
+            # Keep the featured order
+            opensea_json = []
+            for order, key in enumerate(keys):
+                if key in assets_by_key:
+                    asset = assets_by_key[key]
+                    asset['showtime_order'] = order
+                    opensea_json.append(asset)
 
 
-            cache.set("featured", opensea_json, None)
+            if not is_stale(opensea_json):
+                tags.set(cache_key, opensea_json, dependencies, expires_in)
         else:
             print("Used featured cache")
         
-        for asset in opensea_json:
-
-            # Add the "showtime" data to the original response
-            if asset.get('token_id') and asset.get('asset_contract') and asset['asset_contract'].get('address'):
-                like_count = list(LikeHistory.objects.filter(
-                    token__token_identifier=asset['token_id'],
-                    token__contract__address=asset['asset_contract']['address']
-                ).aggregate(Sum('value')).values())[0] or 0
-            else:
-                like_count = 0
-
-            asset['showtime'] = {
-                "like_count": like_count
-            }
+        # Add the "showtime" data to the original response
+        add_showtime_data(opensea_json)
 
         response_body = {
             "data": opensea_json
@@ -728,7 +943,7 @@ class OwnedView(View):
             limit = 50
 
 
-        if not address or not bool(re.match(r"0x([0-9a-zA-Z]{40})+$", address)):
+        if not address or not bool(ADDRESS_RE.match(address)):
             status_code = 400
             response_body = {
                             "error": {
@@ -739,6 +954,10 @@ class OwnedView(View):
             return JsonResponse(response_body, status=status_code)
 
             '''
+            from magic_admin import Magic
+            # A util provided by `magic_admin` to parse the auth header value.
+            from magic_admin.utils.http import parse_authorization_header_value
+
             try:
                 did_token = parse_authorization_header_value(
                     request.headers.get('Authorization'),
@@ -772,40 +991,68 @@ class OwnedView(View):
                 return JsonResponse(response_body, status=status_code)
             '''
 
+        # Linked wallets share one cached list
+        owner = identity.resolve(address)
+        if owner.profile_id:
+            owned_key = "owned_profile_%d" % owner.profile_id
+            dependencies = tags.depend_on([tags.profile_tag(owner.profile_id)])
+        else:
+            owned_key = address.lower()+"_owned"
+            dependencies = tags.depend_on([tags.address_tag(address)])
+
+        # Status code of each linked wallet OpenSea couldn't list
+        failed = {}
+
         if use_cached:
-            asset_list = cache.get(address+"_owned")
+            asset_list = tags.get(owned_key)
             if asset_list is None:
                 asset_list = []
         else:
 
-            wallet = Wallet.objects.filter(address=address).first()
-            if wallet and wallet.profile:
-                address_list = list(Wallet.objects.filter(profile=wallet.profile).values_list("address", flat=True))
-            else:
-                address_list = [address]
-
             asset_list = []
-            for owner in address_list:
+            for wallet_address in owner.addresses:
 
-                owner_to_search = owner
+                address_to_search = wallet_address
 
                 # For testing
-                if owner=="0x9D23d6DA969460bD6374e7dBd6E6c5CdA032F017":
-                    owner_to_search = "0x73113a65011acbad72730577defd95aaf268e22a"
-                    
+                if wallet_address=="0x9D23d6DA969460bD6374e7dBd6E6c5CdA032F017":
+                    address_to_search = "0x73113a65011acbad72730577defd95aaf268e22a"
+
+                status_code = negative.lookup(("owner", address_to_search))
+                if status_code:
+                    failed[wallet_address] = status_code
+                    continue
+
                 # Query
-                url = "https://api.opensea.io/api/v1/assets"
                 querystring = {
                     "order_direction":"desc",
                     "offset":"0",
                     "order_by": "sale_price",
-                    "owner": owner_to_search,
+                    "owner": address_to_search,
                     "limit":limit #Capped at 50
                 }
-                response = requests.request("GET", url, params=querystring)
+                try:
+                    opensea_json = opensea.list_assets(querystring, opensea.INTERACTIVE)
+                except opensea.OpenSeaError as error:
+                    negative.remember(("owner", address_to_search), error.status_code)
+                    failed[wallet_address] = error.status_code
+                    continue
+
+
+                for asset in opensea_json:
+
+                    
+
+                    asset_list.append(asset)
 
-                if response.status_code!=200:
-                    status_code = response.status_code
+            if failed:
+                # Fall back to the last complete list, or else leave the failing wallets out
+                cached_list = tags.get(owned_key)
+                if cached_list is not None:
+                    asset_list = cached_list
+                    mark_stale(asset_list)
+                elif len(failed) == len(owner.addresses):
+                    status_code = failed[owner.addresses[0]]
                     response_body = {
                         "error": {
                             "code": status_code,
@@ -814,36 +1061,21 @@ class OwnedView(View):
                     }
                     return JsonResponse(response_body, status=status_code)
 
+            if not is_stale(asset_list):
+                store_assets(asset_list)
+                # A list missing a wallet isn't cached, so the next request tries it again
+                if not failed:
+                    tags.set(owned_key, asset_list, dependencies)
 
-                opensea_json = response.json().get('assets')
 
-                for asset in opensea_json:
-
-                    
-
-                    asset_list.append(asset)
-            
-            cache.set(address+"_owned", asset_list, None)
-
-
-        for asset in asset_list:
-            # Add the "showtime" data to the original response
-            if asset.get('token_id') and asset.get('asset_contract') and asset['asset_contract'].get('address'):
-                like_count = list(LikeHistory.objects.filter(
-                    token__token_identifier=asset['token_id'],
-                    token__contract__address=asset['asset_contract']['address']
-                ).aggregate(Sum('value')).values())[0] or 0
-            else:
-                like_count = 0
-
-            asset['showtime'] = {
-                "like_count": like_count
-            }
-            
+        # Add the "showtime" data to the original response
+        add_showtime_data(asset_list)
 
         response_body = {
             "data": sorted(asset_list, key = lambda i: i['showtime']['like_count'], reverse=True)
         }
+        if failed:
+            response_body["failed_addresses"] = sorted(failed)
 
         return JsonResponse(response_body)
 
@@ -879,7 +1111,7 @@ class LikedView(View):
             limit = 50
 
 
-        if not address or not bool(re.match(r"0x([0-9a-zA-Z]{40})+$", address)):
+        if not address or not bool(ADDRESS_RE.match(address)):
             status_code = 400
             response_body = {
                             "error": {
@@ -889,9 +1121,9 @@ class LikedView(View):
                         }
             return JsonResponse(response_body, status=status_code)
 
-        wallet = Wallet.objects.filter(address=address).first()
+        profile_id = identity.resolve(address).profile_id
 
-        if wallet is None or wallet.profile is None:
+        if profile_id is None:
             # Return early - there are no likes
             response_body = {
                 "data": []
@@ -899,54 +1131,30 @@ class LikedView(View):
             return JsonResponse(response_body)
 
 
-        opensea_json = cache.get(address+"_liked_tokens")
+        opensea_json = tags.get(address+"_liked_tokens")
         if opensea_json is None:
-            with connection.cursor() as cursor:
+            dependencies = tags.depend_on([tags.address_tag(address), tags.likes_tag(profile_id)])
+            with replica.reads() as alias, connections[alias].cursor() as cursor:
                 cursor.execute("""
                 select c.address, token_identifier, SUM(value) as likes, max(added)
-                from api_profile p
-                join api_wallet w
-                on w.profile_id = p.id
-                join api_likehistory h
-                on p.id = h.profile_id
+                from api_likehistory h
                 join api_token t
                 on t.id = h.token_id
                 join api_contract c
                 on c.id = t.contract_id
-                where w.address = %s
+                where h.profile_id = %s
                 group by c.address, token_identifier
                 having likes > 0
                 order by max(added) desc
                 limit %s
-                """, (address, limit, ))
+                """, (profile_id, limit, ))
                 rows = cursor.fetchall()
-                
-                contract_list = []
-                token_list = []
-
-                for row in rows:
-                    contract_list.append(row[0])
-                    token_list.append(row[1])
 
             if rows:
-            
-                #print("Used liked tokens cache")
-                #return JsonResponse(opensea_json)
+                keys = [(row[0], row[1]) for row in rows]
+                assets_by_key, status_code = get_assets(keys)
 
-                # Query
-                url = "https://api.opensea.io/api/v1/assets"
-                querystring = {
-                    "order_direction":"desc",
-                    "offset":"0",
-                    "order_by": "sale_price",
-                    "token_ids": token_list,
-                    "asset_contract_addresses": contract_list,
-                    "limit":limit #Capped at 50
-                }
-                response = requests.request("GET", url, params=querystring)
-
-                if response.status_code!=200:
-                    status_code = response.status_code
+                if status_code!=200:
                     response_body = {
                         "error": {
                             "code": status_code,
@@ -954,31 +1162,20 @@ class LikedView(View):
                         }
                     }
                     return JsonResponse(response_body, status=status_code)
-                opensea_json = response.json().get('assets')
+                opensea_json = [assets_by_key[key] for key in keys if key in assets_by_key]
 
             else:
                 opensea_json = []
                 
 
             
-            cache.set(address+"_liked_tokens", opensea_json, None)
+            if not is_stale(opensea_json):
+                tags.set(address+"_liked_tokens", opensea_json, dependencies)
 
 
 
-        for asset in opensea_json:
-
-            # Add the "showtime" data to the original response
-            if asset.get('token_id') and asset.get('asset_contract') and asset['asset_contract'].get('address'):
-                like_count = list(LikeHistory.objects.filter(
-                    token__token_identifier=asset['token_id'],
-                    token__contract__address=asset['asset_contract']['address']
-                ).aggregate(Sum('value')).values())[0] or 0
-            else:
-                like_count = 0
-
-            asset['showtime'] = {
-                "like_count": like_count
-            }
+        # Add the "showtime" data to the original response
+        add_showtime_data(opensea_json)
 
         response_body = {
             "data": sorted(opensea_json, key = lambda i: i['showtime']['like_count'], reverse=True)
@@ -1094,12 +1291,23 @@ class CollectionView(View):
             limit = 50
 
 
-        if not collection or not bool(re.match(r"([a-z\-])+$", collection)):
+        if not collection or not bool(COLLECTION_RE.match(collection)):
             # set default
             collection = "superrare"
 
         
 
+        # OpenSea recently rejected this collection
+        status_code = negative.lookup(("collection", collection))
+        if status_code:
+            response_body = {
+                "error": {
+                    "code": status_code,
+                    "message": "Error from OpenSea API"
+                }
+            }
+            return JsonResponse(response_body, status=status_code)
+
         opensea_json = cache.get(collection+"_collection_"+order_by+"_"+order_direction)
 
         if opensea_json is None:
@@ -1108,7 +1316,6 @@ class CollectionView(View):
 
             # TBD - create the token list query
             # Query
-            url = "https://api.opensea.io/api/v1/assets"
             querystring = {
                 "order_direction":order_direction,
                 "offset":"0",
@@ -1117,85 +1324,31 @@ class CollectionView(View):
                 "offset": offset,
                 "limit":limit #Capped at 50
             }
-            response = requests.request("GET", url, params=querystring)
-
-            if response.status_code!=200:
-                status_code = response.status_code
-                response_body = {
-                    "error": {
-                        "code": status_code,
-                        "message": "Error from OpenSea API"
+            try:
+                opensea_json = opensea.list_assets(querystring, opensea.BULK)
+            except opensea.OpenSeaError as error:
+                negative.remember(("collection", collection), error.status_code)
+                # Fall back to the collection's stored assets
+                opensea_json = mark_stale(stored_assets(limit, collection_slug=collection))
+                if not opensea_json:
+                    status_code = error.status_code
+                    response_body = {
+                        "error": {
+                            "code": status_code,
+                            "message": "Error from OpenSea API"
+                        }
                     }
-                }
-                return JsonResponse(response_body, status=status_code)
-
+                    return JsonResponse(response_body, status=status_code)
 
-            opensea_json = response.json().get('assets')
-            cache.set(collection+"_collection_"+order_by+"_"+order_direction, opensea_json, None)
+            if not is_stale(opensea_json):
+                store_assets(opensea_json)
+                cache.set(collection+"_collection_"+order_by+"_"+order_direction, opensea_json, None)
         else:
             print("Used collection cache")
 
 
-        hidden_assets = [
-            {
-                "name": "CryptoFinally x Stanley J Collab #1",
-                "contract_address":"0xd07dc4262bcdbf85190c01c996b4c06a461d2430",
-                "token_id": "18359",
-                "link": "https://opensea.io/assets/0xd07dc4262bcdbf85190c01c996b4c06a461d2430/18359"
-            },
-            {
-                "name": "Cum Rag",
-                "contract_address":"0xd07dc4262bcdbf85190c01c996b4c06a461d2430",
-                "token_id": "18232",
-                "link": "https://opensea.io/assets/0xd07dc4262bcdbf85190c01c996b4c06a461d2430/18232"
-            },
-            {
-                "name": "Anjani",
-                "contract_address":"0x60f80121c31a0d46b5279700f9df786054aa5ee5",
-                "token_id": "7665",
-                "link": "https://opensea.io/assets/0x60f80121c31a0d46b5279700f9df786054aa5ee5/7665"
-            },
-            {
-                "name": "#01 The Joy of Bitcoin (Pink) [NSFW]",
-                "contract_address":"0xd07dc4262bcdbf85190c01c996b4c06a461d2430",
-                "token_id": "69135",
-                "link": "https://opensea.io/assets/0xd07dc4262bcdbf85190c01c996b4c06a461d2430/69135"
-            }
-        ]
-
-
-        def check_if_hidden(asset):
-            contract_address = asset['asset_contract']['address']
-            token_id = asset['token_id']
-
-            for ha in hidden_assets:
-                if ha['contract_address']==contract_address and ha['token_id']==token_id:
-                    return True
-
-            return False
-        
-        for asset in opensea_json:
-
-            
-            
-            hide_asset = False
-
-
-            # Add the "showtime" data to the original response
-            if asset.get('token_id') and asset.get('asset_contract') and asset['asset_contract'].get('address'):
-                like_count = list(LikeHistory.objects.filter(
-                    token__token_identifier=asset['token_id'],
-                    token__contract__address=asset['asset_contract']['address']
-                ).aggregate(Sum('value')).values())[0] or 0
-
-                hide_asset = check_if_hidden(asset)
-            else:
-                like_count = 0
-
-            asset['showtime'] = {
-                "like_count": like_count,
-                "hide": hide_asset
-            }
+        # Add the "showtime" data to the original response
+        add_showtime_data(opensea_json)
 
         response_body = {
             "data": sorted(opensea_json, key = lambda i: i['showtime']['like_count'], reverse=True)
@@ -1228,41 +1381,10 @@ class LeaderboardView(View):
             return JsonResponse(response_body, status=status_code)
 
 
-        response_body = cache.get("leaderboard")
-
-        if response_body:
-            print("Used leaderboard cache")
-            return JsonResponse(response_body)
-
-        top_creators = []
-        with connection.cursor() as cursor:
-            cursor.execute("""
-            select p.id, p.name, p.img_url, min(w.address) as 'address', sum(value) as 'likes', max(h.added) as 'last_like'
-            from api_likehistory h
-            join api_token t on t.id = h.token_id
-            join api_wallet w on w.id = t.creator_id
-            join api_profile p on p.id = w.profile_id
-            group by p.id, p.name, p.img_url
-            having likes > 0 
-            order by likes desc, name desc, last_like desc
-            
-            limit 10
-            """)
-            rows = cursor.fetchall()
-            for row in rows:
-                top_creators.append({
-                    "profile_id": row[0],
-                    "name": row[1],
-                    "image_url": row[2],
-                    "address": row[3],
-                    "like_count": row[4]
-                })
-
+        # Recomputed in the background at most every LEADERBOARD_REFRESH seconds
         response_body = {
-            "data": top_creators
+            "data": leaderboard.get()
         }
-
-        cache.set("leaderboard", response_body, None)
         return JsonResponse(response_body)
 
 
@@ -1305,7 +1427,7 @@ class ProfileView(View):
                     }
             return JsonResponse(response_body, status=status_code)
 
-        if not bool(re.match(r"0x([0-9a-zA-Z]{40})+$", public_address)):
+        if not bool(ADDRESS_RE.match(public_address)):
             # Return early with error message
             status_code = 400
             response_body = {
@@ -1318,28 +1440,26 @@ class ProfileView(View):
 
 
 
-        response_body = cache.get(str(public_address)+"_info")
+        response_body = tags.get(str(public_address)+"_info")
 
         if response_body:
             print("Used profile cache")
             return JsonResponse(response_body)
 
-        wallet = Wallet.objects.get_or_create(address=public_address)[0]
-        if not wallet.profile:
-            wallet.profile = Profile.objects.create()
-            wallet.save()
-
-        wallet_addresses = list(Wallet.objects.filter(profile=wallet.profile).values_list("address", flat=True))
+        profile_id = identity.profile_for(public_address)
+        dependencies = tags.depend_on([tags.address_tag(public_address), tags.profile_tag(profile_id)])
+        profile = Profile.objects.get(pk=profile_id)
+        wallet_addresses = list(identity.resolve(public_address).addresses)
         #print(wallet_addresses)
         response_body = {
                 "data": { 
-                    "name": wallet.profile.name if wallet.profile else None,
-                    "img_url": wallet.profile.img_url if wallet.profile else None,
+                    "name": profile.name,
+                    "img_url": profile.img_url,
                     "wallet_addresses": wallet_addresses,
                 }
             }
 
-        cache.set(str(public_address)+"_info", response_body, None)
+        tags.set(str(public_address)+"_info", response_body, dependencies)
         return JsonResponse(response_body)
 
 
@@ -1379,7 +1499,7 @@ class ContractView(View):
         # Check to see if it's a valid address format
         # example: "0xfa2c6c8599026583dbc274484e5a088880c8de8e"
 
-        if not bool(re.match(r"0x([0-9a-zA-Z]{40})+$", address)):
+        if not bool(ADDRESS_RE.match(address)):
             # Return early with error message
             status_code = 400
             response_body = {
@@ -1392,18 +1512,9 @@ class ContractView(View):
 
 
 
-        # Continue with query
-        url = "https://api.opensea.io/api/v1/assets"
-        querystring = {
-            "asset_contract_address":address,
-            "order_direction":"desc",
-            "offset":"0",
-            "limit":"20" #Capped at 50
-        }
-        response = requests.request("GET", url, params=querystring)
-
-        if response.status_code!=200:
-            status_code = response.status_code
+        # OpenSea recently rejected this contract
+        status_code = negative.lookup(("contract", address))
+        if status_code:
             response_body = {
                 "error": {
                     "code": status_code,
@@ -1412,22 +1523,34 @@ class ContractView(View):
             }
             return JsonResponse(response_body, status=status_code)
 
-        opensea_json = response.json().get('assets')
-
-        for asset in opensea_json:
+        # Continue with query
+        querystring = {
+            "asset_contract_address":address,
+            "order_direction":"desc",
+            "offset":"0",
+            "limit":"20" #Capped at 50
+        }
+        try:
+            opensea_json = opensea.list_assets(querystring, opensea.INTERACTIVE)
+        except opensea.OpenSeaError as error:
+            negative.remember(("contract", address), error.status_code)
+            # Fall back to the contract's stored assets
+            opensea_json = mark_stale(stored_assets(20, token__contract__address=address.lower()))
+            if not opensea_json:
+                status_code = error.status_code
+                response_body = {
+                    "error": {
+                        "code": status_code,
+                        "message": "Error from OpenSea API"
+                    }
+                }
+                return JsonResponse(response_body, status=status_code)
 
-            # Add the "showtime" data to the original response
-            if asset.get('token_id') and asset.get('asset_contract') and asset['asset_contract'].get('address'):
-                like_count = list(LikeHistory.objects.filter(
-                    token__token_identifier=asset['token_id'],
-                    token__contract__address=asset['asset_contract']['address']
-                ).aggregate(Sum('value')).values())[0] or 0
-            else:
-                like_count = 0
+        if not is_stale(opensea_json):
+            store_assets(opensea_json)
 
-            asset['showtime'] = {
-                "like_count": like_count
-            }
+        # Add the "showtime" data to the original response
+        add_showtime_data(opensea_json)
 
 
         response_body = {
@@ -1438,6 +1561,33 @@ class ContractView(View):
         }
         return JsonResponse(response_body)
 
+@method_decorator(csrf_exempt, name='dispatch')
+class MetricsView(View):
+    '''
+    Returns this instance's metrics (OpenSea queue depth, waits, throttling)
+    '''
+
+    def get(self, request):
+        '''
+        Params: none
+        '''
+
+        if not valid_api_key(request.headers.get('X-API-Key')):
+            status_code = 401
+            response_body = {
+                        "error": {
+                            "code": status_code,
+                            "message": "Unauthorized"
+                        }
+                    }
+            return JsonResponse(response_body, status=status_code)
+
+        response_body = {
+            "data": metrics.snapshot()
+        }
+        return JsonResponse(response_body)
+
+
 @method_decorator(csrf_exempt, name='dispatch')
 class UserAddView(View):
     '''
@@ -1452,6 +1602,16 @@ class UserAddView(View):
         3. twitter (optional - in json body)
         '''
 
+        if not valid_api_key(request.headers.get('X-API-Key')):
+            status_code = 401
+            response_body = {
+                        "error": {
+                            "code": status_code,
+                            "message": "Unauthorized"
+                        }
+                    }
+            return JsonResponse(response_body, status=status_code)
+
         json_body = json.loads(request.body.decode())
         address = json_body.get('address')
         if address and address.strip()=="":
@@ -1479,7 +1639,7 @@ class UserAddView(View):
         # Check to see if it's a valid address format
         # example: "0x0000000000001b84b1cb32787b0d64758d019317"
 
-        if not bool(re.match(r"0x([0-9a-zA-Z]{40})+$", address)):
+        if not bool(ADDRESS_RE.match(address)):
             # Return early with error message
             status_code = 400
             response_body = {
@@ -1490,10 +1650,72 @@ class UserAddView(View):
                     }
             return JsonResponse(response_body, status=status_code)
 
-        profile = Profile.objects.get_or_create(address=address)[0]
-        profile.name = name
-        profile.twitter = twitter
-        profile.save()
+        # Profiles are found through their wallets, which are created if needed
+        _, profile_ids = ingest.ingest_chunk([{"address": address, "name": name, "twitter": twitter}])
+        profiles_changed(profile_ids)
 
         # Return empty 200
         return HttpResponse("")
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class ProfileIngestView(View):
+    '''
+    Endpoint for the scraper to load creators in bulk, see api/ingest.py
+    '''
+
+    def post(self, request):
+        '''
+        Body: NDJSON, one {"address", "name", "twitter", "img_url"} record per line
+        Returns a summary of each chunk, with the lines that were rejected
+        '''
+
+        if not valid_api_key(request.headers.get('X-API-Key')):
+            status_code = 401
+            response_body = {
+                        "error": {
+                            "code": status_code,
+                            "message": "Unauthorized"
+                        }
+                    }
+            return JsonResponse(response_body, status=status_code)
+
+        chunks = []
+        records = []
+        rejected = []
+        first_line = 1
+
+        def flush(last_line):
+            summary = {"first_line": first_line, "last_line": last_line, "records": len(records)}
+            if records:
+                counts, profile_ids = ingest.ingest_chunk(records)
+                profiles_changed(profile_ids)
+                summary.update(counts)
+            summary["rejected"] = list(rejected)
+            chunks.append(summary)
+            # Held to a budget per chunk rather than per request
+            request.query_budget = settings.QUERY_BUDGET + len(chunks) * ingest.CHUNK_QUERY_BUDGET
+
+        # Read line by line as the body arrives, not loaded whole
+        line_number = 0
+        for line_number, line in enumerate(request, 1):
+            if line.strip():
+                try:
+                    records.append(ingest.parse_record(line))
+                except ValueError as error:
+                    rejected.append({"line": line_number, "error": str(error)})
+            if line_number - first_line + 1 == ingest.CHUNK_SIZE:
+                flush(line_number)
+                records, rejected, first_line = [], [], line_number + 1
+
+        if line_number >= first_line:
+            flush(line_number)
+
+        response_body = {
+            "data": {
+                "chunks": chunks,
+                "records": sum(chunk["records"] for chunk in chunks),
+                "rejected": sum(len(chunk["rejected"]) for chunk in chunks),
+            }
+        }
+        return JsonResponse(response_body)
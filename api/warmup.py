@@ -0,0 +1,52 @@
+'''
+Instance warmup for App Engine's /_ah/warmup
+
+With `inbound_services: warmup` in app.yaml, App Engine sends /_ah/warmup
+to a new instance before it gets any traffic. warm_up() does the work the
+first real request would otherwise pay for: importing the URL conf and with
+it every view module, compiling the URL patterns, connecting to the
+database and loading the in-process indexes.
+
+`python manage.py import_report` lists the imports that cost the most.
+'''
+
+import time
+
+from django.db import connection
+from django.urls import URLResolver, get_resolver
+
+from . import autocomplete, metrics, moderation
+
+
+def compile_patterns(patterns):
+    # Django compiles each URL pattern's regex the first time it is matched
+    for pattern in patterns:
+        pattern.pattern.regex
+        if isinstance(pattern, URLResolver):
+            compile_patterns(pattern.url_patterns)
+
+
+def connect():
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1")
+
+
+STEPS = [
+    ("urls", lambda: compile_patterns(get_resolver().url_patterns)),
+    ("database", connect),
+    ("hidden_assets", moderation.hidden_assets),
+    ("autocomplete", autocomplete.load),
+]
+
+
+def warm_up():
+    '''
+    Runs each warmup step and returns {step: seconds taken}
+    '''
+    timings = {}
+    for name, step in STEPS:
+        started = time.monotonic()
+        step()
+        timings[name] = round(time.monotonic() - started, 3)
+        metrics.set_gauge("warmup_seconds", timings[name], step=name)
+    return timings
@@ -0,0 +1,45 @@
+'''
+Settings overlay used by the benchmark harness
+
+Loaded as DJANGO_SETTINGS_MODULE=bench_settings with the bench/ directory on
+PYTHONPATH, so it can be applied to any checkout of the backend.
+
+    BENCH_DB=sqlite  (default) BENCH_SQLITE_PATH=/tmp/bench.sqlite3
+    BENCH_DB=mysql   BENCH_MYSQL_HOST, BENCH_MYSQL_PORT, BENCH_MYSQL_NAME,
+                     BENCH_MYSQL_USER, BENCH_MYSQL_PASSWORD
+'''
+
+import importlib.util
+import os
+
+from stbackend.settings import *  # noqa: F401,F403
+
+# Older checkouts being compared have neither the pooled backends nor DB_CONN_MAX_AGE
+BACKENDS = 'stbackend.db_backends' if importlib.util.find_spec('stbackend.db_backends') else 'django.db.backends'
+
+DEBUG = False
+ALLOWED_HOSTS = ['*']
+
+SHOWTIME_FRONTEND_API_KEY = os.getenv('SHOWTIME_FRONTEND_API_KEY', 'bench-key')
+OPENSEA_API_URL = os.getenv('OPENSEA_API_URL', 'http://127.0.0.1:9010/api/v1')
+
+if os.getenv('BENCH_DB', 'sqlite') == 'mysql':
+    DATABASES = {
+        'default': {
+            'ENGINE': BACKENDS + '.mysql',
+            'HOST': os.getenv('BENCH_MYSQL_HOST', '127.0.0.1'),
+            'PORT': os.getenv('BENCH_MYSQL_PORT', '3306'),
+            'NAME': os.getenv('BENCH_MYSQL_NAME', 'stbackend_bench'),
+            'USER': os.getenv('BENCH_MYSQL_USER', 'root'),
+            'PASSWORD': os.getenv('BENCH_MYSQL_PASSWORD', ''),
+            'OPTIONS': {'charset': 'utf8mb4'},
+            'CONN_MAX_AGE': globals().get('DB_CONN_MAX_AGE', 0),
+        }
+    }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': BACKENDS + '.sqlite3',
+            'NAME': os.getenv('BENCH_SQLITE_PATH', '/tmp/stbackend_bench.sqlite3'),
+        }
+    }
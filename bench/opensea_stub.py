@@ -0,0 +1,263 @@
+'''
+Local stand-in for the OpenSea API
+
+Serves deterministic fake assets for the two endpoints the backend uses:
+
+    GET /api/v1/asset/<contract>/<token_id>
+    GET /api/v1/assets?owner=...|collection=...|asset_contract_address=...|token_ids=...
+
+Latency and error rates are configurable so the backend can be exercised
+against a slow or flaky upstream. Call counts per endpoint are available
+from GET /__stats (and on the OpenSeaStub object when used in-process).
+
+Run standalone:
+
+    python bench/opensea_stub.py --port 9010 --latency-ms 120 --error-rate 0.01
+'''
+
+import argparse
+import hashlib
+import json
+import random
+import threading
+import time
+import urllib.parse
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def _digest(*parts):
+    return hashlib.sha1(":".join(str(p) for p in parts).encode()).hexdigest()
+
+
+def _address(*parts):
+    return "0x" + _digest(*parts)[:40]
+
+
+def make_asset(contract, token_id):
+    '''
+    Builds a fake asset in the shape OpenSea returns. The same
+    (contract, token_id) always produces the same asset.
+    '''
+    contract = contract.lower()
+    token_id = str(token_id)
+    collection_slug = "stub-collection-" + _digest(contract)[:4]
+    creator = _address("creator", contract, int(_digest(contract, token_id), 16) % 97)
+    owner = _address("owner", contract, token_id)
+
+    return {
+        "id": int(_digest(contract, token_id)[:8], 16),
+        "token_id": token_id,
+        "name": "Stub Token " + token_id,
+        "description": "Synthetic asset " + token_id + " from " + contract,
+        "image_url": "https://stub.invalid/" + contract + "/" + token_id + ".png",
+        "image_preview_url": "https://stub.invalid/" + contract + "/" + token_id + "_preview.png",
+        "image_thumbnail_url": "https://stub.invalid/" + contract + "/" + token_id + "_thumb.png",
+        "image_original_url": None,
+        "animation_url": None,
+        "external_link": None,
+        "permalink": "https://opensea.io/assets/" + contract + "/" + token_id,
+        "asset_contract": {
+            "address": contract,
+            "name": "Stub Contract " + contract[:8],
+            "schema_name": "ERC721",
+        },
+        "collection": {
+            "slug": collection_slug,
+            "name": collection_slug.replace("-", " ").title(),
+        },
+        "creator": {
+            "address": creator,
+            "user": {"username": "creator_" + creator[2:8]},
+            "profile_img_url": "https://stub.invalid/" + creator + ".png",
+        },
+        "owner": {
+            "address": owner,
+            "user": {"username": "owner_" + owner[2:8]},
+        },
+        "traits": [],
+        "last_sale": None,
+    }
+
+
+def _listing(seed, offset, limit):
+    '''
+    Builds a page of assets for queries that do not name specific tokens
+    (owner, collection, contract)
+    '''
+    assets = []
+    for i in range(offset, offset + limit):
+        contract = _address("contract", seed, i % 7)
+        token_id = str(int(_digest(seed, i)[:10], 16))
+        assets.append(make_asset(contract, token_id))
+    return assets
+
+
+def _as_int(value, default):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return default
+
+
+class OpenSeaStub:
+    '''
+    In-process OpenSea stand-in. start() binds to a free port if none is
+    given and serves from a daemon thread; stop() shuts it down.
+    '''
+
+    def __init__(self, host="127.0.0.1", port=0, latency_ms=0, jitter_ms=0,
+                 error_rate=0.0, throttle_rate=0.0, max_assets=50, seed=0):
+        self.host = host
+        self.port = port
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        # Upper bound on list sizes, whatever limit the caller asks for
+        self.max_assets = max_assets
+        # Token ids, owners, collections and contracts OpenSea doesn't know:
+        # left out of token lookups, 400 for lists
+        self.missing = set()
+        self.calls = Counter()
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+
+    @property
+    def url(self):
+        return "http://{}:{}/api/v1".format(self.host, self.port)
+
+    def reset(self):
+        with self._lock:
+            self.calls.clear()
+
+    def start(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                stub._handle(self)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _roll(self):
+        with self._lock:
+            delay = self.latency_ms + (self._random.uniform(0, self.jitter_ms) if self.jitter_ms else 0)
+            outcome = self._random.random()
+        return delay, outcome
+
+    def _handle(self, handler):
+        parsed = urllib.parse.urlparse(handler.path)
+        params = urllib.parse.parse_qs(parsed.query)
+        path = parsed.path
+
+        if path == "/__stats":
+            with self._lock:
+                return self._send(handler, 200, dict(self.calls))
+        if path == "/__reset":
+            self.reset()
+            return self._send(handler, 200, {})
+
+        parts = [p for p in path.split("/") if p]
+        if parts[:2] != ["api", "v1"] or len(parts) < 3:
+            return self._send(handler, 404, {"detail": "Not found."})
+
+        endpoint = parts[2]
+        with self._lock:
+            self.calls[endpoint] += 1
+
+        delay, outcome = self._roll()
+        if delay:
+            time.sleep(delay / 1000.0)
+        if outcome < self.throttle_rate:
+            return self._send(handler, 429, {"detail": "Request was throttled."})
+        if outcome < self.throttle_rate + self.error_rate:
+            return self._send(handler, 500, {"detail": "Stub error"})
+
+        if endpoint == "asset" and len(parts) == 5:
+            return self._send(handler, 200, make_asset(parts[3], parts[4]))
+        if endpoint == "assets":
+            if any(value.lower() in self.missing for key in ("owner", "collection", "asset_contract_address")
+                   for value in params.get(key, [])):
+                return self._send(handler, 400, {"detail": "Invalid parameters."})
+            return self._send(handler, 200, {"assets": self._assets(params)})
+        return self._send(handler, 404, {"detail": "Not found."})
+
+    def _assets(self, params):
+        limit = min(_as_int(params.get("limit", [50])[0], 50), self.max_assets)
+        offset = _as_int(params.get("offset", [0])[0], 0)
+
+        token_ids = params.get("token_ids", [])
+        if token_ids:
+            contracts = params.get("asset_contract_addresses") or params.get("asset_contract_address") or []
+            assets = []
+            for i, token_id in enumerate(token_ids[:limit]):
+                if not contracts:
+                    break
+                if token_id in self.missing:
+                    continue
+                contract = contracts[i] if len(contracts) == len(token_ids) else contracts[0]
+                assets.append(make_asset(contract, token_id))
+            return assets
+
+        for key in ("owner", "collection", "asset_contract_address"):
+            if params.get(key):
+                return _listing(key + ":" + params[key][0].lower(), offset, limit)
+        return _listing("all", offset, limit)
+
+    @staticmethod
+    def _send(handler, status, body):
+        payload = json.dumps(body).encode()
+        handler.send_response(status)
+        handler.send_header("Content-Type", "application/json")
+        handler.send_header("Content-Length", str(len(payload)))
+        handler.end_headers()
+        handler.wfile.write(payload)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local OpenSea API stand-in")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9010)
+    parser.add_argument("--latency-ms", type=float, default=0)
+    parser.add_argument("--jitter-ms", type=float, default=0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    stub = OpenSeaStub(host=args.host, port=args.port, latency_ms=args.latency_ms,
+                       jitter_ms=args.jitter_ms, error_rate=args.error_rate,
+                       throttle_rate=args.throttle_rate, seed=args.seed).start()
+    print("OpenSea stub listening on " + stub.url)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        stub.stop()
+
+
+if __name__ == "__main__":
+    main()
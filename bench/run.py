@@ -0,0 +1,362 @@
+'''
+Benchmark harness
+
+Starts the backend against a freshly seeded database and a local OpenSea
+stub, drives a weighted mix of realistic requests and prints per-endpoint
+throughput and latency percentiles as JSON.
+
+    python -m bench.run --duration 30 --concurrency 8 --latency-ms 120
+    python -m bench.run --compare main HEAD --output compare.json
+
+With --compare each revision is checked out into a temporary git worktree
+and benchmarked with identical settings, seed and workload. Only revisions
+that read OPENSEA_API_URL from settings can be benchmarked; older ones talk
+to the real OpenSea API.
+'''
+
+import argparse
+import json
+import math
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+
+import requests
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+if REPO_DIR not in sys.path:
+    sys.path.insert(0, REPO_DIR)
+
+from bench.opensea_stub import OpenSeaStub  # noqa: E402
+
+API_KEY = "bench-key"
+
+# Relative weight of each endpoint in the default traffic mix
+DEFAULT_MIX = {
+    "token": 40,
+    "like": 8,
+    "featured": 12,
+    "collection": 10,
+    "owned": 8,
+    "liked": 8,
+    "leaderboard": 8,
+    "mylikes": 4,
+    "profile": 2,
+    # Newer endpoints, off by default so --compare against older revisions still works
+    "has_liked": 0,
+    "tokens": 0,
+}
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    # Nearest-rank percentile
+    rank = max(0, min(len(sorted_values) - 1, int(math.ceil(pct / 100.0 * len(sorted_values))) - 1))
+    return sorted_values[rank]
+
+
+def parse_mix(value):
+    mix = dict(DEFAULT_MIX)
+    if value:
+        for part in value.split(","):
+            name, _, weight = part.partition("=")
+            if name not in DEFAULT_MIX:
+                raise argparse.ArgumentTypeError("Unknown endpoint in mix: " + name)
+            mix[name] = float(weight)
+    return {name: weight for name, weight in mix.items() if weight > 0}
+
+
+class Workload:
+    '''
+    Turns the seeded workload description into concrete requests
+    '''
+
+    def __init__(self, data, rng):
+        self.addresses = data["addresses"]
+        self.tokens = data["tokens"]
+        self.collections = data["collections"]
+        self.rng = rng
+        # Token detail traffic is heavily skewed towards popular tokens
+        total = 0.0
+        self.token_cum_weights = []
+        for rank in range(len(self.tokens)):
+            total += 1.0 / (rank + 1)
+            self.token_cum_weights.append(total)
+
+    def token(self):
+        return self.rng.choices(self.tokens, cum_weights=self.token_cum_weights)[0]
+
+    def address(self):
+        return self.rng.choice(self.addresses)
+
+    def request(self, endpoint):
+        '''Returns (method, path, headers, body)'''
+        if endpoint == "token":
+            contract, token_id = self.token()
+            return "GET", "/api/v1/token/{}/{}".format(contract, token_id), {}, None
+        if endpoint == "like":
+            contract, token_id = self.token()
+            action = "like" if self.rng.random() < 0.8 else "unlike"
+            return ("POST", "/api/v1/token/{}/{}".format(contract, token_id),
+                    {"UserAddress": self.address()}, json.dumps({"action": action}))
+        if endpoint == "featured":
+            return "GET", "/api/v1/featured", {}, None
+        if endpoint == "collection":
+            return "GET", "/api/v1/collection?collection=" + self.rng.choice(self.collections), {}, None
+        if endpoint == "owned":
+            return "GET", "/api/v1/owned?address=" + self.address(), {}, None
+        if endpoint == "liked":
+            return "GET", "/api/v1/liked?address=" + self.address(), {}, None
+        if endpoint == "leaderboard":
+            return "GET", "/api/v1/leaderboard", {}, None
+        if endpoint == "mylikes":
+            return "GET", "/api/v1/mylikes?address=" + self.address(), {}, None
+        if endpoint == "profile":
+            return "GET", "/api/v1/profile?address=" + self.address(), {}, None
+        if endpoint == "has_liked":
+            tokens = ",".join("{}:{}".format(*self.token()) for i in range(20))
+            return "GET", "/api/v1/has_liked?address={}&tokens={}".format(self.address(), tokens), {}, None
+        if endpoint == "tokens":
+            tokens = ",".join("{}:{}".format(*self.token()) for i in range(20))
+            return "GET", "/api/v1/tokens?tokens={}".format(tokens), {}, None
+        raise ValueError(endpoint)
+
+
+def drive(base_url, workload_data, mix, duration, concurrency, max_requests, seed):
+    '''
+    Sends weighted random requests from `concurrency` threads until the
+    duration or request cap is reached. Returns per-endpoint latencies.
+    '''
+    names = list(mix)
+    weights = [mix[n] for n in names]
+    latencies = defaultdict(list)
+    errors = defaultdict(int)
+    lock = threading.Lock()
+    sent = [0]
+    deadline = time.perf_counter() + duration
+
+    def worker(worker_id):
+        rng = random.Random(seed * 1000 + worker_id)
+        workload = Workload(workload_data, rng)
+        session = requests.Session()
+        session.headers["X-API-Key"] = API_KEY
+        while time.perf_counter() < deadline:
+            with lock:
+                if max_requests and sent[0] >= max_requests:
+                    return
+                sent[0] += 1
+            endpoint = rng.choices(names, weights=weights)[0]
+            method, path, headers, body = workload.request(endpoint)
+            started = time.perf_counter()
+            try:
+                response = session.request(method, base_url + path, headers=headers, data=body, timeout=60)
+                ok = response.status_code < 400
+            except requests.RequestException:
+                ok = False
+            elapsed = (time.perf_counter() - started) * 1000.0
+            with lock:
+                latencies[endpoint].append(elapsed)
+                if not ok:
+                    errors[endpoint] += 1
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return latencies, errors, time.perf_counter() - started
+
+
+def summarize(latencies, errors, elapsed):
+    endpoints = {}
+    total = 0
+    for endpoint, values in sorted(latencies.items()):
+        values.sort()
+        total += len(values)
+        endpoints[endpoint] = {
+            "requests": len(values),
+            "errors": errors.get(endpoint, 0),
+            "throughput_rps": round(len(values) / elapsed, 2),
+            "mean_ms": round(sum(values) / len(values), 2),
+            "p50_ms": round(_percentile(values, 50), 2),
+            "p95_ms": round(_percentile(values, 95), 2),
+            "p99_ms": round(_percentile(values, 99), 2),
+        }
+    return {
+        "elapsed_s": round(elapsed, 2),
+        "total_requests": total,
+        "throughput_rps": round(total / elapsed, 2) if elapsed else 0,
+        "endpoints": endpoints,
+    }
+
+
+def _wait_until_up(base_url, process, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("Backend exited during startup with code %s" % process.returncode)
+        try:
+            requests.get(base_url + "/api/", timeout=1)
+            return
+        except requests.RequestException:
+            time.sleep(0.2)
+    raise RuntimeError("Backend did not start within %ss" % timeout)
+
+
+def run_tree(tree, args, workdir):
+    '''
+    Benchmarks the checkout at `tree`. Returns the summary dict.
+    '''
+    python = args.python or sys.executable
+    env = dict(os.environ)
+    env.update({
+        "DJANGO_SETTINGS_MODULE": "bench_settings",
+        "PYTHONPATH": os.pathsep.join([BENCH_DIR, tree]),
+        "SHOWTIME_FRONTEND_API_KEY": API_KEY,
+        "BENCH_DB": args.db,
+        "BENCH_SQLITE_PATH": os.path.join(workdir, "bench.sqlite3"),
+        # One runserver process serves every request
+        "LIVE_BACKEND": "local",
+    })
+
+    stub = OpenSeaStub(latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+                       error_rate=args.error_rate, throttle_rate=args.throttle_rate,
+                       seed=args.seed).start()
+    env["OPENSEA_API_URL"] = stub.url
+
+    quiet = {"stdout": subprocess.DEVNULL, "stderr": subprocess.DEVNULL} if not args.verbose else {}
+    server = None
+    try:
+        if args.db == "mysql":
+            subprocess.run([python, "manage.py", "flush", "--noinput"], cwd=tree, env=env, check=False, **quiet)
+        subprocess.run([python, "manage.py", "migrate", "--noinput"], cwd=tree, env=env, check=True, **quiet)
+
+        workload_path = os.path.join(workdir, "workload.json")
+        subprocess.run([python, os.path.join(BENCH_DIR, "seed.py"), "--seed", str(args.seed),
+                        "--profiles", str(args.profiles), "--tokens", str(args.tokens),
+                        "--likes", str(args.likes), "--out", workload_path],
+                       cwd=tree, env=env, check=True)
+        with open(workload_path) as f:
+            workload_data = json.load(f)
+
+        port = _free_port()
+        base_url = "http://127.0.0.1:%d" % port
+        server = subprocess.Popen([python, "manage.py", "runserver", "127.0.0.1:%d" % port, "--noreload"],
+                                  cwd=tree, env=env, **quiet)
+        _wait_until_up(base_url, server)
+
+        mix = parse_mix(args.mix)
+        if args.warmup:
+            drive(base_url, workload_data, mix, args.warmup, args.concurrency, 0, args.seed + 1)
+        stub.reset()
+
+        latencies, errors, elapsed = drive(base_url, workload_data, mix, args.duration,
+                                           args.concurrency, args.requests, args.seed)
+        summary = summarize(latencies, errors, elapsed)
+        summary["upstream_calls"] = dict(stub.calls)
+        return summary
+    finally:
+        if server:
+            server.terminate()
+            server.wait()
+        stub.stop()
+
+
+def _git(*cmd):
+    return subprocess.run(["git"] + list(cmd), cwd=REPO_DIR, check=True,
+                          stdout=subprocess.PIPE, universal_newlines=True).stdout.strip()
+
+
+def run_revision(rev, args):
+    sha = _git("rev-parse", rev)
+    workdir = tempfile.mkdtemp(prefix="stbench-")
+    tree = os.path.join(workdir, "tree")
+    _git("worktree", "add", "--detach", tree, sha)
+    try:
+        result = run_tree(tree, args, workdir)
+    finally:
+        _git("worktree", "remove", "--force", tree)
+        shutil.rmtree(workdir, ignore_errors=True)
+    result["revision"] = sha
+    return result
+
+
+def compare(base, head):
+    '''Percent change of each latency/throughput figure from base to head'''
+    delta = {}
+    for endpoint, head_stats in head["endpoints"].items():
+        base_stats = base["endpoints"].get(endpoint)
+        if not base_stats:
+            continue
+        delta[endpoint] = {}
+        for key in ("throughput_rps", "p50_ms", "p95_ms", "p99_ms"):
+            if base_stats[key]:
+                delta[endpoint][key + "_change_pct"] = round(
+                    (head_stats[key] - base_stats[key]) / base_stats[key] * 100.0, 1)
+    return delta
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the backend against a local OpenSea stub")
+    parser.add_argument("--duration", type=float, default=30, help="seconds of measured traffic")
+    parser.add_argument("--warmup", type=float, default=3, help="seconds of unmeasured traffic first")
+    parser.add_argument("--requests", type=int, default=0, help="stop after this many requests (0 = no cap)")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--mix", help="endpoint weights, e.g. token=50,like=10,featured=0")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--profiles", type=int, default=500)
+    parser.add_argument("--tokens", type=int, default=2000)
+    parser.add_argument("--likes", type=int, default=20000)
+    parser.add_argument("--db", choices=["sqlite", "mysql"], default="sqlite")
+    parser.add_argument("--latency-ms", type=float, default=100, help="stub OpenSea base latency")
+    parser.add_argument("--jitter-ms", type=float, default=50, help="stub OpenSea random extra latency")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of stub responses that are 500s")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="fraction of stub responses that are 429s")
+    parser.add_argument("--compare", nargs=2, metavar=("BASE", "HEAD"), help="benchmark two git revisions")
+    parser.add_argument("--python", help="interpreter used to run the backend")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    parser.add_argument("--verbose", action="store_true", help="show backend output")
+    args = parser.parse_args()
+
+    if args.compare:
+        base = run_revision(args.compare[0], args)
+        head = run_revision(args.compare[1], args)
+        report = {
+            "base": base,
+            "head": head,
+            "delta": compare(base, head),
+        }
+    else:
+        workdir = tempfile.mkdtemp(prefix="stbench-")
+        try:
+            report = run_tree(REPO_DIR, args, workdir)
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    report["config"] = {k: v for k, v in vars(args).items() if k not in ("output", "verbose", "python")}
+    output = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
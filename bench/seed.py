@@ -0,0 +1,97 @@
+'''
+Seeds a benchmark database and writes the workload description
+
+Run from the root of the checkout being benchmarked, with
+DJANGO_SETTINGS_MODULE pointing at bench_settings:
+
+    python /path/to/bench/seed.py --seed 1 --out workload.json
+
+The workload file lists the wallet addresses, tokens and collections the
+load generator should draw requests from.
+'''
+
+import argparse
+import json
+import os
+import random
+import sys
+
+
+def _address(rng):
+    return "0x%040x" % rng.getrandbits(160)
+
+
+def seed(profiles, tokens, likes, rng):
+    from django.db import transaction
+    from django.utils import timezone
+
+    from api.models import Contract, LikeHistory, Profile, Token, Wallet
+
+    with transaction.atomic():
+        LikeHistory.objects.all().delete()
+        Token.objects.all().delete()
+        Contract.objects.all().delete()
+        Wallet.objects.all().delete()
+        Profile.objects.all().delete()
+
+        Profile.objects.bulk_create([Profile(id=i + 1, name="Bench User %d" % i) for i in range(profiles)])
+
+        # Every profile gets one wallet, every fifth profile gets a second one
+        wallets = []
+        for i in range(profiles):
+            wallets.append(Wallet(address=_address(rng), profile_id=i + 1, last_authenticated=timezone.now()))
+            if i % 5 == 0:
+                wallets.append(Wallet(address=_address(rng), profile_id=i + 1))
+        for i, wallet in enumerate(wallets):
+            wallet.id = i + 1
+        Wallet.objects.bulk_create(wallets)
+
+        contracts = [Contract(id=i + 1, address=_address(rng)) for i in range(max(1, tokens // 50))]
+        Contract.objects.bulk_create(contracts)
+
+        token_rows = []
+        for i in range(tokens):
+            token_rows.append(Token(
+                id=i + 1,
+                contract_id=contracts[i % len(contracts)].id,
+                token_identifier=str(rng.randrange(1, 10 ** 12)),
+                creator_id=rng.randrange(1, len(wallets) + 1),
+            ))
+        Token.objects.bulk_create(token_rows)
+
+        # Popular tokens get most of the likes
+        weights = [1.0 / (rank + 1) for rank in range(tokens)]
+        history = []
+        for token_id in rng.choices(range(1, tokens + 1), weights=weights, k=likes):
+            history.append(LikeHistory(token_id=token_id, profile_id=rng.randrange(1, profiles + 1), value=1))
+        LikeHistory.objects.bulk_create(history, batch_size=500)
+
+    contract_addresses = {c.id: c.address for c in contracts}
+    return {
+        "addresses": [w.address for w in wallets],
+        "tokens": [[contract_addresses[t.contract_id], t.token_identifier] for t in token_rows],
+        "collections": ["superrare", "async-art", "rarible", "makersplace", "known-origin"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Seed the benchmark database")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--profiles", type=int, default=500)
+    parser.add_argument("--tokens", type=int, default=2000)
+    parser.add_argument("--likes", type=int, default=20000)
+    parser.add_argument("--out", required=True)
+    args = parser.parse_args()
+
+    sys.path.insert(0, os.getcwd())
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "bench_settings")
+    import django
+    django.setup()
+
+    workload = seed(args.profiles, args.tokens, args.likes, random.Random(args.seed))
+    with open(args.out, "w") as f:
+        json.dump(workload, f)
+
+
+if __name__ == "__main__":
+    main()
@@ -13,4 +13,18 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'stbackend.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Imported once Django is set up
+from api import live  # noqa: E402
+
+# Long-lived streams that Django's request/response cycle can't serve
+STREAMS = {
+    '/api/v1/live': live.app,
+}
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'http' and scope['path'] in STREAMS:
+        return await STREAMS[scope['path']](scope, receive, send)
+    return await django_application(scope, receive, send)
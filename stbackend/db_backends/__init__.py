@@ -0,0 +1,99 @@
+'''
+Database backends with connection health checks, a per-process connection
+limit and connection metrics
+
+Use 'stbackend.db_backends.mysql' or 'stbackend.db_backends.sqlite3' as the
+ENGINE. They are Django's own backends plus ConnectionPoolMixin.
+'''
+
+import threading
+import time
+import weakref
+
+from django.conf import settings
+from django.db import OperationalError
+
+from api import metrics
+
+_lock = threading.Lock()
+_pools = {}
+_open = {}
+
+
+def pool(alias):
+    with _lock:
+        if alias not in _pools:
+            _pools[alias] = threading.BoundedSemaphore(settings.DB_POOL_SIZE)
+            _open[alias] = 0
+        return _pools[alias]
+
+
+def _count(alias, change):
+    with _lock:
+        _open[alias] += change
+        metrics.set_gauge("db_connections_open", _open[alias], alias=alias)
+
+
+class ConnectionPoolMixin:
+    '''
+    Django keeps one connection per thread, and with CONN_MAX_AGE reuses it
+    across requests. This adds:
+
+    - A health check before a kept connection is first used in a request,
+      so a connection the server dropped while idle is replaced instead of
+      failing the request (like CONN_HEALTH_CHECKS in later Django).
+    - A limit of DB_POOL_SIZE open connections per alias in this process.
+      Opening one more waits up to DB_POOL_TIMEOUT seconds for another
+      thread's connection to close, then fails.
+    - Metrics for connection setup time and connections opened, open,
+      replaced and refused.
+    '''
+
+    health_check_needed = False
+    _release = None
+
+    def get_new_connection(self, conn_params):
+        if not pool(self.alias).acquire(timeout=settings.DB_POOL_TIMEOUT):
+            metrics.incr("db_pool_exhausted", alias=self.alias)
+            raise OperationalError("No free %r database connection after %ss" % (self.alias, settings.DB_POOL_TIMEOUT))
+
+        started = time.monotonic()
+        try:
+            connection = super().get_new_connection(conn_params)
+        except Exception:
+            pool(self.alias).release()
+            raise
+
+        metrics.observe("db_connect_seconds", time.monotonic() - started, alias=self.alias)
+        metrics.incr("db_connections_opened", alias=self.alias)
+        _count(self.alias, 1)
+        # Also frees the slot if the thread holding this wrapper goes away
+        # without closing it
+        self._release = weakref.finalize(self, _release_slot, self.alias)
+        return connection
+
+    def _close(self):
+        try:
+            super()._close()
+        finally:
+            if self._release is not None:
+                self._release()
+                self._release = None
+
+    def close_if_unusable_or_obsolete(self):
+        # Runs at the start and end of every request
+        super().close_if_unusable_or_obsolete()
+        self.health_check_needed = self.connection is not None
+
+    def ensure_connection(self):
+        if self.health_check_needed and self.connection is not None and not self.in_atomic_block:
+            self.health_check_needed = False
+            if not self.is_usable():
+                metrics.incr("db_connections_unusable", alias=self.alias)
+                self.close()
+        super().ensure_connection()
+
+
+def _release_slot(alias):
+    pool(alias).release()
+    _count(alias, -1)
@@ -0,0 +1,7 @@
+from django.db.backends.mysql import base
+
+from stbackend.db_backends import ConnectionPoolMixin
+
+
+class DatabaseWrapper(ConnectionPoolMixin, base.DatabaseWrapper):
+    pass
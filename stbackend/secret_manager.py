@@ -0,0 +1,108 @@
+'''
+Secrets for App Engine, loaded by settings.py at startup
+
+All secrets are requested at once over one shared Secret Manager client, so
+a cold start pays for one round trip instead of one per secret. Secrets
+are only kept in memory by default. Setting SECRETS_CACHE_PATH opts in to
+also keeping them, in plaintext, in a file readable only by this user for
+SECRETS_CACHE_TTL seconds, so a process restarting on the same instance
+skips Secret Manager. Anything else running as that user can read them.
+
+Point FAKE_SECRETS at a JSON file of {secret id: value} to run against a
+local FakeProvider instead.
+'''
+
+import json
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+PROJECT = "showtimenft"
+
+# How the last load() went: {"seconds": ..., "source": "file" or "provider"}
+timings = {}
+
+
+class SecretManagerProvider:
+    '''
+    Google Secret Manager, through one client shared by every lookup
+    '''
+
+    def __init__(self, project=PROJECT):
+        from google.cloud import secretmanager
+        self.client = secretmanager.SecretManagerServiceClient()
+        self.project = project
+
+    def access(self, secret_id, version_id="latest"):
+        name = f"projects/{self.project}/secrets/{secret_id}/versions/{version_id}"
+        response = self.client.access_secret_version(name=name)
+        return response.payload.data.decode('UTF-8')
+
+
+class FakeProvider:
+    '''
+    Serves secrets from a dict, taking `latency` seconds per lookup like a
+    remote call would
+    '''
+
+    def __init__(self, values, latency=0):
+        self.values = values
+        self.latency = latency
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_file(cls, path):
+        with open(path) as f:
+            return cls(json.load(f))
+
+    def access(self, secret_id, version_id="latest"):
+        with self._lock:
+            self.calls += 1
+        time.sleep(self.latency)
+        return self.values[secret_id]
+
+
+def load(secret_ids, provider=None, cache_path=None, cache_ttl=300):
+    '''
+    Returns {secret id: value}, from the cache file if it is fresh and
+    otherwise from the provider (Secret Manager by default), all lookups
+    in parallel
+    '''
+    started = time.monotonic()
+    values = read_cache(cache_path, cache_ttl, secret_ids) if cache_path else None
+    source = "file"
+
+    if values is None:
+        provider = provider or SecretManagerProvider()
+        with ThreadPoolExecutor(max_workers=len(secret_ids)) as executor:
+            values = dict(zip(secret_ids, executor.map(provider.access, secret_ids)))
+        source = "provider"
+        if cache_path:
+            write_cache(cache_path, values)
+
+    timings.update(seconds=round(time.monotonic() - started, 3), source=source)
+    return values
+
+
+def read_cache(path, ttl, secret_ids):
+    try:
+        with open(path) as f:
+            cached = json.load(f)
+    except (OSError, ValueError):
+        return None
+    values = cached.get("values") or {}
+    if time.time() - cached.get("written", 0) > ttl or not all(secret_id in values for secret_id in secret_ids):
+        return None
+    return values
+
+
+def write_cache(path, values):
+    # Written to a new private file first, so readers never see half of it
+    # and an existing file or link at a predictable name is never followed
+    fd, temporary = tempfile.mkstemp(dir=os.path.dirname(path) or ".", prefix=".secrets")
+    with os.fdopen(fd, "w") as f:
+        json.dump({"written": time.time(), "values": values}, f)
+    os.replace(temporary, path)
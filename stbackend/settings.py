@@ -16,6 +16,8 @@ https://docs.djangoproject.com/en/3.1/ref/settings/
 from pathlib import Path
 import os
 
+from django.core.exceptions import ImproperlyConfigured
+
 # Heads up: Even with credentials, your IP address will have to be whitelisted
 # before you can access the production database
 USE_PRODUCTION_DB_LOCALLY = False
@@ -41,29 +43,25 @@ if not os.getenv('GAE_APPLICATION', None):
         DB_PASSWORD = env('DB_PASSWORD')
 else:
     # Running in App Engine
-    # Get secrets from secret manager in Google App Engine
-    from google.cloud import secretmanager
-
-    def access_secret_version(secret_id, version_id="latest"):
-        '''Get the latest values from the secret manager'''
-
-        # Create the Secret Manager client.
-        client = secretmanager.SecretManagerServiceClient()
-
-        # Build the resource name of the secret version.
-        name = f"projects/showtimenft/secrets/{secret_id}/versions/{version_id}"
-
-        # Access the secret version.
-        response = client.access_secret_version(name=name)
-
-        # Return the decoded payload.
-        return response.payload.data.decode('UTF-8')
-
-    SECRET_KEY = access_secret_version("SECRET_KEY")
-    DB_HOST = access_secret_version('DB_HOST')
-    DB_NAME = access_secret_version('DB_NAME')
-    DB_USER = access_secret_version('DB_USER')
-    DB_PASSWORD = access_secret_version('DB_PASSWORD')
+    # Get secrets from secret manager in Google App Engine, all at once.
+    # See stbackend/secret_manager.py for the cache file and the fake provider.
+    from stbackend import secret_manager
+
+    provider = None
+    if os.getenv('FAKE_SECRETS'):
+        provider = secret_manager.FakeProvider.from_file(os.getenv('FAKE_SECRETS'))
+
+    secrets = secret_manager.load(
+        ["SECRET_KEY", "DB_HOST", "DB_NAME", "DB_USER", "DB_PASSWORD"],
+        provider,
+        cache_path=os.getenv('SECRETS_CACHE_PATH'),
+        cache_ttl=int(os.getenv('SECRETS_CACHE_TTL', 300)),
+    )
+    SECRET_KEY = secrets["SECRET_KEY"]
+    DB_HOST = secrets["DB_HOST"]
+    DB_NAME = secrets["DB_NAME"]
+    DB_USER = secrets["DB_USER"]
+    DB_PASSWORD = secrets["DB_PASSWORD"]
 
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -86,6 +84,77 @@ CORS_ALLOWED_ORIGINS = [
 
 CORS_URLS_REGEX = r'^/api/.*$'
 
+# Shared key the frontend sends in the X-API-Key header. Without it every keyed request is refused,
+# and App Engine refuses to start.
+SHOWTIME_FRONTEND_API_KEY = os.getenv('SHOWTIME_FRONTEND_API_KEY')
+if not SHOWTIME_FRONTEND_API_KEY and os.getenv('GAE_APPLICATION', None):
+    raise ImproperlyConfigured("Set SHOWTIME_FRONTEND_API_KEY")
+
+# Base URL for all OpenSea API calls. Point this at bench/opensea_stub.py
+# to run against a local stand-in instead of the real API.
+OPENSEA_API_URL = os.getenv('OPENSEA_API_URL', 'https://api.opensea.io/api/v1')
+
+# Token metadata lookups arriving within this many seconds of each other
+# are combined into one OpenSea /assets call
+OPENSEA_BATCH_WINDOW = float(os.getenv('OPENSEA_BATCH_WINDOW', 0.01))
+
+# Outbound OpenSea calls per second (shared by processes with a shared cache), and the burst allowed per process
+OPENSEA_RATE_LIMIT = float(os.getenv('OPENSEA_RATE_LIMIT', 10))
+OPENSEA_RATE_BURST = int(os.getenv('OPENSEA_RATE_BURST', 10))
+
+# Seconds an OpenSea call may take before it counts as failed. Once an endpoint has enough
+# latency samples its timeout adapts to a multiple of its p99, within these bounds.
+OPENSEA_TIMEOUT = float(os.getenv('OPENSEA_TIMEOUT', 10))
+OPENSEA_MIN_TIMEOUT = float(os.getenv('OPENSEA_MIN_TIMEOUT', 2))
+
+# Share of OpenSea calls that may be sent a second time when the first is slower than the endpoint's p95
+OPENSEA_HEDGE_BUDGET = float(os.getenv('OPENSEA_HEDGE_BUDGET', 0.05))
+
+# The OpenSea circuit breaker opens when at least OPENSEA_BREAKER_ERROR_RATE of the calls in the
+# last OPENSEA_BREAKER_WINDOW seconds failed (counting only once there were OPENSEA_BREAKER_MIN_CALLS),
+# and sends a probe call after OPENSEA_BREAKER_COOLDOWN seconds to see whether it can close again
+OPENSEA_BREAKER_ERROR_RATE = float(os.getenv('OPENSEA_BREAKER_ERROR_RATE', 0.5))
+OPENSEA_BREAKER_MIN_CALLS = int(os.getenv('OPENSEA_BREAKER_MIN_CALLS', 10))
+OPENSEA_BREAKER_WINDOW = int(os.getenv('OPENSEA_BREAKER_WINDOW', 30))
+OPENSEA_BREAKER_COOLDOWN = int(os.getenv('OPENSEA_BREAKER_COOLDOWN', 30))
+
+# Seconds OpenSea "not found" answers for tokens, contracts, collections and owners are cached, see api/negative.py
+NEGATIVE_CACHE_TTL = int(os.getenv('NEGATIVE_CACHE_TTL', 300))
+
+# Seconds wallet/profile links are kept in the shared cache and in each process, see api/identity.py
+IDENTITY_CACHE_TTL = int(os.getenv('IDENTITY_CACHE_TTL', 24 * 60 * 60))
+IDENTITY_LOCAL_TTL = int(os.getenv('IDENTITY_LOCAL_TTL', 10))
+
+# Seconds a token's like count is cached. A like invalidates it right away, this only bounds how long
+# a count read from a lagging replica can be served.
+LIKE_COUNT_CACHE_TTL = int(os.getenv('LIKE_COUNT_CACHE_TTL', 300))
+
+# Least seconds between leaderboard recomputations while likes keep coming in, see api/leaderboard.py
+LEADERBOARD_REFRESH = int(os.getenv('LEADERBOARD_REFRESH', 10))
+
+# Live like-count streams, see api/live.py: the backend that fans out likes ("redis", "local" when likes
+# and streams are served by one process, or a class path), most open streams per process, seconds
+# between keepalives and before a stream is closed
+LIVE_BACKEND = os.getenv('LIVE_BACKEND', 'redis')
+LIVE_REDIS_URL = os.getenv('LIVE_REDIS_URL', 'redis://localhost:6379/0')
+LIVE_MAX_CONNECTIONS = int(os.getenv('LIVE_MAX_CONNECTIONS', 1000))
+LIVE_KEEPALIVE = int(os.getenv('LIVE_KEEPALIVE', 15))
+LIVE_MAX_SECONDS = int(os.getenv('LIVE_MAX_SECONDS', 600))
+
+# Wallet.last_authenticated is recorded at most once per wallet every ACTIVITY_GRANULARITY seconds
+# and written in bulk at most every ACTIVITY_FLUSH_INTERVAL seconds, see api/activity.py
+ACTIVITY_GRANULARITY = int(os.getenv('ACTIVITY_GRANULARITY', 300))
+ACTIVITY_FLUSH_INTERVAL = int(os.getenv('ACTIVITY_FLUSH_INTERVAL', 60))
+
+# Seconds before stored asset metadata (api.Asset) is refetched from OpenSea
+ASSET_METADATA_MAX_AGE = int(os.getenv('ASSET_METADATA_MAX_AGE', 24 * 60 * 60))
+
+# Seconds between checks of api.HiddenAsset for takedowns made by other instances
+HIDDEN_ASSETS_REFRESH = int(os.getenv('HIDDEN_ASSETS_REFRESH', 30))
+
+# Snapshot the autocomplete index is loaded from, written by `manage.py build_autocomplete`
+AUTOCOMPLETE_SNAPSHOT = os.getenv('AUTOCOMPLETE_SNAPSHOT', str(BASE_DIR / 'autocomplete.snapshot'))
+
 # Application definition
 
 INSTALLED_APPS = [
@@ -95,12 +164,14 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
-	'api',
+	'api.apps.ApiConfig',
     'corsheaders',
 ]
 
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
+    'api.middleware.QueryBudgetMiddleware',
+    'api.replica.ReplicaMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -134,19 +205,39 @@ WSGI_APPLICATION = 'stbackend.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/3.1/ref/settings/#databases
 
+# Seconds a MySQL connection is kept for reuse by later requests on the same thread.
+# Kept connections are health-checked before their first use in each request.
+DB_CONN_MAX_AGE = int(os.getenv('DB_CONN_MAX_AGE', 300))
+
+# Most open connections per database in one process, and the seconds a thread waits for one to free up
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 10))
+DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', 5))
+
+# Database alias the heavy reads (leaderboard, likes, like counts) go to, see api/replica.py.
+# Addresses that just liked something read from the primary for REPLICA_PIN_SECONDS.
+DB_READ_REPLICA = os.getenv('DB_READ_REPLICA') or None
+REPLICA_PIN_SECONDS = int(os.getenv('REPLICA_PIN_SECONDS', 30))
+DATABASE_ROUTERS = ['api.replica.ReplicaRouter']
+
+# Queries a request may run before it's logged, or fails with QUERY_BUDGET_STRICT (see api/middleware.py)
+QUERY_BUDGET = int(os.getenv('QUERY_BUDGET', 20))
+QUERY_BUDGET_STRICT = os.getenv('QUERY_BUDGET_STRICT', '') == '1'
 
 if os.getenv('GAE_APPLICATION', None):
     DEBUG = False
     DATABASES = {
         'default': {
-            'ENGINE': 'django.db.backends.mysql',
+            'ENGINE': 'stbackend.db_backends.mysql',
             'HOST': DB_HOST,
             'NAME': DB_NAME,
             'USER': DB_USER,
             'PASSWORD': DB_PASSWORD,
             'OPTIONS': {'charset': 'utf8mb4'},
+            'CONN_MAX_AGE': DB_CONN_MAX_AGE,
         }
     }
+    if os.getenv('DB_REPLICA_HOST'):
+        DATABASES['replica'] = dict(DATABASES['default'], HOST=os.getenv('DB_REPLICA_HOST'), TEST={'MIRROR': 'default'})
 else:
     DEBUG = True
     if USE_PRODUCTION_DB_LOCALLY:
@@ -154,23 +245,44 @@ else:
         # Your IP address will have to be whitelisted before you can access the production database
         DATABASES = {
             'default': {
-                'ENGINE': 'django.db.backends.mysql',
+                'ENGINE': 'stbackend.db_backends.mysql',
                 'HOST': DB_HOST,
                 'PORT': '3306',
                 'NAME': DB_NAME,
                 'USER': DB_USER,
                 'PASSWORD': DB_PASSWORD,
                 'OPTIONS': {'charset': 'utf8mb4'},
+                'CONN_MAX_AGE': DB_CONN_MAX_AGE,
             }
         }
     else:
         DATABASES = {
             'default': {
-                'ENGINE': 'django.db.backends.sqlite3',
-                'NAME': BASE_DIR / 'db.sqlite3',
-            }
+                'ENGINE': 'stbackend.db_backends.sqlite3',
+                'NAME': os.getenv('SQLITE_PATH', BASE_DIR / 'db.sqlite3'),
+            },
+            # A second copy of the database to try DB_READ_REPLICA=replica against; tests use the default database
+            'replica': {
+                'ENGINE': 'stbackend.db_backends.sqlite3',
+                'NAME': os.getenv('SQLITE_REPLICA_PATH', os.getenv('SQLITE_PATH', BASE_DIR / 'db.sqlite3')),
+                'TEST': {'MIRROR': 'default'},
+            },
         }
 
+# Memcached server ("host:port") shared by every instance. Tag invalidation, replica pinning, like counts
+# and the OpenSea rate limit rely on it; without it each process keeps its own LocMemCache, which is only
+# right for a single local process, so App Engine refuses to start without it.
+CACHE_MEMCACHED_LOCATION = os.getenv('CACHE_MEMCACHED_LOCATION')
+if CACHE_MEMCACHED_LOCATION:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.memcached.MemcachedCache',
+            'LOCATION': CACHE_MEMCACHED_LOCATION,
+        }
+    }
+elif os.getenv('GAE_APPLICATION', None):
+    raise ImproperlyConfigured("Set CACHE_MEMCACHED_LOCATION: instances must share a cache (see README.md)")
+
 
 
 # Password validation
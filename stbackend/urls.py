@@ -16,7 +16,10 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path, include
 
+from api.views import warmup
+
 urlpatterns = [
     path('api/', include('api.urls', namespace="api")),
     path('admin/', admin.site.urls),
+    path('_ah/warmup', warmup),
 ]
@@ -8,9 +8,20 @@ https://docs.djangoproject.com/en/3.1/howto/deployment/wsgi/
 """
 
 import os
+import time
+
+started = time.monotonic()
 
 from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'stbackend.settings')
 
 application = get_wsgi_application()
+
+# Startup time, including loading secrets, for /v1/metrics
+from api import metrics
+from stbackend import secret_manager
+
+metrics.set_gauge("cold_start_seconds", round(time.monotonic() - started, 3))
+if secret_manager.timings:
+    metrics.set_gauge("secrets_load_seconds", secret_manager.timings["seconds"], source=secret_manager.timings["source"])